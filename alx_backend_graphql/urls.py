@@ -16,15 +16,25 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from graphene_django.views import GraphQLView
+from django.conf import settings
+from crm.views import (AsyncCRMGraphQLView, CRMGraphQLView, api_token_required,
+                       export_orders, graphql_stats)
 from .schema import schema
 from django.http import HttpResponse
 
 def home(request):
     return HttpResponse("Welcome to the Home Page")
 
+# the async view is opt-in (CRM_ASYNC_GRAPHQL, see crm/settings.py)
+view_class = AsyncCRMGraphQLView if settings.CRM_ASYNC_GRAPHQL else CRMGraphQLView
+
 urlpatterns = [
     path('', home, name='home'), 
     path('admin/', admin.site.urls),
-    path('graphql/', GraphQLView.as_view(graphiql=True, schema=schema)),
+    path('graphql/', view_class.as_view(graphiql=True, schema=schema)),
+    # machine clients without a session or CSRF token, by CRM_API_TOKEN
+    path('graphql/api/', api_token_required(view_class.as_view(schema=schema))),
+    path('graphql/stats/', graphql_stats, {'schema': schema}),
+    # streaming NDJSON/CSV order export for reconciliation
+    path('export/orders/', export_orders),
 ]
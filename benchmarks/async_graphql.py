@@ -0,0 +1,191 @@
+"""
+Throughput of the sync view under WSGI vs the async view under ASGI.
+
+    python -m benchmarks.async_graphql [clients] [seconds] [db_latency_ms] [db_threads]
+
+Both servers run in this process against the scratch database with the
+same number of threads doing database work: a thread-pool WSGI server
+(``db_threads`` request threads) for CRMGraphQLView, and uvicorn with
+``CRM_ASYNC_DB_WORKERS = db_threads`` for AsyncCRMGraphQLView. A separate client process keeps ``clients``
+concurrent connections busy with the dashboard query, whose three root
+fields are independent. ``db_latency_ms`` adds a sleep to every SQL
+statement to model a database across the network; in-memory SQLite
+answers in microseconds, which leaves nothing for async I/O to overlap.
+"""
+import asyncio
+import json
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from socketserver import ThreadingMixIn
+from urllib.parse import urlencode
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from benchmarks.common import report, scratch_database
+from django.urls import path
+
+QUERY = """{ totalCustomers totalOrders
+  allProducts(first: 20) { edges { node { name stock } } } }"""
+
+
+def _urls():
+    from alx_backend_graphql.schema import schema
+    from crm.views import AsyncCRMGraphQLView, CRMGraphQLView
+
+    return [
+        path("sync/", CRMGraphQLView.as_view(schema=schema)),
+        path("async/", AsyncCRMGraphQLView.as_view(schema=schema)),
+    ]
+
+
+urlpatterns = []
+
+
+class PooledWSGIServer(ThreadingMixIn, WSGIServer):
+    """wsgiref with a fixed worker pool, like gunicorn's gthread workers."""
+    workers = 8
+
+    def process_request(self, request, client_address):
+        if not hasattr(self, "_pool"):
+            self._pool = ThreadPoolExecutor(self.workers)
+        self._pool.submit(self.process_request_thread, request, client_address)
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve_wsgi(port, workers):
+    from django.core.wsgi import get_wsgi_application
+
+    PooledWSGIServer.workers = workers
+    server = make_server("127.0.0.1", port, get_wsgi_application(),
+                         server_class=PooledWSGIServer, handler_class=QuietHandler)
+    server.request_queue_size = 1024
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.shutdown
+
+
+def serve_asgi(port):
+    import uvicorn
+    from django.core.asgi import get_asgi_application
+
+    server = uvicorn.Server(uvicorn.Config(
+        get_asgi_application(), host="127.0.0.1", port=port,
+        log_level="warning", lifespan="off", backlog=1024))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    def stop():
+        server.should_exit = True
+    return stop
+
+
+async def load(url, clients, seconds):
+    """Client side: hammer ``url`` and print JSON stats."""
+    import aiohttp
+
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + seconds
+
+    async def worker(session):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            async with session.get(url) as response:
+                body = await response.json()
+            if response.status != 200 or "errors" in body:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    connector = aiohttp.TCPConnector(limit=clients)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(worker(session) for _ in range(clients)))
+    latencies.sort()
+    print(json.dumps({
+        "rps": len(latencies) / seconds,
+        "p50": statistics.median(latencies) * 1000,
+        "p99": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "errors": errors,
+    }))
+
+
+def run_client(url, clients, seconds):
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.async_graphql", "--client",
+         url, str(clients), str(seconds)],
+        check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def seed():
+    from crm.models import CrmStats, Customer, Order, Product
+
+    customers = Customer.objects.bulk_create(
+        Customer(name=f"Customer {i}", email=f"bench{i}@example.com")
+        for i in range(500))
+    Order.objects.bulk_create(
+        Order(customer=customers[i % 500], total_amount=i % 100) for i in range(5000))
+    Product.objects.bulk_create(
+        Product(name=f"Product {i}", price=1 + i % 50, stock=i % 40) for i in range(200))
+    CrmStats.load()
+
+
+def main(clients=128, seconds=10, latency_ms=20, workers=8):
+    from django.conf import settings
+    from django.db import connections
+
+    # measure execution, not the response cache
+    settings.CRM_RESPONSE_CACHE_BACKEND = None
+    settings.ROOT_URLCONF = __name__
+    settings.CRM_ASYNC_DB_WORKERS = workers
+    urlpatterns[:] = _urls()
+    seed()
+
+    def slow_database(execute, sql, params, many, context):
+        time.sleep(latency_ms / 1000)
+        return execute(sql, params, many, context)
+
+    # every thread's connection gets the wrapper as it is first used
+    from django.db.backends.signals import connection_created
+
+    def add_latency(sender, connection, **kwargs):
+        connection.execute_wrappers.append(slow_database)
+
+    if latency_ms:
+        connection_created.connect(add_latency, weak=False)
+        for conn in connections.all():
+            conn.execute_wrappers.append(slow_database)
+
+    rows = []
+    for label, serve, prefix in (("WSGI sync ", lambda p: serve_wsgi(p, workers), "sync"),
+                                 ("ASGI async", serve_asgi, "async")):
+        port = free_port()
+        stop = serve(port)
+        url = f"http://127.0.0.1:{port}/{prefix}/?{urlencode({'query': QUERY})}"
+        stats = run_client(url, clients, seconds)
+        stop()
+        rows.append((label, f"{stats['rps']:8.1f} req/s  p50 {stats['p50']:7.1f}ms  "
+                            f"p99 {stats['p99']:7.1f}ms  errors {stats['errors']}"))
+    report(f"{clients} clients, {seconds}s, {workers} DB threads, "
+           f"{latency_ms}ms per SQL statement", rows)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--client"]:
+        asyncio.run(load(sys.argv[2], int(sys.argv[3]), float(sys.argv[4])))
+    else:
+        with scratch_database():
+            main(*map(int, sys.argv[1:]))
@@ -0,0 +1,65 @@
+"""
+The cron trio (heartbeat, low-stock check, CRM report) as three POSTs vs
+one batched POST.
+
+    python -m benchmarks.batched_requests [rounds]
+
+Runs a thread-pool WSGI server on the scratch database and posts with a
+fresh connection per request, as crm/cron.py and crm/tasks.py do.
+"""
+import sys
+
+import requests
+
+from benchmarks.async_graphql import free_port, serve_wsgi
+from benchmarks.common import report, scratch_database, timed
+
+TRIO = [
+    {"query": "query Heartbeat { __typename }"},
+    {"query": """mutation LowStock { updateLowStockProducts {
+        updatedCount products { id name stock } } }"""},
+    {"query": "query CrmReport { totalCustomers totalOrders totalRevenue }"},
+]
+
+
+def main(rounds=50):
+    from django.conf import settings
+
+    from crm.models import CrmStats, Customer, Product
+
+    # measure request overhead, not the response cache
+    settings.CRM_RESPONSE_CACHE_BACKEND = None
+    Customer.objects.bulk_create(
+        Customer(name=f"Customer {i}", email=f"bench{i}@example.com")
+        for i in range(100))
+    Product.objects.bulk_create(
+        Product(name=f"Product {i}", price=1 + i % 50, stock=i % 40) for i in range(200))
+    CrmStats.load()
+
+    port = free_port()
+    stop = serve_wsgi(port, 4)
+    url = f"http://127.0.0.1:{port}/graphql/"
+
+    def separate():
+        for operation in TRIO:
+            response = requests.post(url, json=operation, timeout=10)
+            assert "errors" not in response.json(), response.text
+
+    def batched():
+        response = requests.post(url, json=TRIO, timeout=10)
+        assert all("errors" not in result for result in response.json()), response.text
+
+    try:
+        three = timed(separate, rounds)
+        one = timed(batched, rounds)
+    finally:
+        stop()
+    report(f"cron trio over HTTP, median of {rounds} rounds (ms)", [
+        ("3 requests", f"{three:7.2f}"),
+        ("1 batch", f"{one:7.2f}"),
+    ])
+
+
+if __name__ == "__main__":
+    with scratch_database():
+        main(*map(int, sys.argv[1:]))
@@ -0,0 +1,46 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Run them from the project root, e.g. ``python -m benchmarks.keyset_pagination``.
+Every script works on a throwaway test database, never on db.sqlite3.
+"""
+import os
+import statistics
+import time
+from contextlib import contextmanager
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "crm.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+
+@contextmanager
+def scratch_database():
+    """Create the test database for the duration of the benchmark."""
+    from django.test.utils import setup_databases, teardown_databases
+
+    config = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(config, verbosity=0)
+
+
+def timed(fn, repeat=5):
+    """Median wall time of ``fn()`` in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def report(title, rows):
+    """Print ``(label, value)`` rows as an aligned table."""
+    print(title)
+    width = max(len(label) for label, _ in rows)
+    for label, value in rows:
+        print(f"  {label.ljust(width)}  {value}")
@@ -0,0 +1,104 @@
+"""
+Per-run cost of the cron and Celery jobs' GraphQL calls: over HTTP to our
+own server, as crm/cron.py and crm/tasks.py used to, vs in-process.
+
+    python -m benchmarks.cron_jobs [runs]
+
+The HTTP side builds a new gql Client and RequestsHTTPTransport per run
+(the heartbeat and low-stock jobs) or posts with requests (the report
+task), against a WSGI server in this process, so CPU time covers both
+the client and the server. Low-stock products are reset between runs.
+"""
+import statistics
+import sys
+import time
+
+import requests
+
+from benchmarks.async_graphql import free_port, serve_wsgi
+from benchmarks.common import report, scratch_database
+from crm.cron import HEARTBEAT_QUERY, LOW_STOCK_MUTATION
+from crm.tasks import REPORT_QUERY
+
+
+def measure(fn, runs, before=None):
+    """Median wall and CPU time of ``fn()`` in milliseconds."""
+    wall, cpu = [], []
+    for _ in range(runs):
+        if before:
+            before()
+        started, started_cpu = time.perf_counter(), time.process_time()
+        fn()
+        wall.append(time.perf_counter() - started)
+        cpu.append(time.process_time() - started_cpu)
+    return statistics.median(wall) * 1000, statistics.median(cpu) * 1000
+
+
+def main(runs=50):
+    from django.conf import settings
+    from gql import Client, gql
+    from gql.transport.requests import RequestsHTTPTransport
+
+    from crm.jobs import run_operation
+    from crm.models import CrmStats, Customer, Product
+
+    # measure the call path, not the response cache
+    settings.CRM_RESPONSE_CACHE_BACKEND = None
+    Customer.objects.bulk_create(
+        Customer(name=f"Customer {i}", email=f"bench{i}@example.com")
+        for i in range(100))
+    Product.objects.bulk_create(
+        Product(name=f"Product {i}", price=1 + i % 50, stock=i % 40) for i in range(200))
+    CrmStats.load()
+    stock = dict(Product.objects.values_list("pk", "stock"))
+
+    def reset_stock():
+        products = list(Product.objects.all())
+        for product in products:
+            product.stock = stock[product.pk]
+        Product.objects.bulk_update(products, ["stock"])
+
+    port = free_port()
+    stop = serve_wsgi(port, 4)
+    url = f"http://127.0.0.1:{port}/graphql/"
+
+    def over_gql(query):
+        def run():
+            transport = RequestsHTTPTransport(url=url, verify=True, retries=3)
+            client = Client(transport=transport, fetch_schema_from_transport=False)
+            client.execute(gql(query))
+        return run
+
+    def over_requests(query):
+        def run():
+            response = requests.post(url, json={"query": query}, timeout=10)
+            response.raise_for_status()
+            assert "errors" not in response.json(), response.text
+        return run
+
+    def local(query):
+        return lambda: run_operation(query)
+
+    jobs = [
+        ("log_crm_heartbeat", HEARTBEAT_QUERY, over_gql, None),
+        ("updateLowStockProducts", LOW_STOCK_MUTATION, over_gql, reset_stock),
+        ("generate_crm_report", REPORT_QUERY, over_requests, None),
+    ]
+    rows = []
+    try:
+        for name, query, http, before in jobs:
+            local(query)()  # parse and validate once, as a long-lived worker would
+            http_wall, http_cpu = measure(http(query), runs, before)
+            local_wall, local_cpu = measure(local(query), runs, before)
+            rows.append((f"{name} HTTP", f"{http_wall:7.2f} wall {http_cpu:7.2f} cpu"))
+            rows.append((f"{name} in-process",
+                         f"{local_wall:7.2f} wall {local_cpu:7.2f} cpu  "
+                         f"({http_wall / local_wall:.0f}x / {http_cpu / local_cpu:.0f}x)"))
+    finally:
+        stop()
+    report(f"job GraphQL call, median of {runs} runs (ms)", rows)
+
+
+if __name__ == "__main__":
+    with scratch_database():
+        main(*map(int, sys.argv[1:]))
@@ -0,0 +1,53 @@
+"""
+"Top customers by lifetime value": aggregating orders per request vs the
+materialized Customer.total_spent.
+
+    python -m benchmarks.customer_aggregates [customers] [orders_per_customer]
+
+Also times the one-off backfill over the same data.
+"""
+import sys
+
+from django.db.models import Count, Max, Sum
+
+from benchmarks.common import report, scratch_database, timed
+
+
+def seed(count, per_customer):
+    from crm.models import Customer, Order
+
+    customers = Customer.objects.bulk_create(
+        Customer(name=f"Customer {i}", email=f"bench{i}@example.com") for i in range(count))
+    Order.objects.bulk_create(
+        (Order(customer=c, total_amount=(c.pk * 7 + j) % 500)
+         for c in customers for j in range(per_customer)), batch_size=5000)
+
+
+def on_the_fly():
+    from crm.models import Customer
+
+    return list(Customer.objects.annotate(
+        n=Count("orders"), total=Sum("orders__total_amount"), last=Max("orders__order_date"),
+    ).filter(total__gte=1000).order_by("-total")[:20])
+
+
+def materialized():
+    from crm.models import Customer
+
+    return list(Customer.objects.filter(total_spent__gte=1000).order_by("-total_spent")[:20])
+
+
+def main(count=50000, per_customer=5):
+    from crm.aggregates import backfill
+
+    seed(count, per_customer)
+    # bulk_create skips the signals, so this is a real backfill
+    rows = [("backfill (one grouped query)", f"{timed(backfill, 1):8.1f}")]
+    rows.append(("top 20, aggregated per request", f"{timed(on_the_fly, 5):8.2f}"))
+    rows.append(("top 20, materialized + index", f"{timed(materialized, 5):8.2f}"))
+    report(f"{count} customers x {per_customer} orders, median ms", rows)
+
+
+if __name__ == "__main__":
+    with scratch_database():
+        main(*map(int, sys.argv[1:]))
@@ -0,0 +1,83 @@
+"""
+Inactive-customer cleanup: annotate + count + one cascading delete vs
+chunked NOT EXISTS deletes.
+
+    python -m benchmarks.customer_cleanup [customers]
+
+Every other customer is inactive (no orders, or only orders older than a
+year); each customer has two orders of two items.
+"""
+import sys
+import time
+from datetime import timedelta
+
+from django.db import connection
+from django.utils import timezone
+
+from benchmarks.common import report, scratch_database
+
+
+def seed(count):
+    from crm.models import CrmStats, Customer, Order, OrderItem, Product
+
+    products = Product.objects.bulk_create(
+        Product(name=f"Product {i}", price=1, stock=1) for i in range(2))
+    customers = Customer.objects.bulk_create(
+        Customer(name=f"Customer {i}", email=f"bench{i}@example.com") for i in range(count))
+    long_ago = timezone.now() - timedelta(days=400)
+    orders = Order.objects.bulk_create(
+        Order(customer=c, total_amount=10) for c in customers for _ in range(2)
+        if c.pk % 4)  # pk % 4 == 0: never ordered
+    Order.objects.filter(customer__id__in=[c.pk for c in customers if c.pk % 4 == 2]).update(
+        order_date=long_ago)
+    OrderItem.objects.bulk_create(
+        OrderItem(order=o, product=p) for o in orders for p in products)
+    CrmStats.load()
+
+
+def legacy():
+    from django.db.models import Count
+
+    from crm.models import Customer, Order
+
+    one_year_ago = timezone.now() - timedelta(days=365)
+    inactive = Customer.objects.annotate(order_count=Count("orders")).filter(
+        order_count=0) | Customer.objects.filter(pk__in=Customer.objects.exclude(
+            pk__in=Order.objects.filter(order_date__gte=one_year_ago).values("customer_id")))
+    count = inactive.count()
+    inactive.delete()
+    return count
+
+
+def chunked():
+    from crm.cleanup import delete_inactive_customers
+
+    return delete_inactive_customers(chunk_size=1000).customers
+
+
+def main(count=20000):
+    from crm.models import Customer, Product
+
+    rows = []
+    for label, fn in (("count + cascade delete", legacy), ("chunked NOT EXISTS", chunked)):
+        seed(count)
+        statements = []
+
+        def record(execute, sql, params, many, context):
+            statements.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            started = time.perf_counter()
+            deleted = fn()
+            elapsed = time.perf_counter() - started
+        rows.append((label, f"{elapsed * 1000:8.1f}ms  {len(statements):5} queries  "
+                            f"{deleted} deleted"))
+        Customer.objects.all().delete()
+        Product.objects.all().delete()
+    report(f"{count} customers, half inactive", rows)
+
+
+if __name__ == "__main__":
+    with scratch_database():
+        main(*map(int, sys.argv[1:]))
@@ -0,0 +1,83 @@
+"""
+Exporting every order with its items: paging allOrders 100 at a time
+through GraphQL vs the /export/orders/ NDJSON stream.
+
+    python -m benchmarks.export [orders]
+
+Reports the wall time and the peak Python memory (tracemalloc) of each.
+"""
+import sys
+import time
+import tracemalloc
+
+from benchmarks.common import report, scratch_database
+
+PAGE = """query ($after: String) {
+  allOrders(first: 100, after: $after) {
+    edges { node { id orderDate totalAmount customer { email }
+                   products(first: 10) { edges { node { id name price } } } } }
+    pageInfo { hasNextPage endCursor }
+  }
+}"""
+
+
+def seed(count):
+    from crm.models import Customer, Order, OrderItem, Product
+
+    products = Product.objects.bulk_create(
+        Product(name=f"Product {i}", price=1 + i, stock=1) for i in range(50))
+    customers = Customer.objects.bulk_create(
+        Customer(name=f"Customer {i}", email=f"bench{i}@example.com") for i in range(1000))
+    orders = Order.objects.bulk_create(
+        (Order(customer=customers[i % 1000], total_amount=i % 500) for i in range(count)),
+        batch_size=5000)
+    OrderItem.objects.bulk_create(
+        (OrderItem(order=o, product=products[(o.pk + j) % 50], quantity=1 + j)
+         for o in orders for j in range(2)), batch_size=5000)
+
+
+def measure(fn):
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    # a second run under tracemalloc, which slows it down too much to time
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return f"{elapsed:8.2f}s  peak {peak / 2**20:6.1f} MiB"
+
+
+def main(count=20000):
+    from django.test import RequestFactory
+
+    from alx_backend_graphql.schema import schema
+    from crm.export import stream_orders
+
+    seed(count)
+
+    def paged():
+        after, rows = None, []
+        while True:
+            result = schema.execute(PAGE, variables={"after": after},
+                                    context_value=RequestFactory().post("/graphql/"))
+            assert not result.errors, result.errors
+            page = result.data["allOrders"]
+            rows += page["edges"]  # what the finance script keeps
+            if not page["pageInfo"]["hasNextPage"]:
+                return rows
+            after = page["pageInfo"]["endCursor"]
+
+    def streamed():
+        for _ in stream_orders("ndjson"):
+            pass
+
+    report(f"{count} orders x 2 items", [
+        ("allOrders, 100 per page", measure(paged)),
+        ("/export/orders/ ndjson", measure(streamed)),
+    ])
+
+
+if __name__ == "__main__":
+    with scratch_database():
+        main(*map(int, sys.argv[1:]))
@@ -0,0 +1,76 @@
+"""
+Per-call latency of the shared GraphQL client vs a fresh client per call.
+
+    python -m benchmarks.graphql_client [calls]
+
+Serves mock_graphql_server.py (threaded, HTTP/1.1) in this process and
+sends the order-reminder query. "fresh" is what the jobs used to do on
+every run: parse the document, build a RequestsHTTPTransport and a gql
+Client, connect, execute. "pooled" is crm.graphql_client.execute with the
+document parsed at import and the process's keep-alive session.
+"""
+import sys
+import threading
+
+from benchmarks.async_graphql import free_port
+from benchmarks.common import report, timed
+from crm.graphql_client import document
+
+VARIABLES = {"dateFrom": "2000-01-01T00:00:00"}
+SOURCE = """
+    query GetPendingOrders($dateFrom: String!) {
+        orders(where: {orderDate: {gte: $dateFrom}}) {
+            id customer { email } orderDate status
+        }
+    }
+"""
+PENDING_ORDERS = document(SOURCE)
+
+
+def serve_mock(port):
+    import logging
+
+    from werkzeug.serving import make_server
+
+    from mock_graphql_server import app
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.shutdown
+
+
+def main(calls=200):
+    from gql import Client, GraphQLRequest, gql
+    from gql.transport.requests import RequestsHTTPTransport
+
+    from crm import graphql_client
+
+    port = free_port()
+    stop = serve_mock(port)
+    url = f"http://127.0.0.1:{port}/graphql"
+
+    def fresh():
+        request = GraphQLRequest(gql(SOURCE), variable_values=VARIABLES)
+        transport = RequestsHTTPTransport(url=url, verify=True, retries=3)
+        with Client(transport=transport, fetch_schema_from_transport=False) as session:
+            assert session.execute(request)["orders"]
+
+    def pooled():
+        assert graphql_client.execute(url, PENDING_ORDERS, VARIABLES)["orders"]
+
+    try:
+        pooled()  # open the keep-alive connection
+        fresh_ms = timed(fresh, calls)
+        pooled_ms = timed(pooled, calls)
+    finally:
+        graphql_client.close_sessions()
+        stop()
+    report(f"order-reminder query against mock_graphql_server.py, median of {calls} calls (ms)", [
+        ("fresh client per call", f"{fresh_ms:6.2f}"),
+        ("shared pooled client", f"{pooled_ms:6.2f}"),
+    ])
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,60 @@
+"""
+Cost of the resolver/SQL profiler: no profiling, the default 1% sample,
+and every operation profiled.
+
+    python -m benchmarks.instrumentation [orders] [repeat]
+
+Posts a nested orders query through the Django test client on the
+scratch database, with the response cache off.
+"""
+import json
+import logging
+import sys
+
+from django.test import Client
+
+from benchmarks.common import report, scratch_database, timed
+
+QUERY = """{ allOrders(first: 50) { edges { node {
+    totalAmount customer { email } products(first: 3) { edges { node { name } } }
+} } } }"""
+
+
+def seed(count):
+    from crm.models import Customer, Order, OrderItem, Product
+
+    products = Product.objects.bulk_create(
+        Product(name=f"Product {i}", price=1, stock=1) for i in range(3))
+    customers = Customer.objects.bulk_create(
+        Customer(name=f"Customer {i}", email=f"bench{i}@example.com") for i in range(count))
+    orders = Order.objects.bulk_create(
+        Order(customer=c, total_amount=10) for c in customers)
+    OrderItem.objects.bulk_create(
+        OrderItem(order=o, product=p) for o in orders for p in products)
+
+
+def main(count=1000, repeat=200):
+    from django.conf import settings
+
+    settings.CRM_RESPONSE_CACHE_BACKEND = None
+    settings.ALLOWED_HOSTS = ["testserver"]
+    logging.getLogger("crm.profile").disabled = True
+    seed(count)
+    client = Client()
+    body = json.dumps({"query": QUERY})
+
+    def post():
+        response = client.post("/graphql/", body, content_type="application/json")
+        assert "errors" not in response.json(), response.content
+
+    rows = []
+    for label, rate in (("off", 0.0), ("sampled 1%", 0.01), ("every operation", 1.0)):
+        settings.CRM_PROFILE_SAMPLE_RATE = rate
+        post()
+        rows.append((label, f"{timed(post, repeat):8.2f}"))
+    report(f"allOrders(first: 50) over {count} orders, median ms", rows)
+
+
+if __name__ == "__main__":
+    with scratch_database():
+        main(*map(int, sys.argv[1:]))
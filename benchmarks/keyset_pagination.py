@@ -0,0 +1,62 @@
+"""
+Page-1000 latency: offset-based allOrders vs keyset allOrdersKeyset.
+
+    python -m benchmarks.keyset_pagination [orders] [page_size] [page]
+"""
+import sys
+
+from benchmarks.common import report, scratch_database, timed
+
+
+def seed(count):
+    from crm.models import Customer, Order
+
+    customers = Customer.objects.bulk_create(
+        Customer(name=f"Customer {i}", email=f"bench{i}@example.com")
+        for i in range(1000))
+    Order.objects.bulk_create(
+        (Order(customer=customers[i % len(customers)], total_amount=i % 500)
+         for i in range(count)), batch_size=5000)
+
+
+def main(count=100_000, page_size=20, page=1000):
+    from django.test import RequestFactory
+
+    from alx_backend_graphql.schema import schema
+    from crm.fields import encode_cursor
+    from crm.models import Order
+
+    offset = page_size * (page - 1)
+    seed(count)
+    anchor = Order.objects.order_by("-order_date", "-id")[offset - 1]
+    cursor = encode_cursor(anchor, ["order_date", "id"])
+
+    def run(query, **variables):
+        result = schema.execute(query, variables=variables,
+                                context_value=RequestFactory().post("/graphql/"))
+        assert not result.errors, result.errors
+        return result
+
+    offset_query = """query ($first: Int, $offset: Int) {
+        allOrders(first: $first, offset: $offset) { edges { node { id totalAmount } } }
+    }"""
+    keyset_query = """query ($first: Int, $after: String) {
+        allOrdersKeyset(first: $first, after: $after) { edges { node { id totalAmount } } }
+    }"""
+
+    first_offset = timed(lambda: run(offset_query, first=page_size, offset=0))
+    deep_offset = timed(lambda: run(offset_query, first=page_size, offset=offset))
+    first_keyset = timed(lambda: run(keyset_query, first=page_size))
+    deep_keyset = timed(lambda: run(keyset_query, first=page_size, after=cursor))
+
+    report(f"{count} orders, page size {page_size} (median ms)", [
+        ("offset   page 1", f"{first_offset:8.2f}"),
+        (f"offset   page {page}", f"{deep_offset:8.2f}"),
+        ("keyset   page 1", f"{first_keyset:8.2f}"),
+        (f"keyset   page {page}", f"{deep_keyset:8.2f}"),
+    ])
+
+
+if __name__ == "__main__":
+    with scratch_database():
+        main(*map(int, sys.argv[1:]))
@@ -0,0 +1,64 @@
+"""
+Sorted deep paging on the (price, id) index: OFFSET vs a keyset seek, at
+the ORM level, plus the full allProducts(orderBy: "-price") request.
+
+    python -m benchmarks.order_by [products] [page_size] [page]
+"""
+import sys
+
+from benchmarks.common import report, scratch_database, timed
+
+
+def seed(count):
+    from crm.models import Product
+
+    Product.objects.bulk_create(
+        (Product(name=f"Product {i}", price=1 + i * 7 % 1000, stock=i % 500)
+         for i in range(count)), batch_size=5000)
+
+
+def main(count=200_000, page_size=20, page=5000):
+    from django.test import RequestFactory
+
+    from alx_backend_graphql.schema import schema
+    from crm.fields import encode_cursor, seek
+    from crm.models import Product
+
+    offset = page_size * (page - 1)
+    seed(count)
+    ordered = Product.objects.order_by("-price", "-id")
+    cursor = encode_cursor(ordered[offset - 1], ["price", "id"])
+
+    def run(query, **variables):
+        result = schema.execute(query, variables=variables,
+                                context_value=RequestFactory().post("/graphql/"))
+        assert not result.errors, result.errors
+
+    def offset_page(start):
+        # an offset connection: count, then OFFSET
+        ordered.count()
+        list(ordered.only("id", "name", "price")[start:start + page_size])
+
+    def keyset_page(after):
+        page = ordered.only("id", "name", "price")
+        if after:
+            page = page.filter(seek(Product, ("-price", "-id"), after, forward=True))
+        list(page[:page_size + 1])
+
+    keyset_query = """query ($first: Int, $after: String) {
+        allProducts(orderBy: "-price", first: $first, after: $after) {
+            edges { node { id name price } } } }"""
+
+    report(f"{count} products, orderBy -price, page size {page_size} (median ms)", [
+        ("offset   page 1", f"{timed(lambda: offset_page(0)):8.2f}"),
+        (f"offset   page {page}", f"{timed(lambda: offset_page(offset)):8.2f}"),
+        ("keyset   page 1", f"{timed(lambda: keyset_page(None)):8.2f}"),
+        (f"keyset   page {page}", f"{timed(lambda: keyset_page(cursor)):8.2f}"),
+        (f"allProducts(orderBy) page {page}",
+         f"{timed(lambda: run(keyset_query, first=page_size, after=cursor)):8.2f}"),
+    ])
+
+
+if __name__ == "__main__":
+    with scratch_database():
+        main(*map(int, sys.argv[1:]))
@@ -0,0 +1,81 @@
+"""
+Order reminders: one unpaginated query and one reminder at a time vs the
+async pipeline in crm/cron_jobs/send_order_reminders.py.
+
+    python -m benchmarks.order_reminders [orders] [latency_ms]
+
+Serves mock_graphql_server.py with ``orders`` synthetic orders (about 70%
+fall in the 7-day window) and ``latency_ms`` added to every response, as
+a remote reminder service would. "sequential" fetches every order in one
+query, then POSTs each reminder and appends its log line in turn.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import requests
+
+from benchmarks.async_graphql import free_port
+from benchmarks.common import report
+from benchmarks.graphql_client import serve_mock
+from crm.cron_jobs import send_order_reminders
+
+ALL_ORDERS = """
+    query GetPendingOrders($dateFrom: String!) {
+        orders(where: {orderDate: {gte: $dateFrom}}) { id customer { email } }
+    }
+"""
+
+
+def sequential(url, since, log_file):
+    with requests.Session() as http:
+        orders = http.post(url + "/graphql", json={
+            "query": ALL_ORDERS, "variables": {"dateFrom": since},
+        }).json()["data"]["orders"]
+        for order in orders:
+            http.post(url + "/reminders", json={
+                "orderId": order["id"], "email": order["customer"]["email"],
+            }).raise_for_status()
+            with open(log_file, "a") as f:
+                f.write(f"Order ID: {order['id']}, Customer Email: {order['customer']['email']}\n")
+    return len(orders)
+
+
+def main(orders=3000, latency_ms=5):
+    import mock_graphql_server as mock
+
+    mock.mock_orders[:] = mock.synthetic_orders(orders)
+    os.environ["MOCK_LATENCY_MS"] = str(latency_ms)
+    port = free_port()
+    stop = serve_mock(port)
+    url = f"http://127.0.0.1:{port}"
+    since = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        count = sequential(url, since, os.path.join(tmp, "sequential.txt"))
+        rows.append(("sequential", f"{time.perf_counter() - started:6.2f}s  {count} reminders"))
+
+        started = time.perf_counter()
+        count = asyncio.run(send_order_reminders.process_reminders(
+            endpoint=url + "/graphql", reminder_endpoint=url + "/reminders",
+            log_file=os.path.join(tmp, "pipeline.txt"),
+            state_file=os.path.join(tmp, "state.json")))
+        rows.append(("pipeline", f"{time.perf_counter() - started:6.2f}s  {count} reminders"))
+
+        started = time.perf_counter()
+        count = asyncio.run(send_order_reminders.process_reminders(
+            endpoint=url + "/graphql", reminder_endpoint=url + "/reminders",
+            log_file=os.path.join(tmp, "pipeline.txt"),
+            state_file=os.path.join(tmp, "state.json")))
+        rows.append(("pipeline rerun", f"{time.perf_counter() - started:6.2f}s  {count} reminders"))
+    stop()
+    report(f"{orders} orders, {latency_ms}ms per mock response", rows)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,64 @@
+"""
+Per-request cost of parse() + validate() vs a DocumentStore lookup.
+
+    python -m benchmarks.persisted_queries [requests]
+"""
+import sys
+
+from benchmarks.common import report, scratch_database, timed
+
+REPORT_QUERY = "query CrmReport { totalCustomers totalOrders totalRevenue }"
+
+ORDERS_QUERY = """
+query Orders($first: Int) {
+  allOrders(first: $first) {
+    edges { cursor node {
+      id totalAmount orderDate
+      customer { id name email phone }
+      products(first: 10) {
+        edges { node { id name price stock } }
+        pageInfo { hasNextPage endCursor }
+      }
+    } }
+    pageInfo { hasNextPage hasPreviousPage startCursor endCursor }
+  }
+}
+"""
+
+
+def main(requests=1000):
+    from alx_backend_graphql.schema import schema
+    from crm.documents import DocumentStore
+
+    rows = []
+    for label, query in (("report", REPORT_QUERY), ("allOrders", ORDERS_QUERY)):
+        uncached = DocumentStore(schema.graphql_schema, maxsize=0)
+        cached = DocumentStore(schema.graphql_schema)
+        sha = cached.register(query)
+
+        def parse_each(store=uncached, query=query):
+            for _ in range(requests):
+                store.get(query)
+
+        def lookup_each(store=cached, sha=sha):
+            for _ in range(requests):
+                store.get(sha=sha)
+
+        def text_each(store=cached, query=query):
+            for _ in range(requests):
+                store.get(query)
+
+        cold = timed(parse_each) / requests
+        warm = timed(lookup_each) / requests
+        text = timed(text_each) / requests
+        rows += [
+            (f"{label:9} parse+validate", f"{cold * 1000:9.1f} us"),
+            (f"{label:9} lookup by hash", f"{warm * 1000:9.1f} us"),
+            (f"{label:9} lookup by text", f"{text * 1000:9.1f} us"),
+        ]
+    report(f"per-request document cost, median of 5 x {requests} requests", rows)
+
+
+if __name__ == "__main__":
+    with scratch_database():
+        main(*map(int, sys.argv[1:]))
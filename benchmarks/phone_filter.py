@@ -0,0 +1,61 @@
+"""
+phonePattern: ``phone__startswith`` on the free-form column vs a range on
+the normalized, indexed ``phone_digits``.
+
+    python -m benchmarks.phone_filter [customers] [repeat]
+
+Phones are written in several formats, so the old filter also misses
+most of the customers the pattern means; the match counts show that.
+"""
+import sys
+
+from benchmarks.common import report, scratch_database, timed
+
+FORMATS = ["+1 ({area}) {mid}-{line}", "+1-{area}-{mid}-{line}", "{area}-{mid}-{line}",
+           "+44 {area} {mid} {line}"]
+
+
+def seed(count):
+    from crm.models import Customer
+    from crm.phones import normalize_phone
+
+    batch = []
+    for i in range(count):
+        phone = FORMATS[i // 800 % 4].format(area=200 + i % 800, mid=f"{i // 800 % 1000:03}",
+                                      line=f"{i % 10000:04}")
+        batch.append(Customer(name=f"Customer {i}", email=f"bench{i}@example.com",
+                              phone=phone, phone_digits=normalize_phone(phone)))
+        if len(batch) == 10000:
+            Customer.objects.bulk_create(batch)
+            batch = []
+    Customer.objects.bulk_create(batch)
+
+
+def page(queryset):
+    # what a connection does: count, then the first page
+    return queryset.count(), list(queryset.order_by("pk")[:20])
+
+
+def main(count=500000, repeat=5):
+    from django.db import connection
+
+    from crm.models import Customer
+    from crm.phones import phone_prefix_filter
+
+    seed(count)
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+    rows = []
+    for pattern in ("+1", "+1 (212)", "+1 (212) 04"):
+        old = Customer.objects.filter(phone__startswith=pattern)
+        new = Customer.objects.filter(phone_prefix_filter(pattern))
+        for label, queryset in (("startswith", old), ("phone_digits range", new)):
+            matched = page(queryset)[0]
+            rows.append((f"{pattern!r} {label}",
+                         f"{timed(lambda: page(queryset), repeat):8.2f}  {matched:7} matches"))
+    report(f"{count} customers, count + first 20, median ms", rows)
+
+
+if __name__ == "__main__":
+    with scratch_database():
+        main(*map(int, sys.argv[1:]))
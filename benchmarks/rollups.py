@@ -0,0 +1,69 @@
+"""
+Weekly/monthly report from raw orders vs from the daily rollups, and the
+cost of one incremental rollup run.
+
+    python -m benchmarks.rollups [orders] [days]
+
+``orders`` orders with two items each are spread over ``days`` days.
+"""
+import sys
+from datetime import timedelta
+
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from benchmarks.common import report, scratch_database, timed
+
+
+def seed(count, days):
+    from crm.models import Customer, Order, OrderItem, Product
+
+    products = Product.objects.bulk_create(
+        Product(name=f"Product {i}", price=1, stock=1) for i in range(50))
+    customers = Customer.objects.bulk_create(
+        Customer(name=f"Customer {i}", email=f"bench{i}@example.com") for i in range(1000))
+    now = timezone.now()
+    step = timedelta(days=days) / count
+    orders = Order.objects.bulk_create(
+        Order(customer=customers[i % 1000], total_amount=i % 100) for i in range(count))
+    for i, order in enumerate(orders):
+        order.order_date = now - step * i
+    Order.objects.bulk_update(orders, ["order_date"], batch_size=2000)
+    OrderItem.objects.bulk_create(
+        (OrderItem(order=o, product=products[(o.pk + j) % 50], quantity=1 + j)
+         for o in orders for j in range(2)), batch_size=2000)
+
+
+def raw_totals(start, end):
+    from crm.models import Customer, Order, OrderItem
+    from crm.rollups import day_bounds
+
+    since, until = day_bounds(start)[0], day_bounds(end)[1]
+    orders = Order.objects.filter(order_date__gte=since, order_date__lt=until)
+    return (orders.aggregate(Count("pk"), Sum("total_amount")),
+            OrderItem.objects.filter(order__in=orders).aggregate(Sum("quantity")),
+            Customer.objects.filter(created_at__gte=since, created_at__lt=until).count())
+
+
+def main(count=100000, days=730):
+    from crm.models import DailyRollup
+    from crm.rollups import period_bounds, period_totals, update_rollups
+
+    seed(count, days)
+    backfill = timed(update_rollups, 1)
+    yesterday = timezone.now().date() - timedelta(days=1)
+    DailyRollup.objects.filter(day=yesterday).delete()
+    incremental = timed(update_rollups, 1)
+
+    rows = [("backfill, all days", f"{backfill:8.1f}"),
+            ("incremental, one new day", f"{incremental:8.1f}")]
+    for period in ("week", "month"):
+        bounds = period_bounds(period)
+        rows.append((f"{period} report from orders", f"{timed(lambda: raw_totals(*bounds), 20):8.2f}"))
+        rows.append((f"{period} report from rollups", f"{timed(lambda: period_totals(*bounds), 20):8.2f}"))
+    report(f"{count} orders over {days} days, median ms", rows)
+
+
+if __name__ == "__main__":
+    with scratch_database():
+        main(*map(int, sys.argv[1:]))
@@ -0,0 +1,66 @@
+"""
+Customer search: allCustomers(name:) (icontains, a full scan) vs
+searchCustomers (the FTS5 / tsvector index), as a search box types.
+
+    python -m benchmarks.search [customers] [repeat]
+
+Names are built from 400 first and 2500 last names, so a typed prefix
+matches anything from a few hundred to many thousand customers.
+"""
+import random
+import string
+import sys
+
+from django.test import RequestFactory
+
+from benchmarks.common import report, scratch_database, timed
+
+FILTER = "query ($q: String) { allCustomers(name: $q, first: 20) { edges { node { name } } } }"
+SEARCH = "query ($q: String!) { searchCustomers(query: $q, first: 20) { edges { node { name } } } }"
+
+
+def words(count, rng):
+    return ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9))).title()
+            for _ in range(count)]
+
+
+def seed(count):
+    from crm.models import Customer
+
+    rng = random.Random(0)
+    first, last = words(400, rng), words(2500, rng)
+    batch = []
+    for i in range(count):
+        name = f"{first[i % 400]} {last[i * 7 % 2500]}"
+        batch.append(Customer(name=name, email=f"{name.replace(' ', '.').lower()}{i}@example.com"))
+        if len(batch) == 10000:
+            Customer.objects.bulk_create(batch)
+            batch = []
+    Customer.objects.bulk_create(batch)
+    return first[0], last[0]
+
+
+def main(count=1000000, repeat=5):
+    from django.conf import settings
+
+    from alx_backend_graphql.schema import schema
+
+    settings.CRM_RESPONSE_CACHE_BACKEND = None
+    first, last = seed(count)
+    request = RequestFactory().post("/graphql/")
+
+    def run(query, q):
+        result = schema.execute(query, variables={"q": q}, context_value=request)
+        assert result.errors is None, result.errors
+
+    rows = []
+    for typed in (first[:2], first[:4], first, f"{first} {last[:3]}"):
+        # icontains needs the whole phrase as one substring; search takes words
+        rows.append((f"allCustomers(name: {typed!r})", f"{timed(lambda: run(FILTER, typed), repeat):8.2f}"))
+        rows.append((f"searchCustomers({typed!r})", f"{timed(lambda: run(SEARCH, typed), repeat):8.2f}"))
+    report(f"{count} customers, first 20 results, median ms", rows)
+
+
+if __name__ == "__main__":
+    with scratch_database():
+        main(*map(int, sys.argv[1:]))
@@ -0,0 +1,92 @@
+"""
+Lifetime order aggregates stored on Customer: order_count, total_spent and
+last_order_date.
+
+``crm.signals`` keeps them current inside the transaction that writes the
+order (Order.save() and deletes are atomic): a new order is one UPDATE of
+its customer with F() increments, a changed total one more, and a deleted
+or moved order recomputes its customers from their orders through the
+(customer, order_date) index. ``manage.py backfill_customer_aggregates``
+checks every customer with one grouped query and recomputes only the
+ones that drifted.
+"""
+from decimal import Decimal
+
+from django.apps import apps as global_apps
+from django.db.models import (Case, Count, DecimalField, F, Max, OuterRef, Q,
+                              Subquery, Sum, Value, When)
+from django.db.models.functions import Coalesce
+
+from .bulk import default_batch_size
+from .models import Customer
+from .response_cache import invalidate
+
+AGGREGATE_FIELDS = ("order_count", "total_spent", "last_order_date")
+
+
+def record_order(customer_id, total, order_date):
+    """Add a new order to its customer's aggregates."""
+    Customer.objects.filter(pk=customer_id).update(
+        order_count=F("order_count") + 1,
+        total_spent=F("total_spent") + total,
+        last_order_date=Case(
+            When(Q(last_order_date__isnull=True) | Q(last_order_date__lt=order_date),
+                 then=Value(order_date)),
+            default=F("last_order_date")),
+    )
+    invalidate(Customer)
+
+
+def adjust_total(customer_id, delta):
+    Customer.objects.filter(pk=customer_id).update(total_spent=F("total_spent") + delta)
+    invalidate(Customer)
+
+
+def refresh(customer_ids, apps=global_apps):
+    """
+    Recompute the aggregates of ``customer_ids`` from their orders; one
+    UPDATE whose subqueries seek the (customer, order_date) index.
+    """
+    customers = apps.get_model("crm", "Customer")
+    orders = (apps.get_model("crm", "Order").objects
+              .filter(customer=OuterRef("pk")).order_by().values("customer"))
+    customers.objects.filter(pk__in=customer_ids).update(
+        order_count=Coalesce(Subquery(orders.annotate(n=Count("pk")).values("n")), 0),
+        total_spent=Coalesce(
+            Subquery(orders.annotate(total=Sum("total_amount")).values("total")),
+            Value(Decimal("0")), output_field=DecimalField()),
+        last_order_date=Subquery(orders.annotate(last=Max("order_date")).values("last")),
+    )
+    if apps is global_apps:
+        invalidate(Customer)
+
+
+def backfill(batch_size=None, dry_run=False, apps=global_apps):
+    """
+    Find the customers whose aggregates differ from their orders with one
+    grouped query and recompute them, ``batch_size`` per UPDATE. Returns
+    how many drifted. ``apps`` lets migrations pass their state.
+    """
+    model = apps.get_model("crm", "Customer")
+    batch_size = batch_size or default_batch_size()
+    exact = (model.objects
+             .annotate(exact_count=Count("orders"),
+                       exact_total=Sum("orders__total_amount"),
+                       exact_last=Max("orders__order_date"))
+             .order_by("pk")
+             .values_list("pk", *AGGREGATE_FIELDS,
+                          "exact_count", "exact_total", "exact_last"))
+    drifted, batch = 0, []
+    for pk, count, total, last, exact_count, exact_total, exact_last in exact.iterator(
+            chunk_size=batch_size):
+        exact_total = (exact_total or Decimal("0")).quantize(Decimal("0.01"))
+        if (count, total, last) == (exact_count, exact_total, exact_last):
+            continue
+        drifted += 1
+        batch.append(pk)
+        if len(batch) >= batch_size and not dry_run:
+            refresh(batch, apps)
+            batch = []
+    if batch and not dry_run:
+        refresh(batch, apps)
+    return drifted
@@ -0,0 +1,103 @@
+"""
+Set-based creation helpers shared by the bulk mutations and importers.
+
+Rows are validated in memory, duplicate emails are found with a single
+``email__in`` lookup, and survivors are written with ``bulk_create`` in
+chunks instead of one ``exists()`` + ``full_clean()`` + ``save()`` per row.
+"""
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from .models import CrmStats, Customer, Product
+from .phones import normalize_phone
+from .response_cache import invalidate
+
+
+def default_batch_size():
+    return getattr(settings, "CRM_BULK_BATCH_SIZE", 500)
+
+
+def validate_customers(rows):
+    """
+    Build unsaved Customers from ``rows`` (mappings with name/email/phone).
+
+    Field validators run without touching the database; the unique email
+    constraint is checked for the whole batch with one query. Returns
+    ``(customers, errors)``.
+    """
+    customers, errors, emails = [], [], set()
+    for row in rows:
+        customer = Customer(name=row.get("name"), email=row.get("email"),
+                            phone=row.get("phone") or "")
+        # bulk_create skips save(), which normally sets it
+        customer.phone_digits = normalize_phone(customer.phone)
+        try:
+            customer.full_clean(validate_unique=False)
+        except ValidationError as ve:
+            errors.extend(ve.messages)
+            continue
+        if customer.email in emails:
+            errors.append(f"{customer.email} already exists.")
+            continue
+        emails.add(customer.email)
+        customers.append(customer)
+
+    taken = set(Customer.objects.filter(email__in=emails)
+                .values_list("email", flat=True))
+    errors.extend(f"{c.email} already exists." for c in customers if c.email in taken)
+    return [c for c in customers if c.email not in taken], errors
+
+
+def validate_products(rows):
+    """Build unsaved Products from ``rows`` (mappings with name/price/stock)."""
+    products, errors = [], []
+    for row in rows:
+        price = row.get("price")
+        if isinstance(price, float):
+            # avoid binary float noise failing the decimal_places check
+            price = str(price)
+        product = Product(name=row.get("name"), price=price,
+                          stock=row.get("stock") or 0)
+        try:
+            product.full_clean()
+        except ValidationError as ve:
+            errors.extend(ve.messages)
+            continue
+        products.append(product)
+    return products, errors
+
+
+def insert_customers(customers, batch_size=None):
+    """
+    ``bulk_create`` validated customers in chunks of ``batch_size``.
+
+    A chunk that loses a race on the unique email is retried without the
+    emails that were inserted concurrently. Returns ``(created, errors)``.
+    """
+    batch_size = batch_size or default_batch_size()
+    created, errors = [], []
+    for start in range(0, len(customers), batch_size):
+        chunk = customers[start:start + batch_size]
+        try:
+            with transaction.atomic():
+                created.extend(Customer.objects.bulk_create(chunk))
+        except IntegrityError:
+            taken = set(Customer.objects.filter(
+                email__in=[c.email for c in chunk]).values_list("email", flat=True))
+            errors.extend(f"{email} already exists." for email in taken)
+            created.extend(Customer.objects.bulk_create(
+                [c for c in chunk if c.email not in taken]))
+    if created:
+        # bulk_create skips post_save, so counters and caches are updated here
+        CrmStats.bump(customers=len(created))
+        invalidate(Customer)
+    return created, errors
+
+
+def bulk_create_customers(rows, batch_size=None):
+    """Validate and insert ``rows`` in one transaction; returns (created, errors)."""
+    with transaction.atomic():
+        customers, errors = validate_customers(rows)
+        created, race_errors = insert_customers(customers, batch_size)
+    return created, errors + race_errors
@@ -0,0 +1,99 @@
+"""
+Set-based removal of inactive customers.
+
+A customer is inactive when NOT EXISTS an order of theirs placed in the
+last ``days`` days; customers who never ordered are inactive too.
+Customers are walked in primary-key ranges of ``chunk_size``, and each
+range is deleted in its own short transaction with three DELETEs (order
+items, orders, customers) instead of Django's collector, which would load
+every related row and send a signal per row. The counter deltas and the
+Checkpoint are written in the same transaction, so an interrupted run
+resumes after the last committed range.
+"""
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, Max, OuterRef, Sum
+from django.utils import timezone
+
+from .models import Checkpoint, CrmStats, Customer, Order, OrderItem
+from .response_cache import invalidate
+
+CHECKPOINT = "cleanup_inactive_customers"
+
+CleanupResult = namedtuple("CleanupResult", "customers orders items")
+
+
+def default_cleanup_chunk_size():
+    return getattr(settings, "CRM_CLEANUP_CHUNK_SIZE", 1000)
+
+
+def inactive_customers(cutoff):
+    """Customers with no order on or after ``cutoff`` (an anti-join)."""
+    recent = Order.objects.filter(customer=OuterRef("pk"), order_date__gte=cutoff)
+    return Customer.objects.filter(~Exists(recent))
+
+
+def _count(customers):
+    orders = Order.objects.filter(customer__in=customers)
+    return CleanupResult(customers.count(), orders.count(),
+                         OrderItem.objects.filter(order__in=orders).count())
+
+
+def _delete_range(cutoff, start, end):
+    # lock the range: an order placed meanwhile waits on its customer row
+    ids = list(inactive_customers(cutoff).select_for_update()
+               .filter(pk__gt=start, pk__lte=end).values_list("pk", flat=True))
+    if not ids:
+        return CleanupResult(0, 0, 0)
+    orders = Order.objects.filter(customer_id__in=ids)
+    totals = orders.aggregate(count=Count("pk"), revenue=Sum("total_amount"))
+    # _raw_delete issues a single DELETE ... WHERE without collecting rows
+    items = OrderItem.objects.filter(order__customer_id__in=ids)
+    deleted_items = items._raw_delete(items.db)
+    orders._raw_delete(orders.db)
+    customers = Customer.objects.filter(pk__in=ids)
+    customers._raw_delete(customers.db)
+    CrmStats.bump(customers=-len(ids), orders=-totals["count"],
+                  revenue=-(totals["revenue"] or 0))
+    invalidate(Customer, Order, OrderItem)
+    return CleanupResult(len(ids), totals["count"], deleted_items)
+
+
+def delete_inactive_customers(days=365, chunk_size=None, dry_run=False,
+                              restart=False, progress=None):
+    """
+    Delete customers without an order in the last ``days`` days.
+
+    Returns a CleanupResult of deleted (or, with ``dry_run``, matching)
+    customers, orders and order items. ``progress(position, result)`` is
+    called after each committed range. A dry run only counts and leaves
+    the checkpoint alone.
+    """
+    chunk_size = chunk_size or default_cleanup_chunk_size()
+    cutoff = timezone.now() - timedelta(days=days)
+    checkpoint, _ = Checkpoint.objects.get_or_create(name=CHECKPOINT)
+    start = 0 if restart else checkpoint.position
+    if dry_run:
+        return _count(inactive_customers(cutoff).filter(pk__gt=start))
+
+    last = Customer.objects.aggregate(last=Max("pk"))["last"] or 0
+    customers = orders = items = 0
+    while start < last:
+        end = start + chunk_size
+        with transaction.atomic():
+            deleted = _delete_range(cutoff, start, end)
+            checkpoint.position = end
+            checkpoint.save(update_fields=["position", "updated_at"])
+        customers += deleted.customers
+        orders += deleted.orders
+        items += deleted.items
+        start = end
+        if progress:
+            progress(start, CleanupResult(customers, orders, items))
+    # finished: the next run walks every range again
+    checkpoint.position = 0
+    checkpoint.save(update_fields=["position", "updated_at"])
+    return CleanupResult(customers, orders, items)
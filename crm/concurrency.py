@@ -0,0 +1,83 @@
+"""
+Bridge between the async GraphQL view and the synchronous ORM.
+
+The schema's resolvers (DjangoFilterConnectionField, the DataLoaders, the
+mutations) are synchronous. Instead of rewriting each of them against the
+async ORM, which itself hops to a thread for every query, ``run_sync``
+runs a whole unit of work in a bounded pool of database threads. Each
+worker keeps its own connection. Within a ``request_scope()`` it reuses
+that connection for every unit of the request and applies CONN_MAX_AGE
+(``close_old_connections``) only when it starts work for another request,
+as ``request_started`` does for a request thread. Outside a scope every
+unit is its own request. ``ThreadedExecutionContext`` uses it to resolve
+every root field of a query in its own worker, so the root fields run
+concurrently.
+"""
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections
+from graphql import ExecutionContext
+
+from .instrumentation import current_profile, profiling
+
+_executor = None
+_executor_lock = threading.Lock()
+# the request a unit of work belongs to, and the last one each worker served
+_request = contextvars.ContextVar("crm_db_request", default=None)
+_worker = threading.local()
+
+
+def executor():
+    """The process-wide pool, sized by ``CRM_ASYNC_DB_WORKERS``."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "CRM_ASYNC_DB_WORKERS", 8),
+                thread_name_prefix="crm-db",
+            )
+        return _executor
+
+
+@contextmanager
+def request_scope():
+    """Units run by ``run_sync`` inside this block share their connections."""
+    token = _request.set(object())
+    try:
+        yield
+    finally:
+        _request.reset(token)
+
+
+def _call(fn, args, kwargs):
+    request = _request.get()
+    if request is None or getattr(_worker, "request", None) is not request:
+        close_old_connections()
+        _worker.request = request
+    # the worker's own connection reports to the caller's profile
+    with profiling(current_profile()):
+        return fn(*args, **kwargs)
+
+
+async def run_sync(fn, *args, **kwargs):
+    """Await ``fn(*args, **kwargs)`` run in a database worker thread."""
+    loop = asyncio.get_running_loop()
+    # run_in_executor does not carry context variables over by itself
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        executor(), partial(context.run, _call, fn, args, kwargs))
+
+
+class ThreadedExecutionContext(ExecutionContext):
+    """Resolve each root field, with its whole subtree, in a worker thread."""
+
+    def execute_field(self, parent_type, source, field_nodes, path):
+        if path.prev is not None:
+            return super().execute_field(parent_type, source, field_nodes, path)
+        return run_sync(super().execute_field, parent_type, source, field_nodes, path)
@@ -0,0 +1,147 @@
+"""
+Static cost analysis for GraphQL operations, run before execution.
+
+The cost approximates the number of rows an operation can load:
+
+* every object field (``customer``, ``order``, ...) costs 1,
+* a connection costs 1 plus, for each node on the page, 1 + the cost of
+  the node's own selection; the page is ``first``/``last``, or when neither
+  is given the max page size for a root field (that is what graphene-django
+  returns) and ``CRM_QUERY_NESTED_PAGE_ESTIMATE`` for a connection nested
+  in a node (an order's products, a customer's orders), which in practice
+  holds a handful of rows rather than a full page,
+* scalars and connection plumbing (``edges``, ``node``, ``pageInfo``) are
+  free.
+
+So ``allCustomers(first: 100) { edges { node { orders(first: 100) { ... } } } }``
+costs about 100 * 100 and is rejected long before any SQL runs. Depth
+counts object levels the same way, ignoring the plumbing.
+"""
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from graphene import relay
+from graphene_django.settings import graphene_settings
+from graphql import (FieldNode, FragmentDefinitionNode, FragmentSpreadNode, GraphQLError,
+                     GraphQLObjectType, InlineFragmentNode, get_named_type,
+                     get_operation_ast)
+from graphql.execution.values import get_argument_values
+
+PLUMBING = ("edges", "node", "pageInfo")
+
+
+def cost_limits():
+    """``(max_cost, max_depth, max_page_size)`` from settings."""
+    return (
+        getattr(settings, "CRM_QUERY_COST_LIMIT", 5000),
+        getattr(settings, "CRM_QUERY_DEPTH_LIMIT", 6),
+        graphene_settings.RELAY_CONNECTION_MAX_LIMIT,
+    )
+
+
+def cost_error(message, code):
+    return GraphQLError(message, extensions={"code": code})
+
+
+def is_connection(named_type):
+    graphene_type = getattr(named_type, "graphene_type", None)
+    return isinstance(graphene_type, type) and issubclass(graphene_type, relay.Connection)
+
+
+@dataclass
+class QueryCost:
+    cost: int = 0
+    depth: int = 0
+    errors: list = field(default_factory=list)
+
+    def as_extension(self, max_cost, max_depth):
+        return {"requested": self.cost, "limit": max_cost,
+                "depth": self.depth, "maxDepth": max_depth}
+
+
+class CostAnalysis:
+    def __init__(self, schema, document, variables, max_page_size):
+        self.schema = schema
+        self.variables = variables or {}
+        self.max_page_size = max_page_size
+        self.nested_page_size = min(
+            getattr(settings, "CRM_QUERY_NESTED_PAGE_ESTIMATE", 10), max_page_size)
+        self.fragments = {d.name.value: d for d in document.definitions
+                          if isinstance(d, FragmentDefinitionNode)}
+        self.errors = []
+
+    def selection(self, parent_type, selection_set, visited=()):
+        """``(cost, depth)`` of ``selection_set`` on ``parent_type``."""
+        cost = depth = 0
+        for node in selection_set.selections if selection_set else ():
+            if isinstance(node, FieldNode):
+                field_cost, field_depth = self.field(parent_type, node, visited)
+            elif isinstance(node, InlineFragmentNode):
+                on = (self.schema.get_type(node.type_condition.name.value)
+                      if node.type_condition else parent_type)
+                field_cost, field_depth = self.selection(on, node.selection_set, visited)
+            elif isinstance(node, FragmentSpreadNode):
+                fragment = self.fragments.get(node.name.value)
+                if fragment is None or node.name.value in visited:
+                    continue
+                field_cost, field_depth = self.selection(
+                    self.schema.get_type(fragment.type_condition.name.value),
+                    fragment.selection_set, visited + (node.name.value,))
+            else:
+                continue
+            cost += field_cost
+            depth = max(depth, field_depth)
+        return cost, depth
+
+    def field(self, parent_type, node, visited):
+        fields = getattr(parent_type, "fields", {})
+        definition = fields.get(node.name.value)
+        if definition is None:
+            return 0, 0
+        named = get_named_type(definition.type)
+        if not isinstance(named, GraphQLObjectType):
+            return 0, 0
+        children, depth = self.selection(named, node.selection_set, visited)
+        root = parent_type is self.schema.query_type
+        if node.name.value in PLUMBING and not root:
+            return children, depth
+        if not is_connection(named):
+            return 1 + children, 1 + depth
+        return 1 + self.page_size(definition, node, root) * (1 + children), 1 + depth
+
+    def page_size(self, definition, node, root=True):
+        try:
+            args = get_argument_values(definition, node, self.variables)
+        except GraphQLError:
+            # execution reports bad variables; assume the worst page here
+            return self.max_page_size
+        sizes = [args[name] for name in ("first", "last") if args.get(name) is not None]
+        if any(size > self.max_page_size for size in sizes):
+            self.errors.append(cost_error(
+                f"Requested page size on `{node.name.value}` exceeds the "
+                f"limit of {self.max_page_size}.", "PAGE_SIZE_EXCEEDED"))
+        return max(sizes, default=self.max_page_size if root else self.nested_page_size)
+
+
+def analyze(schema, document, operation_name=None, variables=None):
+    """
+    Estimate the cost of the operation to run and check it against limits.
+
+    Returns a QueryCost whose ``errors`` are non-empty if the operation
+    must be rejected.
+    """
+    max_cost, max_depth, max_page_size = cost_limits()
+    operation = get_operation_ast(document, operation_name)
+    if operation is None:
+        return QueryCost()
+    root = schema.get_root_type(operation.operation)
+    analysis = CostAnalysis(schema, document, variables, max_page_size)
+    cost, depth = analysis.selection(root, operation.selection_set)
+    result = QueryCost(cost, depth, analysis.errors)
+    if max_depth and depth > max_depth:
+        result.errors.append(cost_error(
+            f"Query depth {depth} exceeds the limit of {max_depth}.", "QUERY_TOO_DEEP"))
+    if max_cost and cost > max_cost:
+        result.errors.append(cost_error(
+            f"Query cost {cost} exceeds the limit of {max_cost}.", "QUERY_TOO_COMPLEX"))
+    return result
@@ -8,9 +8,9 @@ set LOG_FILE=%TEMP%\customer_cleanup_log.txt
 REM Navigate to project root
 cd /d "%~dp0..\.."
 
-REM Execute Django shell command
+REM Delete customers with no orders in the last year, in chunked transactions
 set "DELETED_COUNT="
-for /f %%i in ('python manage.py shell -c "from django.utils import timezone; from datetime import timedelta; from customers.models import Customer; from django.db.models import Count; one_year_ago = timezone.now() - timedelta(days=365); inactive_customers = Customer.objects.annotate(order_count=Count('orders')).filter(order_count=0); count = inactive_customers.count(); inactive_customers.delete(); print(count)"') do (
+for /f %%i in ('python manage.py cleanup_customers %*') do (
     set DELETED_COUNT=%%i
 )
 
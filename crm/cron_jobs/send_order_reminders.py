@@ -1,89 +1,186 @@
 #!/usr/bin/env python3
 """
 GraphQL-based Order Reminder Script
-Queries pending orders from the last 7 days and logs reminders
+Sends reminders for orders from the last 7 days and logs them
+
+Runs as an asyncio pipeline: pages through allOrdersKeyset oldest first
+with keyset cursors (the next page is fetched while the current one is
+being sent), sends at most CONCURRENCY reminders at a time, appends log
+lines in batched flushes, and saves the last processed cursor to
+STATE_FILE after each flush, so the next run only sees newer orders.
 """
 
+import asyncio
+import json
 import os
 import sys
-from datetime import datetime, timedelta
-from gql import gql, Client
-from gql.transport.aiohttp import AIOHTTPTransport
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit
+
+import aiohttp
+
+# Run as a script from cron: make the project importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from crm.graphql_client import (async_client, client_options, document,  # noqa: E402
+                                execute_async)
 
 # Configuration
-GRAPHQL_ENDPOINT = "http://localhost:8000/graphql"
+# the token endpoint; the client sends CRM_API_TOKEN from the environment,
+# and a run without one stops before the first request (see check_token)
+GRAPHQL_ENDPOINT = os.environ.get("CRM_GRAPHQL_ENDPOINT", "http://localhost:8000/graphql/api/")
+# POST each reminder here when set; otherwise reminders are only logged
+REMINDER_ENDPOINT = os.environ.get("CRM_REMINDER_ENDPOINT")
 LOG_FILE = "/tmp/order_reminders_log.txt"
+STATE_FILE = "/tmp/order_reminders_state.json"
+PAGE_SIZE = 100
+CONCURRENCY = 20
+FLUSH_EVERY = 500
 
-def create_graphql_client():
-    """Create and return a GraphQL client instance"""
-    transport = AIOHTTPTransport(url=GRAPHQL_ENDPOINT)
-    client = Client(transport=transport, fetch_schema_from_transport=False)
-    return client
-
-def get_pending_orders():
-    """Query GraphQL for orders from the last 7 days"""
-    client = create_graphql_client()
-    
-    # Calculate date 7 days ago
-    seven_days_ago = datetime.now() - timedelta(days=7)
-    date_str = seven_days_ago.isoformat()
-    
-    query = gql("""
-        query GetPendingOrders($dateFrom: String!) {
-            orders(where: {orderDate: {gte: $dateFrom}}) {
-                id
-                customer {
-                    email
+# Parsed once. allOrdersKeyset is sorted newest first, so last/before
+# page towards newer orders; its cursors stay valid across runs
+PENDING_ORDERS = document("""
+    query PendingOrders($since: DateTime!, $last: Int!, $before: String) {
+        allOrdersKeyset(orderDate_Gte: $since, last: $last, before: $before) {
+            edges {
+                node {
+                    id
+                    orderDate
+                    customer {
+                        email
+                    }
                 }
-                orderDate
-                status
+            }
+            pageInfo {
+                hasPreviousPage
+                startCursor
             }
         }
-    """)
-    
+    }
+""")
+
+
+class LogBuffer:
+    """Collects log lines and appends them to the file in one write"""
+
+    def __init__(self, path, flush_every):
+        self.path = path
+        self.flush_every = flush_every
+        self.lines = []
+
+    @property
+    def full(self):
+        return len(self.lines) >= self.flush_every
+
+    def extend(self, lines):
+        self.lines.extend(lines)
+
+    def flush(self):
+        if self.lines:
+            with open(self.path, 'a') as f:
+                f.writelines(self.lines)
+            self.lines = []
+
+
+def load_cursor(path):
+    """The last processed cursor, or None on the first run"""
     try:
-        result = client.execute(query, variable_values={"dateFrom": date_str})
-        return result.get('orders', [])
-    except Exception as e:
-        print(f"Error querying GraphQL: {e}")
-        return []
+        with open(path) as f:
+            return json.load(f).get("cursor")
+    except (OSError, ValueError):
+        return None
+
+
+def save_cursor(path, cursor):
+    # write-then-rename, so a crash never leaves a truncated state file
+    with open(path + ".tmp", 'w') as f:
+        json.dump({"cursor": cursor}, f)
+    os.replace(path + ".tmp", path)
+
+
+async def fetch_page(session, since, before, page_size):
+    """The next orders after `before`, oldest first, and the new cursor"""
+    data = await execute_async(session, PENDING_ORDERS, {
+        "since": since, "last": page_size, "before": before,
+    })
+    connection = data["allOrdersKeyset"]
+    orders = [edge["node"] for edge in reversed(connection["edges"])]
+    page_info = connection["pageInfo"]
+    return orders, page_info["startCursor"], page_info["hasPreviousPage"]
+
+
+async def send_reminder(http, semaphore, order, timestamp, reminder_endpoint):
+    """Send one reminder and return its log line"""
+    customer_email = (order.get('customer') or {}).get('email', 'N/A')
+    if http is not None:
+        async with semaphore:
+            async with http.post(reminder_endpoint, json={
+                "orderId": order['id'], "email": customer_email,
+            }) as response:
+                response.raise_for_status()
+    return f"{timestamp} - Order ID: {order['id']}, Customer Email: {customer_email}\n"
 
-def log_order_reminders(orders):
-    """Log order reminders to the specified file"""
+
+def check_token(endpoint):
+    """Fail before the first page instead of on a 403 from /graphql/api/."""
+    if urlsplit(endpoint).path.rstrip("/").endswith("/graphql/api") \
+            and not client_options()["token"]:
+        raise RuntimeError(
+            f"CRM_API_TOKEN is not set, and {endpoint} refuses requests without it. "
+            "Set CRM_API_TOKEN to the server's token, or point CRM_GRAPHQL_ENDPOINT "
+            "at an endpoint that needs none.")
+
+
+async def process_reminders(endpoint=GRAPHQL_ENDPOINT, reminder_endpoint=REMINDER_ENDPOINT,
+                            log_file=LOG_FILE, state_file=STATE_FILE, page_size=PAGE_SIZE,
+                            concurrency=CONCURRENCY, flush_every=FLUSH_EVERY, days=7):
+    """Send reminders for orders not yet processed; returns how many"""
+    check_token(endpoint)
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
+    since = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+    cursor = load_cursor(state_file)
+    log = LogBuffer(log_file, flush_every)
+    semaphore = asyncio.Semaphore(concurrency)
+    processed = 0
+
+    http = aiohttp.ClientSession() if reminder_endpoint else None
+    page = None
     try:
-        with open(LOG_FILE, 'a') as f:
-            for order in orders:
-                order_id = order.get('id')
-                customer_email = order.get('customer', {}).get('email', 'N/A')
-                log_entry = f"{timestamp} - Order ID: {order_id}, Customer Email: {customer_email}\n"
-                f.write(log_entry)
-        return True
-    except Exception as e:
-        print(f"Error writing to log file: {e}")
-        return False
+        async with async_client(endpoint) as session:
+            page = asyncio.ensure_future(fetch_page(session, since, cursor, page_size))
+            while page is not None:
+                orders, start_cursor, more = await page
+                page = (asyncio.ensure_future(fetch_page(session, since, start_cursor, page_size))
+                        if more else None)
+                log.extend(await asyncio.gather(*(
+                    send_reminder(http, semaphore, order, timestamp, reminder_endpoint)
+                    for order in orders
+                )))
+                processed += len(orders)
+                cursor = start_cursor or cursor
+                if log.full:
+                    log.flush()
+                    save_cursor(state_file, cursor)
+            log.flush()
+            save_cursor(state_file, cursor)
+    finally:
+        if page is not None:
+            page.cancel()
+        if http is not None:
+            await http.close()
+    return processed
+
 
 def main():
     """Main function to process order reminders"""
     try:
-        # Get pending orders from last 7 days
-        orders = get_pending_orders()
-        
-        if orders:
-            # Log the reminders
-            if log_order_reminders(orders):
-                print("Order reminders processed!")
-            else:
-                print("Failed to log order reminders")
-                sys.exit(1)
-        else:
+        processed = asyncio.run(process_reminders())
+        if not processed:
             print("No pending orders found from the last 7 days")
-            print("Order reminders processed!")
-            
+        print("Order reminders processed!")
     except Exception as e:
         print(f"Error processing order reminders: {e}")
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
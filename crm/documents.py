@@ -0,0 +1,151 @@
+"""
+Parsed-and-validated GraphQL documents, keyed by the sha256 of their text.
+
+Backs persisted queries on the /graphql/ endpoint (Apollo's APQ protocol:
+``extensions.persistedQuery.sha256Hash``) and lets every repeated query
+text skip ``parse()`` and ``validate()``. Allow-listed operations loaded
+from ``*.graphql`` files are pinned; everything else lives in a bounded LRU.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from graphene_django.settings import graphene_settings
+from graphql import GraphQLError, parse, validate
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+
+def persisted_error(message, code):
+    return GraphQLError(message, extensions={"code": code})
+
+
+class DocumentStore:
+    """Thread-safe sha256 -> DocumentNode store with hit/miss counters."""
+
+    def __init__(self, schema, rules=None, maxsize=256, allow_list_only=False):
+        self.schema = schema
+        self.rules = rules
+        self.maxsize = maxsize
+        self.allow_list_only = allow_list_only
+        self._pinned = {}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+        self.compile_seconds = 0.0
+
+    @classmethod
+    def from_settings(cls, schema, rules=None):
+        store = cls(
+            schema, rules,
+            maxsize=getattr(settings, "CRM_DOCUMENT_CACHE_SIZE", 256),
+            allow_list_only=getattr(settings, "CRM_PERSISTED_QUERIES_ONLY", False),
+        )
+        directory = getattr(settings, "CRM_PERSISTED_QUERIES_DIR", None)
+        if directory:
+            store.load_dir(directory)
+        return store
+
+    def register(self, query):
+        """Allow-list ``query``; it is validated now and never evicted."""
+        document, errors = self.compile(query)
+        if errors:
+            raise ImproperlyConfigured(
+                f"Persisted query is invalid: {errors[0].message}")
+        sha = query_hash(query)
+        self._pinned[sha] = document
+        return sha
+
+    def load_dir(self, path):
+        """Register every ``*.graphql`` file in ``path``; returns their hashes."""
+        return {file.name: self.register(file.read_text(encoding="utf-8"))
+                for file in sorted(Path(path).glob("*.graphql"))}
+
+    def get(self, query=None, sha=None):
+        """
+        Return ``(document, errors)`` for a query text and/or its hash.
+
+        A hash without text must already be known (APQ's first round trip
+        answers PersistedQueryNotFound); text with a hash registers it.
+        """
+        if query is not None and sha and query_hash(query) != sha:
+            return None, [persisted_error("provided sha does not match query",
+                                          "PERSISTED_QUERY_HASH_MISMATCH")]
+        key = sha or query_hash(query)
+        document = self._lookup(key)
+        if document is not None:
+            return document, []
+        if query is None:
+            return None, [persisted_error("PersistedQueryNotFound",
+                                          "PERSISTED_QUERY_NOT_FOUND")]
+        if self.allow_list_only:
+            return None, [persisted_error("Only allow-listed operations may be executed.",
+                                          "PERSISTED_QUERY_NOT_ALLOWED")]
+
+        document, errors = self.compile(query)
+        if not errors:
+            self._store(key, document)
+        return document, errors
+
+    def compile(self, query):
+        started = time.perf_counter()
+        try:
+            document = parse(query)
+        except GraphQLError as e:
+            return None, [e]
+        errors = validate(self.schema, document, self.rules,
+                          graphene_settings.MAX_VALIDATION_ERRORS)
+        with self._lock:
+            self.misses += 1
+            self.compile_seconds += time.perf_counter() - started
+        return document, errors
+
+    def stats(self):
+        """Counters for monitoring, including the parse/validate time saved."""
+        with self._lock:
+            average = self.compile_seconds / self.misses if self.misses else 0.0
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "cached": len(self._cache),
+                "pinned": len(self._pinned),
+                "avg_compile_ms": average * 1000,
+                "saved_ms": self.hits * average * 1000,
+            }
+
+    def _lookup(self, key):
+        with self._lock:
+            document = self._pinned.get(key)
+            if document is None:
+                document = self._cache.get(key)
+                if document is not None:
+                    self._cache.move_to_end(key)
+            if document is not None:
+                self.hits += 1
+            return document
+
+    def _store(self, key, document):
+        with self._lock:
+            self._cache[key] = document
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def shared_store(schema, rules=None):
+    """The process-wide store for ``schema``, built from settings on first use."""
+    key = (schema, tuple(rules) if rules else None)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = DocumentStore.from_settings(schema, rules)
+        return _stores[key]
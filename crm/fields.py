@@ -0,0 +1,309 @@
+import json
+from functools import partial
+
+import graphene
+from django.core.exceptions import ValidationError
+from django.db.models import F, Model, Q
+from graphene import relay
+from graphene_django.filter import DjangoFilterConnectionField
+from graphene_django.utils import maybe_queryset
+from graphql_relay.utils import base64, unbase64
+
+from .loaders import DataLoader, get_registry, group_by_key
+from .optimizer import (filter_key, include_fields, optimize_queryset,
+                        prefetch_attr)
+from .search import result_window, search
+
+
+class BatchedFilterConnectionField(DjangoFilterConnectionField):
+    """
+    DjangoFilterConnectionField that feeds the request's DataLoaders.
+
+    Every resolved page is remembered so child loaders can batch over it.
+    When ``batch_key`` is given (the ORM path from the node back to its
+    parent, e.g. ``customer_id``) and the field is resolved on a model
+    instance, the children of all sibling parents are fetched in a single
+    query and paginated in memory, unless the parent queryset already
+    prefetched them (see ``crm.optimizer``).
+
+    Querysets are narrowed to the client's selection before they run.
+
+    ``order_by`` maps the sort keys a client may pass as ``orderBy`` (e.g.
+    ``"-totalSpent"``) to an index-backed keyset such as
+    ``("total_spent", "id")``. A sorted page is paginated like
+    KeysetConnectionField, by seeking past the cursor's key values, so deep
+    pages stay index range scans; any other key is rejected.
+    """
+
+    def __init__(self, type_, *args, batch_key=None, order_by=None, **kwargs):
+        self.batch_key = batch_key
+        self.order_keys = dict(order_by or {})
+        super().__init__(type_, *args, **kwargs)
+        if self.order_keys:
+            self._base_args["order_by"] = graphene.String(
+                description="Sort key, '-' prefixed for descending: "
+                            + ", ".join(self.order_keys) + ".")
+
+    def wrap_resolve(self, parent_resolver):
+        return partial(
+            self.batched_resolver,
+            self.resolver or parent_resolver,
+            self.connection_type,
+            self.get_manager(),
+            self.get_queryset_resolver(),
+            self.max_limit,
+            self.enforce_first_or_last,
+            self.batch_key,
+            self.order_keys,
+        )
+
+    @classmethod
+    def batched_resolver(cls, resolver, connection, default_manager,
+                         queryset_resolver, max_limit, enforce_first_or_last,
+                         batch_key, order_keys, root, info, **args):
+        registry = get_registry(info)
+        resolve_queryset = queryset_resolver
+        if args.get("order_by"):
+            args["order_by"] = order_keyset(order_keys, args["order_by"], info.field_name)
+            if args.get("offset") is not None:
+                raise ValidationError("`offset` cannot be combined with `orderBy`; "
+                                      "page with `after` instead.")
+
+        def queryset_resolver(connection, iterable, info, args):
+            return optimize_queryset(
+                resolve_queryset(connection, iterable, info, args), info)
+
+        if batch_key is not None and isinstance(root, Model):
+            nodes = getattr(root, prefetch_attr(info.field_name, args), None)
+            if nodes is None:
+                queryset = partial(queryset_resolver, connection, default_manager, info)
+                nodes = cls.load_children(registry, queryset, batch_key, root, info, args)
+            else:
+                registry.remember(nodes)
+            resolver = lambda *a, **kw: nodes
+            queryset_resolver = lambda connection, iterable, info, args: iterable
+
+        result = cls.connection_resolver(
+            resolver, connection, default_manager, queryset_resolver,
+            max_limit, enforce_first_or_last, root, info, **args
+        )
+        if isinstance(result, connection):
+            registry.remember(edge.node for edge in result.edges)
+        return result
+
+    @classmethod
+    def resolve_connection(cls, connection, args, iterable, max_limit=None):
+        if args.get("order_by"):
+            return keyset_page(connection, iterable, args["order_by"], args, max_limit)
+        return super().resolve_connection(connection, args, iterable, max_limit)
+
+    @staticmethod
+    def load_children(registry, queryset, batch_key, root, info, args):
+        def factory():
+            return DataLoader(
+                group_by_key(registry, queryset(dict(args)), batch_key),
+                siblings=lambda: [obj.pk for obj in registry.seen(type(root))],
+                default=list,
+            )
+
+        name = ("connection", info.parent_type.name, info.field_name,
+                filter_key(args))
+        return registry.get(name, factory).load(root.pk)
+
+
+class SearchConnectionField(BatchedFilterConnectionField):
+    """
+    The best full-text matches for a required ``query`` (see
+    ``crm.search``), best first. The filter arguments select the candidates
+    inside the ranked query, so filtering never drops a match that ranked
+    below the page window among all rows.
+    """
+
+    def __init__(self, type_, *args, **kwargs):
+        kwargs.setdefault("query", graphene.String(required=True))
+        super().__init__(type_, *args, **kwargs)
+
+    def get_queryset_resolver(self):
+        resolve_queryset = super().get_queryset_resolver()
+        model = self.model
+
+        def resolve_search(connection, iterable, info, args):
+            candidates = resolve_queryset(connection, iterable, info, args)
+            return search(model, args["query"], result_window(args), candidates)
+        return resolve_search
+
+
+class KeysetConnection(relay.Connection):
+    """Connection whose ``totalCount`` only runs a COUNT(*) when selected."""
+
+    class Meta:
+        abstract = True
+
+    total_count = graphene.Int()
+
+    def resolve_total_count(root, info):
+        return root.iterable.count()
+
+
+_keyset_connections = {}
+
+
+class KeysetConnectionField(BatchedFilterConnectionField):
+    """
+    Filterable connection paginated by seeking on an indexed key.
+
+    ``keyset`` lists the ordering, e.g. ``("-order_date", "-id")``; it must
+    end with a unique column. Cursors encode the key values of the row
+    rather than its offset, so page 1000 costs the same index range scan as
+    page 1, and no COUNT(*) runs unless ``totalCount`` is selected.
+    """
+
+    def __init__(self, type_, *args, keyset, **kwargs):
+        self.keyset = tuple(keyset)
+        super().__init__(type_, *args, **kwargs)
+        self._base_args.pop("offset", None)
+
+    @property
+    def type(self):
+        node = super().type._meta.node
+        if (node, self.keyset) not in _keyset_connections:
+            connection = KeysetConnection.create_type(
+                f"{node.__name__}KeysetConnection", node=node)
+            connection.keyset = self.keyset
+            _keyset_connections[node, self.keyset] = connection
+        return _keyset_connections[node, self.keyset]
+
+    @classmethod
+    def resolve_connection(cls, connection, args, iterable, max_limit=None):
+        return keyset_page(connection, iterable, connection.keyset, args, max_limit)
+
+
+def keyset_page(connection, iterable, keyset, args, max_limit=None):
+    """The page of ``iterable`` selected by ``args``, ordered and seeked by ``keyset``."""
+    queryset = maybe_queryset(iterable)
+    names = [key.lstrip("-") for key in keyset]
+    first, last = args.get("first"), args.get("last")
+    after, before = args.get("after"), args.get("before")
+    for value in (first, last):
+        if value is not None and value < 0:
+            raise ValidationError("Page size must be non-negative.")
+    if max_limit is not None:
+        if first is None and last is None:
+            first = max_limit
+        if max(first or 0, last or 0) > max_limit:
+            raise ValidationError(
+                f"Requested page size exceeds the limit of {max_limit}.")
+
+    page = include_fields(queryset, *names)
+    if after:
+        page = page.filter(seek(queryset.model, keyset, after, forward=True))
+    if before:
+        page = page.filter(seek(queryset.model, keyset, before, forward=False))
+
+    model = queryset.model
+    if last is not None and first is None:
+        rows = list(page.order_by(*keyset_ordering(model, map(invert, keyset)))[:last + 1])
+        has_previous, rows = len(rows) > last, rows[:last][::-1]
+        has_next = bool(before)
+    else:
+        rows = page.order_by(*keyset_ordering(model, keyset))
+        rows = list(rows if first is None else rows[:first + 1])
+        has_next = first is not None and len(rows) > first
+        rows = rows[:first]
+        if last is not None:
+            rows = rows[-last:] if last else []
+        has_previous = bool(after)
+
+    edges = [connection.Edge(node=row, cursor=encode_cursor(row, names))
+             for row in rows]
+    result = connection(
+        edges=edges,
+        page_info=relay.PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_previous_page=has_previous,
+            has_next_page=has_next,
+        ),
+    )
+    result.iterable = queryset
+    return result
+
+
+def order_keyset(order_keys, value, field_name):
+    """The keyset for an ``orderBy`` value such as ``-totalSpent``."""
+    keyset = order_keys.get(value.lstrip("-"))
+    if keyset is None:
+        raise ValidationError(
+            f"Cannot order `{field_name}` by `{value}`: only index-backed keys "
+            f"are allowed ({', '.join(order_keys)}; prefix '-' for descending).")
+    return tuple(map(invert, keyset)) if value.startswith("-") else tuple(keyset)
+
+
+def invert(key):
+    return key[1:] if key.startswith("-") else f"-{key}"
+
+
+def keyset_ordering(model, keyset):
+    """
+    ``order_by()`` arguments for ``keyset``. NULLs of nullable keys sort
+    below every value, as SQLite stores them in an index.
+    """
+    ordering = []
+    for key in keyset:
+        name = key.lstrip("-")
+        if not model._meta.get_field(name).null:
+            ordering.append(key)
+        elif key.startswith("-"):
+            ordering.append(F(name).desc(nulls_last=True))
+        else:
+            ordering.append(F(name).asc(nulls_first=True))
+    return ordering
+
+
+def encode_cursor(obj, names):
+    values = [None if getattr(obj, n) is None
+              else obj._meta.get_field(n).value_to_string(obj) for n in names]
+    return base64(json.dumps(values))
+
+
+def seek(model, keyset, cursor, forward):
+    """
+    Build the row-value comparison ``(a, b) > (x, y)`` for ``keyset``.
+
+    It is spelled out as ``a >= x AND (a > x OR (a = x AND b > y))`` so the
+    leading column still bounds an index range scan on every backend.
+    Nullable keys compare NULL as below every value, so a NULL cursor
+    value seeks too.
+    """
+    try:
+        values = json.loads(unbase64(cursor))
+        assert isinstance(values, list) and len(values) == len(keyset)
+        fields = [model._meta.get_field(key.lstrip("-")) for key in keyset]
+        assert all(value is not None or field.null
+                   for field, value in zip(fields, values))
+        values = [field.to_python(value) for field, value in zip(fields, values)]
+    except (AssertionError, ValueError, ValidationError):
+        raise ValidationError("Invalid cursor.")
+
+    def step(key, field, value):
+        """``(past, level, bound)``: rows past ``value``, level with it, either."""
+        name = field.name
+        upward = key.startswith("-") != forward
+        if value is None:
+            # NULL sorts below every value (see keyset_ordering)
+            past = ~Q(**{f"{name}__isnull": True}) if upward else Q(pk__in=[])
+            level = Q(**{f"{name}__isnull": True})
+            return past, level, past | level
+        past = Q(**{f"{name}__{'gt' if upward else 'lt'}": value})
+        bound = Q(**{f"{name}__{'gte' if upward else 'lte'}": value})
+        if field.null and not upward:
+            past |= Q(**{f"{name}__isnull": True})
+            bound |= Q(**{f"{name}__isnull": True})
+        return past, Q(**{name: value}), bound
+
+    steps = [step(*args) for args in zip(keyset, fields, values)]
+    condition = Q()
+    for i in reversed(range(len(keyset))):
+        past, level, _ = steps[i]
+        condition = past | (level & condition) if i < len(keyset) - 1 else past
+    return steps[0][2] & condition
@@ -1,6 +1,8 @@
 import django_filters
 from django.db.models import Q
-from .models import Customer, Order, Product
+from .models import Customer, Order, OrderItem, Product
+from .phones import phone_prefix_filter
+from .search import search_filter
 
 
 class CustomerFilter(django_filters.FilterSet):
@@ -9,14 +11,26 @@ class CustomerFilter(django_filters.FilterSet):
     created_at__gte = django_filters.DateTimeFilter(field_name='created_at', lookup_expr='gte')
     created_at__lte = django_filters.DateTimeFilter(field_name='created_at', lookup_expr='lte')
     phone_pattern = django_filters.CharFilter(method='filter_phone_pattern')
+    # word-prefix match on name and email through the search index
+    search = django_filters.CharFilter(method='filter_search')
+    # lifetime order aggregates (crm.aggregates)
+    order_count__gte = django_filters.NumberFilter(field_name='order_count', lookup_expr='gte')
+    order_count__lte = django_filters.NumberFilter(field_name='order_count', lookup_expr='lte')
+    total_spent__gte = django_filters.NumberFilter(field_name='total_spent', lookup_expr='gte')
+    total_spent__lte = django_filters.NumberFilter(field_name='total_spent', lookup_expr='lte')
+    last_order_date__gte = django_filters.DateTimeFilter(field_name='last_order_date', lookup_expr='gte')
+    last_order_date__lte = django_filters.DateTimeFilter(field_name='last_order_date', lookup_expr='lte')
 
     class Meta:
         model = Customer
         fields = ['name', 'email', 'created_at', 'phone']
 
     def filter_phone_pattern(self, queryset, name, value):
-        """Filter customers whose phone starts with value (e.g. '+1')."""
-        return queryset.filter(phone__startswith=value)
+        """Filter customers whose phone starts with value (e.g. '+1', '+1234')."""
+        return queryset.filter(phone_prefix_filter(value))
+
+    def filter_search(self, queryset, name, value):
+        return queryset.filter(search_filter(Customer, value))
 
 
 class ProductFilter(django_filters.FilterSet):
@@ -25,11 +39,15 @@ class ProductFilter(django_filters.FilterSet):
     price__lte = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
     stock__gte = django_filters.NumberFilter(field_name='stock', lookup_expr='gte')
     stock__lte = django_filters.NumberFilter(field_name='stock', lookup_expr='lte')
+    search = django_filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Product
         fields = ['name', 'price', 'stock']
 
+    def filter_search(self, queryset, name, value):
+        return queryset.filter(search_filter(Product, value))
+
 
 class OrderFilter(django_filters.FilterSet):
     total_amount__gte = django_filters.NumberFilter(field_name='total_amount', lookup_expr='gte')
@@ -39,7 +57,14 @@ class OrderFilter(django_filters.FilterSet):
     customer_name = django_filters.CharFilter(field_name='customer__name', lookup_expr='icontains')
     product_name = django_filters.CharFilter(field_name='products__name', lookup_expr='icontains')
     product_id = django_filters.NumberFilter(field_name='products__id')
+    # orders containing a product whose name matches, without the join scan
+    product_search = django_filters.CharFilter(method='filter_product_search')
 
     class Meta:
         model = Order
-        fields = ['total_amount', 'order_date', 'customer__name', 'products__name', 'products__id']
\ No newline at end of file
+        fields = ['total_amount', 'order_date', 'customer__name', 'products__name', 'products__id']
+
+    def filter_product_search(self, queryset, name, value):
+        return queryset.filter(pk__in=OrderItem.objects.filter(
+            product__in=Product.objects.filter(search_filter(Product, value))
+        ).values('order_id'))
@@ -0,0 +1,169 @@
+"""
+Shared GraphQL-over-HTTP client for the cron jobs, Celery tasks and scripts.
+
+``session(url)`` returns one connected gql session per process and
+endpoint, whose requests.Session keeps its connections alive between calls
+instead of opening a new TCP connection per run. Sessions are keyed by pid,
+so a forked worker (Celery prefork) never reuses its parent's sockets.
+The session also resolves proxy and CA settings from the environment once,
+rather than on every request. ``async_client()`` and ``execute_async()``
+are the asyncio equivalent, with one aiohttp connection pool per run.
+
+``document()`` parses a query, and prints it back to the query text gql
+sends, once; call it at import time and pass the result to ``execute()``.
+
+Requests carry ``Authorization: Bearer <CRM_API_TOKEN>`` when a token is
+set, as the CSRF-exempt ``/graphql/api/`` endpoint requires.
+"""
+import asyncio
+import os
+import threading
+from functools import lru_cache
+
+from gql import Client, GraphQLRequest
+from gql.transport.exceptions import TransportConnectionFailed, TransportServerError
+from gql.transport.requests import RequestsHTTPTransport
+from graphql import print_ast
+
+DEFAULT_OPTIONS = {"timeout": 10, "retries": 3, "backoff": 0.3}
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_sessions = {}
+_lock = threading.Lock()
+
+
+class PreparedRequest(GraphQLRequest):
+    """A GraphQLRequest whose query text is printed once, not per send."""
+
+    def __init__(self, request, **kwargs):
+        super().__init__(request, **kwargs)
+        if isinstance(request, PreparedRequest):
+            self.query = request.query
+        else:
+            self.query = print_ast(self.document)
+
+    @property
+    def payload(self):
+        payload = {"query": self.query}
+        if self.operation_name:
+            payload["operationName"] = self.operation_name
+        if self.variable_values:
+            payload["variables"] = self.variable_values
+        if self.extensions:
+            payload["extensions"] = self.extensions
+        return payload
+
+
+@lru_cache(maxsize=64)
+def document(source):
+    """The parsed ``source``; repeated calls return the same request."""
+    return PreparedRequest(source)
+
+
+def client_options():
+    """
+    Timeout, retries, backoff and API token, from Django settings when
+    configured (the token from the environment otherwise).
+    """
+    options = dict(DEFAULT_OPTIONS, token=os.environ.get("CRM_API_TOKEN"))
+    try:
+        from django.conf import settings
+
+        if settings.configured:
+            options["timeout"] = getattr(settings, "CRM_GRAPHQL_CLIENT_TIMEOUT", options["timeout"])
+            options["retries"] = getattr(settings, "CRM_GRAPHQL_CLIENT_RETRIES", options["retries"])
+            options["backoff"] = getattr(settings, "CRM_GRAPHQL_CLIENT_BACKOFF", options["backoff"])
+            options["token"] = getattr(settings, "CRM_API_TOKEN", options["token"])
+    except ImportError:
+        pass
+    return options
+
+
+def auth_headers(options):
+    token = options.get("token")
+    return {"Authorization": f"Bearer {token}"} if token else None
+
+
+def session(url, **options):
+    """The process's connected session for ``url``; ``options`` apply on creation."""
+    key = (os.getpid(), url)
+    with _lock:
+        if key not in _sessions:
+            options = {**client_options(), **options}
+            transport = RequestsHTTPTransport(
+                url=url,
+                timeout=options["timeout"],
+                retries=options["retries"],
+                retry_backoff_factor=options["backoff"],
+                headers=auth_headers(options),
+            )
+            client = Client(transport=transport, execute_timeout=options["timeout"])
+            connected = client.connect_sync()
+            http = transport.session
+            environment = http.merge_environment_settings(url, {}, None, None, None)
+            http.proxies, http.verify = environment["proxies"], environment["verify"]
+            http.trust_env = False
+            _sessions[key] = (client, connected)
+        return _sessions[key][1]
+
+
+def close_sessions():
+    """Close this process's sessions (e.g. on worker shutdown)."""
+    with _lock:
+        for key in [key for key in _sessions if key[0] == os.getpid()]:
+            client, _ = _sessions.pop(key)
+            client.close_sync()
+
+
+def execute(url, request, variables=None, operation_name=None, **options):
+    """
+    Execute ``request`` (a string or a ``document()``) at ``url``.
+
+    Returns the data; raises gql's TransportQueryError when the response
+    has errors.
+    """
+    return session(url, **options).execute(_prepare(request, variables, operation_name))
+
+
+def _prepare(request, variables, operation_name):
+    if isinstance(request, str):
+        request = document(request)
+    if variables is not None or operation_name is not None:
+        request = PreparedRequest(request, variable_values=variables,
+                                  operation_name=operation_name)
+    return request
+
+
+def async_client(url, **options):
+    """
+    A gql Client over aiohttp for asyncio jobs.
+
+    ``async with`` it once per run: its session keeps a pool of keep-alive
+    connections that every ``execute_async`` call in the run shares.
+    """
+    from gql.transport.aiohttp import AIOHTTPTransport
+
+    options = {**client_options(), **options}
+    transport = AIOHTTPTransport(url=url, timeout=options["timeout"],
+                                 headers=auth_headers(options))
+    return Client(transport=transport, execute_timeout=options["timeout"])
+
+
+async def execute_async(session, request, variables=None, operation_name=None, **options):
+    """
+    Await ``request`` on an ``async_client()`` session.
+
+    Connection errors and 429/5xx responses are retried with exponential
+    backoff, like the sync sessions' urllib3 retries.
+    """
+    options = {**client_options(), **options}
+    request = _prepare(request, variables, operation_name)
+    for attempt in range(options["retries"] + 1):
+        try:
+            return await session.execute(request)
+        except (TransportConnectionFailed, TransportServerError, OSError,
+                asyncio.TimeoutError) as e:
+            code = getattr(e, "code", None)
+            if attempt == options["retries"] or code not in (None, *RETRY_STATUSES):
+                raise
+            await asyncio.sleep(options["backoff"] * 2 ** attempt)
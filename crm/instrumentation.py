@@ -0,0 +1,180 @@
+"""
+Per-operation profiling of GraphQL resolvers and SQL.
+
+A sampled operation (``CRM_PROFILE_SAMPLE_RATE``), or one sent with the
+debug header by staff or under DEBUG, gets a Profile for the duration of
+its execution. ``ResolverTimer`` (a graphene middleware) records the time
+of every resolver by ``Type.field``, and a DB execute wrapper records
+each SQL statement against the innermost resolver running it. Statements
+are grouped by shape (the SQL with ``IN`` lists collapsed); a shape run
+more than ``CRM_PROFILE_N_PLUS_ONE_THRESHOLD`` times in one operation is
+reported as a likely N+1. Every profile is logged as one JSON line on the
+``crm.profile`` logger, and returned under ``extensions.profile`` when
+the debug header was sent. Operations that are not sampled pay one
+random() call.
+"""
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger("crm.profile")
+
+_profile = ContextVar("crm_profile", default=None)
+_field = ContextVar("crm_profile_field", default=None)
+
+_IN_LIST = re.compile(r"IN \((?:%s, )*%s\)")
+
+
+def sql_shape(sql):
+    """``sql`` with IN lists collapsed, so batches of any size match."""
+    return _IN_LIST.sub("IN (...)", sql)
+
+
+def profile_options():
+    return (getattr(settings, "CRM_PROFILE_SAMPLE_RATE", 0.0),
+            getattr(settings, "CRM_PROFILE_HEADER", "HTTP_X_CRM_PROFILE"),
+            getattr(settings, "CRM_PROFILE_N_PLUS_ONE_THRESHOLD", 5))
+
+
+def debug_requested(request, user=None):
+    """
+    True when the debug header is set by someone allowed to see SQL.
+    ``user`` defaults to ``request.user``; async views pass ``debug_user()``.
+    """
+    _, header, _ = profile_options()
+    if not request.META.get(header):
+        return False
+    if settings.DEBUG:
+        return True
+    if user is None:
+        user = getattr(request, "user", None)
+    return bool(user is not None and user.is_staff)
+
+
+async def debug_user(request):
+    """
+    The user ``debug_requested`` would check, loaded with ``auser()`` so the
+    session and user queries stay off the event loop; None when unneeded.
+    """
+    _, header, _ = profile_options()
+    if settings.DEBUG or not request.META.get(header) or not hasattr(request, "auser"):
+        return None
+    return await request.auser()
+
+
+class Profile:
+    def __init__(self, operation_name, debug=False):
+        self.operation_name = operation_name
+        self.debug = debug
+        self.started = time.perf_counter()
+        self.duration = None
+        self.resolvers = defaultdict(lambda: [0, 0.0])
+        self.statements = defaultdict(lambda: [0, 0.0, set()])
+        # root fields of async queries resolve in several threads
+        self._lock = threading.Lock()
+
+    def record_resolver(self, field, elapsed):
+        with self._lock:
+            entry = self.resolvers[field]
+            entry[0] += 1
+            entry[1] += elapsed
+
+    def record_sql(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                entry = self.statements[sql_shape(sql)]
+                entry[0] += 1
+                entry[1] += elapsed
+                entry[2].add(_field.get() or "(operation)")
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+
+    def as_dict(self, limit=10):
+        _, _, threshold = profile_options()
+        resolvers = sorted(self.resolvers.items(), key=lambda item: -item[1][1])
+        return {
+            "operation": self.operation_name,
+            "duration_ms": round(self.duration * 1000, 3),
+            "sql_count": sum(count for count, _, _ in self.statements.values()),
+            "sql_ms": round(sum(ms for _, ms, _ in self.statements.values()) * 1000, 3),
+            "resolvers": [
+                {"field": field, "calls": calls, "ms": round(total * 1000, 3)}
+                for field, (calls, total) in resolvers[:limit]
+            ],
+            "n_plus_one": [
+                {"sql": shape, "count": count, "ms": round(total * 1000, 3),
+                 "fields": sorted(fields)}
+                for shape, (count, total, fields) in self.statements.items()
+                if count > threshold
+            ],
+        }
+
+
+class ResolverTimer:
+    """Graphene middleware timing each resolver of the current Profile."""
+
+    def resolve(self, next, root, info, **args):
+        profile = _profile.get()
+        if profile is None:
+            return next(root, info, **args)
+        field = f"{info.parent_type.name}.{info.field_name}"
+        token = _field.set(field)
+        started = time.perf_counter()
+        try:
+            return next(root, info, **args)
+        finally:
+            profile.record_resolver(field, time.perf_counter() - started)
+            _field.reset(token)
+
+
+def start_profile(request, operation_name, user=None):
+    """A Profile for this operation if it is sampled or debugged, else None."""
+    debug = debug_requested(request, user)
+    rate, _, _ = profile_options()
+    if not debug and (rate <= 0 or random.random() >= rate):
+        return None
+    return Profile(operation_name, debug)
+
+
+@contextmanager
+def profiling(profile):
+    """Make ``profile`` current and record this thread's SQL into it."""
+    if profile is None:
+        yield
+        return
+    token = _profile.set(profile)
+    try:
+        with connection.execute_wrapper(profile.record_sql):
+            yield
+    finally:
+        _profile.reset(token)
+
+
+def current_profile():
+    return _profile.get()
+
+
+def finish_profile(profile, result):
+    """Log ``profile`` and attach it to ``result`` when debugging."""
+    if profile is None:
+        return result
+    profile.finish()
+    data = profile.as_dict()
+    logger.info(json.dumps(data, sort_keys=True))
+    if profile.debug and result is not None:
+        result.extensions = {**(result.extensions or {}), "profile": data}
+    return result
@@ -0,0 +1,83 @@
+"""
+Set-based restocking of low-stock products.
+
+Each batch is one ``UPDATE ... SET stock = stock + increment ... RETURNING``
+over the next ``batch_size`` low-stock ids, so the rows handed back are
+exactly the rows that were changed, with their new stock, and no second
+query re-evaluates the filter (which the restock itself invalidates).
+Backends without UPDATE ... RETURNING lock the batch with
+``select_for_update()``, update it by id and compute the new stock in
+memory. Batches walk the primary key, so a product still under the
+threshold after its increment is not restocked twice in one run.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import Product
+from .response_cache import invalidate
+
+
+def default_restock_batch_size():
+    return getattr(settings, "CRM_RESTOCK_BATCH_SIZE", 1000)
+
+
+def supports_update_returning():
+    if connection.vendor == "postgresql":
+        return True
+    if connection.vendor == "sqlite":
+        return connection.Database.sqlite_version_info >= (3, 35)
+    return False
+
+
+def _restock_returning(threshold, increment, after, size):
+    qn = connection.ops.quote_name
+    table, pk = qn(Product._meta.db_table), qn(Product._meta.pk.column)
+    stock = qn(Product._meta.get_field("stock").column)
+    columns = ", ".join(qn(f.column) for f in Product._meta.concrete_fields)
+    sql = (
+        f"UPDATE {table} SET {stock} = {stock} + %s WHERE {pk} IN ("
+        f"SELECT {pk} FROM {table} WHERE {stock} < %s AND {pk} > %s "
+        f"ORDER BY {pk} LIMIT %s) RETURNING {columns}"
+    )
+    # raw() applies the field converters (e.g. Decimal price on SQLite)
+    return sorted(Product.objects.raw(sql, [increment, threshold, after, size]),
+                  key=lambda p: p.pk)
+
+
+def _restock_locked(threshold, increment, after, size):
+    products = list(Product.objects.select_for_update()
+                    .filter(stock__lt=threshold, pk__gt=after)
+                    .order_by("pk")[:size])
+    Product.objects.filter(pk__in=[p.pk for p in products]).update(
+        stock=F("stock") + increment)
+    for product in products:
+        product.stock += increment
+    return products
+
+
+def restock_low_stock(threshold=10, increment=10, limit=None, batch_size=None):
+    """
+    Add ``increment`` to the stock of products below ``threshold``.
+
+    At most ``limit`` products are restocked (all of them when None), in
+    transactions of ``batch_size`` rows. Returns the updated products in
+    id order.
+    """
+    batch_size = batch_size or default_restock_batch_size()
+    restock = _restock_returning if supports_update_returning() else _restock_locked
+    updated, after = [], 0
+    while limit is None or len(updated) < limit:
+        size = batch_size if limit is None else min(batch_size, limit - len(updated))
+        with transaction.atomic():
+            batch = restock(threshold, increment, after, size)
+        if not batch:
+            break
+        updated.extend(batch)
+        after = batch[-1].pk
+        if len(batch) < size:
+            break
+    if updated:
+        # the UPDATE bypasses post_save
+        invalidate(Product)
+    return updated
@@ -0,0 +1,56 @@
+"""
+Run GraphQL operations for the cron and Celery jobs.
+
+Jobs run inside a Django process already, so by default an operation is
+executed in-process against ``alx_backend_graphql.schema.schema``: no HTTP
+request, no middleware, no JSON round trip, and the parsed document comes
+from the shared DocumentStore. ``mode="http"`` posts to a running server
+instead, through the pooled client in crm/graphql_client.py; the heartbeat
+uses it as a remote health check when ``CRM_HEALTHCHECK_URL`` is set.
+"""
+from types import SimpleNamespace
+
+from django.conf import settings
+from gql.transport.exceptions import TransportQueryError
+from graphql import execute
+
+from . import graphql_client
+
+
+class GraphQLJobError(Exception):
+    """An operation run by a job returned errors."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("; ".join(str(getattr(e, "message", e)) for e in errors))
+
+
+def run_local(query, variables=None, operation_name=None):
+    from alx_backend_graphql.schema import schema
+
+    from .documents import shared_store
+
+    document, errors = shared_store(schema.graphql_schema).get(query)
+    if errors:
+        raise GraphQLJobError(errors)
+    # loaders attach themselves to the context, like they do to the request
+    result = execute(schema.graphql_schema, document, context_value=SimpleNamespace(),
+                     variable_values=variables, operation_name=operation_name)
+    if result.errors:
+        raise GraphQLJobError(result.errors)
+    return result.data
+
+
+def run_http(query, variables=None, operation_name=None, url=None):
+    # the process's pooled keep-alive session, see crm/graphql_client.py
+    try:
+        return graphql_client.execute(url or settings.CRM_HEALTHCHECK_URL, query,
+                                      variables, operation_name)
+    except TransportQueryError as e:
+        raise GraphQLJobError(e.errors or [e]) from e
+
+
+def run_operation(query, variables=None, operation_name=None, mode="local", **kwargs):
+    """Execute ``query`` and return its data; raises GraphQLJobError."""
+    runner = run_http if mode == "http" else run_local
+    return runner(query, variables, operation_name, **kwargs)
@@ -0,0 +1,139 @@
+"""
+Request-scoped DataLoaders for the CRM schema.
+
+GraphQLView resolves fields synchronously, so there is no event-loop tick to
+collect keys on. Instead every connection page remembers the nodes it
+returned, and the first ``load()`` that misses the cache batches its key
+together with the matching keys of every sibling seen so far in the request.
+A page of N orders therefore resolves ``customer`` and ``products`` with one
+``IN (...)`` query each instead of N.
+"""
+import threading
+from collections import defaultdict
+
+from django.db.models import F
+
+
+class DataLoader:
+    """
+    Cache-backed batch loader.
+
+    ``batch_load_fn`` takes a list of keys and returns a dict of key -> value.
+    ``siblings`` is an optional callable returning extra keys worth fetching
+    in the same round trip. Keys absent from the batch result resolve to
+    ``default()``.
+    """
+
+    def __init__(self, batch_load_fn, siblings=None, default=lambda: None):
+        self.batch_load_fn = batch_load_fn
+        self.siblings = siblings
+        self.default = default
+        self._cache = {}
+
+    def load(self, key):
+        if key not in self._cache:
+            self.load_many([key])
+        return self._cache[key]
+
+    def load_many(self, keys):
+        missing = {k for k in keys if k not in self._cache}
+        if missing:
+            if self.siblings:
+                missing.update(k for k in self.siblings()
+                               if k is not None and k not in self._cache)
+            results = self.batch_load_fn(list(missing))
+            for k in missing:
+                self._cache[k] = results.get(k, self.default())
+        return [self._cache[k] for k in keys]
+
+    def prime(self, key, value):
+        self._cache.setdefault(key, value)
+
+
+class LoaderRegistry:
+    """Per-request loaders plus the model instances resolved so far."""
+
+    def __init__(self):
+        self.loaders = {}
+        self._seen = defaultdict(dict)
+        self._lock = threading.RLock()
+
+    def get(self, name, factory):
+        if name not in self.loaders:
+            # root fields may resolve in parallel threads (AsyncCRMGraphQLView)
+            with self._lock:
+                if name not in self.loaders:
+                    self.loaders[name] = factory()
+        return self.loaders[name]
+
+    def remember(self, instances):
+        for obj in instances:
+            if obj is not None:
+                self._seen[type(obj)][obj.pk] = obj
+
+    def seen(self, model):
+        return list(self._seen[model].values())
+
+
+def get_registry(info):
+    """Return the registry bound to this request, creating it on first use."""
+    context = info.context
+    if context is None:
+        return LoaderRegistry()
+    registry = getattr(context, "_crm_loaders", None)
+    if registry is None:
+        registry = LoaderRegistry()
+        setattr(context, "_crm_loaders", registry)
+    return registry
+
+
+def reset_registry(context):
+    """Forget loaded rows, e.g. after a mutation in a batched request."""
+    if context is not None:
+        context.__dict__.pop("_crm_loaders", None)
+
+
+def load_related(info, instance, field_name):
+    """Batch-load the target of a ForeignKey for ``instance``."""
+    field = instance._meta.get_field(field_name)
+    if field.is_cached(instance):
+        return getattr(instance, field_name)
+
+    registry = get_registry(info)
+    model, attname = type(instance), field.attname
+    related = field.related_model
+
+    def batch_load(keys):
+        found = related._default_manager.in_bulk(keys)
+        registry.remember(found.values())
+        return found
+
+    def siblings():
+        return [getattr(obj, attname) for obj in registry.seen(model)]
+
+    loader = registry.get(
+        ("fk", model._meta.label, field_name),
+        lambda: DataLoader(batch_load, siblings),
+    )
+    return loader.load(getattr(instance, attname))
+
+
+def group_by_key(registry, queryset, lookup):
+    """
+    Build a batch function fetching ``queryset`` for many parents at once.
+
+    ``lookup`` is the ORM path from the child back to the parent id, e.g.
+    ``customer_id`` or ``orderitem__order_id`` for a many-to-many hop. The
+    batch result maps each parent key to its list of children.
+    """
+    def batch_load(keys):
+        grouped = defaultdict(list)
+        rows = queryset.filter(**{f"{lookup}__in": keys}).annotate(
+            _loader_key=F(lookup))
+        for obj in rows:
+            grouped[obj._loader_key].append(obj)
+        registry.remember(obj for objs in grouped.values() for obj in objs)
+        return grouped
+
+    return batch_load
+
@@ -0,0 +1,43 @@
+"""
+Delete customers with no order in the last year, in short chunked transactions.
+
+    python manage.py cleanup_customers --dry-run       # counts only
+    python manage.py cleanup_customers --days 365 --chunk-size 5000
+
+An interrupted run resumes from its checkpoint; ``--restart`` ignores it.
+The last line of output is the number of customers deleted (or matching).
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.cleanup import default_cleanup_chunk_size, delete_inactive_customers
+
+
+class Command(BaseCommand):
+    help = "Delete inactive customers (no orders in the last --days days)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=365)
+        parser.add_argument("--chunk-size", type=int, default=default_cleanup_chunk_size(),
+                            help="Customer ids per transaction.")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Report how many rows would be deleted.")
+        parser.add_argument("--restart", action="store_true",
+                            help="Ignore the saved checkpoint and start from id 0.")
+
+    def handle(self, days, chunk_size, dry_run, restart, **options):
+        if days <= 0 or chunk_size <= 0:
+            raise CommandError("--days and --chunk-size must be positive.")
+
+        def progress(position, result):
+            self.stderr.write(f"up to id {position}: {result.customers} customers deleted")
+
+        started = time.perf_counter()
+        result = delete_inactive_customers(days, chunk_size, dry_run=dry_run,
+                                           restart=restart, progress=progress)
+        verb = "Would delete" if dry_run else "Deleted"
+        self.stderr.write(self.style.SUCCESS(
+            f"{verb} {result.customers} customers, {result.orders} orders and "
+            f"{result.items} order items in {time.perf_counter() - started:.2f}s."))
+        self.stdout.write(str(result.customers))
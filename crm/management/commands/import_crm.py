@@ -0,0 +1,113 @@
+"""
+Stream customers or products from a CSV or NDJSON file into the database.
+
+    python manage.py import_crm customers.csv --model customer
+    python manage.py import_crm products.ndjson --model product --batch-size 2000
+
+Rows flow through a generator pipeline (read -> chunk -> validate -> insert)
+so memory stays flat regardless of file size. Each chunk is validated and
+written in its own transaction together with a Checkpoint row recording how
+many input rows are done, so a crashed run resumes where it stopped.
+"""
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from crm.bulk import (default_batch_size, insert_customers, validate_customers,
+                      validate_products)
+from crm.models import Checkpoint, Product
+from crm.response_cache import invalidate
+
+
+def read_rows(path, fmt):
+    """Yield one dict per data row, lazily."""
+    with open(path, newline="", encoding="utf-8") as handle:
+        if fmt == "csv":
+            yield from csv.DictReader(handle)
+            return
+        for line in handle:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def import_customers(rows, batch_size):
+    customers, errors = validate_customers(rows)
+    created, race_errors = insert_customers(customers, batch_size)
+    return len(created), errors + race_errors
+
+
+def import_products(rows, batch_size):
+    products, errors = validate_products(rows)
+    created = Product.objects.bulk_create(products, batch_size=batch_size)
+    if created:
+        invalidate(Product)
+    return len(created), errors
+
+
+IMPORTERS = {"customer": import_customers, "product": import_products}
+
+
+class Command(BaseCommand):
+    help = "Import customers or products from a CSV or NDJSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--model", choices=sorted(IMPORTERS), required=True)
+        parser.add_argument("--format", choices=["csv", "ndjson"],
+                            help="Defaults to the file extension.")
+        parser.add_argument("--batch-size", type=int, default=default_batch_size())
+        parser.add_argument("--restart", action="store_true",
+                            help="Ignore the saved checkpoint and start from row 0.")
+        parser.add_argument("--max-errors", type=int, default=20,
+                            help="How many validation errors to print.")
+
+    def handle(self, path, model, format, batch_size, restart, max_errors, **options):
+        if not os.path.exists(path):
+            raise CommandError(f"No such file: {path}")
+        if batch_size <= 0:
+            raise CommandError("--batch-size must be positive.")
+        fmt = format or ("csv" if path.lower().endswith(".csv") else "ndjson")
+        importer = IMPORTERS[model]
+
+        name = f"import_crm:{model}:{os.path.abspath(path)}"[:255]
+        checkpoint, _ = Checkpoint.objects.get_or_create(name=name)
+        if restart:
+            checkpoint.position = 0
+            checkpoint.save()
+        elif checkpoint.position:
+            self.stdout.write(f"Resuming after row {checkpoint.position}.")
+
+        started = time.perf_counter()
+        done = imported = failed = 0
+        rows = islice(read_rows(path, fmt), checkpoint.position, None)
+        for chunk in chunked(rows, batch_size):
+            with transaction.atomic():
+                created, errors = importer(chunk, batch_size)
+                checkpoint.position += len(chunk)
+                checkpoint.save(update_fields=["position", "updated_at"])
+            done += len(chunk)
+            imported += created
+            for message in errors[:max(0, max_errors - failed)]:
+                self.stderr.write(f"  {message}")
+            failed += len(errors)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{checkpoint.position} rows processed "
+                              f"({done / elapsed:,.0f} rows/s)")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported} {model} rows, {failed} rejected, "
+            f"in {elapsed:.2f}s ({done / elapsed if elapsed else 0:,.0f} rows/s)."
+        ))
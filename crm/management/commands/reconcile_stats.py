@@ -0,0 +1,45 @@
+"""
+Recompute the CrmStats dashboard counters exactly and report drift.
+
+    python manage.py reconcile_stats            # report and fix
+    python manage.py reconcile_stats --dry-run  # report only
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from crm.models import CrmStats
+
+FIELDS = ("customer_count", "order_count", "total_revenue")
+
+
+class Command(BaseCommand):
+    help = "Recompute dashboard counters and report drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Report drift without writing the exact values.")
+
+    def handle(self, dry_run, **options):
+        CrmStats.load()
+        with transaction.atomic():
+            # lock first: writers bumping the row wait until the exact
+            # values computed below are committed
+            stats = CrmStats.objects.select_for_update().get(pk=CrmStats.SINGLETON_ID)
+            exact = CrmStats.exact()
+            drifted = False
+            for field in FIELDS:
+                stored = getattr(stats, field)
+                drift = stored - exact[field]
+                drifted = drifted or bool(drift)
+                self.stdout.write(f"{field}: stored={stored} exact={exact[field]} "
+                                  f"drift={drift:+}")
+                setattr(stats, field, exact[field])
+            if drifted and not dry_run:
+                stats.save()
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("No drift."))
+        elif dry_run:
+            self.stdout.write(self.style.WARNING("Drift found (dry run, not fixed)."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Drift fixed."))
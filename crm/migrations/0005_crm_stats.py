@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:05
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def seed_stats(apps, schema_editor):
+    Customer = apps.get_model('crm', 'Customer')
+    Order = apps.get_model('crm', 'Order')
+    CrmStats = apps.get_model('crm', 'CrmStats')
+    CrmStats.objects.update_or_create(pk=1, defaults={
+        'customer_count': Customer.objects.count(),
+        'order_count': Order.objects.count(),
+        'total_revenue': Order.objects.aggregate(total=Sum('total_amount'))['total'] or 0,
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0004_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CrmStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('customer_count', models.BigIntegerField(default=0)),
+                ('order_count', models.BigIntegerField(default=0)),
+                ('total_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(seed_stats, migrations.RunPython.noop),
+    ]
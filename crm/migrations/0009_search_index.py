@@ -0,0 +1,65 @@
+# Generated by Django 5.2.5 on 2026-10-18 05:02
+
+from django.db import migrations
+
+from crm.search import SEARCH_TABLES, TRIGGERS, sqlite_triggers
+
+
+def sqlite_statements(table, columns):
+    fts = f'{table}_fts'
+    cols = ', '.join(columns)
+    return [
+        # prefix='2 3' keeps short as-you-type prefixes off the full term scan
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({cols}, content='{table}', "
+        f"content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        *sqlite_triggers(table, columns),
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def postgresql_statements(table, columns):
+    # '@' and '.' split emails into words, as SQLite's tokenizer does
+    document = " || ' ' || ".join(
+        f"translate(coalesce({c}, ''), '@.', '  ')" for c in columns)
+    return [
+        f"ALTER TABLE {table} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS "
+        f"(to_tsvector('simple', {document})) STORED",
+        f"CREATE INDEX {table}_search_idx ON {table} USING gin (search_vector)",
+    ]
+
+
+def add_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table, columns in SEARCH_TABLES:
+        if vendor == 'sqlite':
+            statements = sqlite_statements(table, columns)
+        elif vendor == 'postgresql':
+            statements = postgresql_statements(table, columns)
+        else:
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table, _ in SEARCH_TABLES:
+        if vendor == 'sqlite':
+            fts = f'{table}_fts'
+            for trigger in TRIGGERS:
+                schema_editor.execute(f'DROP TRIGGER IF EXISTS {fts}_{trigger}')
+            schema_editor.execute(f'DROP TABLE IF EXISTS {fts}')
+        elif vendor == 'postgresql':
+            schema_editor.execute(f'DROP INDEX IF EXISTS {table}_search_idx')
+            schema_editor.execute(f'ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0008_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_index, drop_search_index),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.5 on 2026-10-18 05:41
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models, transaction
+
+from crm.search import restore_triggers
+
+BACKFILL_CHUNK_SIZE = 2000
+
+
+def normalize_phone(phone):
+    """crm.phones.normalize_phone as of this migration."""
+    digits = re.sub(r'\D', '', phone or '')
+    if not digits or phone.lstrip().startswith('+'):
+        return digits
+    return getattr(settings, 'CRM_PHONE_DEFAULT_COUNTRY_CODE', '1') + digits
+
+
+def backfill_phone_digits(apps, schema_editor):
+    """Normalize existing phones in short transactions, walking the pk."""
+    Customer = apps.get_model('crm', 'Customer')
+    last = 0
+    while True:
+        with transaction.atomic():
+            rows = list(Customer.objects.filter(pk__gt=last).exclude(phone='')
+                        .order_by('pk').only('phone')[:BACKFILL_CHUNK_SIZE])
+            if not rows:
+                return
+            for customer in rows:
+                customer.phone_digits = normalize_phone(customer.phone)
+            Customer.objects.bulk_update(rows, ['phone_digits'])
+        last = rows[-1].pk
+
+
+class Migration(migrations.Migration):
+    # each backfill chunk commits on its own
+    atomic = False
+
+    dependencies = [
+        ('crm', '0009_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='phone_digits',
+            field=models.CharField(blank=True, default='', editable=False, max_length=30),
+        ),
+        migrations.RunPython(restore_triggers, migrations.RunPython.noop),
+        migrations.RunPython(backfill_phone_digits, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['phone_digits'], name='customer_phone_digits_idx'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.5 on 2026-10-18 04:01
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from crm.search import restore_triggers
+
+BACKFILL_BATCH_SIZE = 500
+
+
+def refresh(Customer, Order, customer_ids):
+    orders = Order.objects.filter(customer=OuterRef('pk')).order_by().values('customer')
+    Customer.objects.filter(pk__in=customer_ids).update(
+        order_count=Coalesce(Subquery(orders.annotate(n=Count('pk')).values('n')), 0),
+        total_spent=Coalesce(
+            Subquery(orders.annotate(total=Sum('total_amount')).values('total')),
+            Value(Decimal('0')), output_field=DecimalField()),
+        last_order_date=Subquery(orders.annotate(last=Max('order_date')).values('last')),
+    )
+
+
+def backfill_aggregates(apps, schema_editor):
+    """Recompute the customers that have orders, BACKFILL_BATCH_SIZE per UPDATE."""
+    Customer = apps.get_model('crm', 'Customer')
+    Order = apps.get_model('crm', 'Order')
+    ids = (Order.objects.order_by('customer_id').values_list('customer_id', flat=True)
+           .distinct().iterator(chunk_size=BACKFILL_BATCH_SIZE))
+    batch = []
+    for customer_id in ids:
+        batch.append(customer_id)
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            refresh(Customer, Order, batch)
+            batch = []
+    if batch:
+        refresh(Customer, Order, batch)
+
+
+class Migration(migrations.Migration):
+    # each backfill batch commits on its own
+    atomic = False
+
+    dependencies = [
+        ('crm', '0010_phone_digits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='last_order_date',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='order_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='total_spent',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14),
+        ),
+        migrations.RunPython(restore_triggers, migrations.RunPython.noop),
+        # before the indexes, so the backfill does not maintain them row by row
+        migrations.RunPython(backfill_aggregates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['order_count'], name='customer_order_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['total_spent'], name='customer_total_spent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['last_order_date'], name='customer_last_order_idx'),
+        ),
+    ]
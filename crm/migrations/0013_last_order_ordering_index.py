@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-18 04:34
+
+from django.db import migrations, models
+
+INDEX = 'customer_last_order_id_idx'
+
+
+def add_index(apps, schema_editor):
+    # orderBy: lastOrderDate sorts NULLs first ascending (see crm.fields);
+    # SQLite indexes them that way already, PostgreSQL needs it spelled out
+    nulls = ' NULLS FIRST' if schema_editor.connection.vendor == 'postgresql' else ''
+    schema_editor.execute(
+        f'CREATE INDEX {INDEX} ON crm_customer (last_order_date{nulls}, id)')
+
+
+def drop_index(apps, schema_editor):
+    schema_editor.execute(f'DROP INDEX {INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0012_ordering_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='customer',
+            name='customer_last_order_idx',
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='customer',
+                    index=models.Index(fields=['last_order_date', 'id'], name=INDEX),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(add_index, drop_index),
+            ],
+        ),
+    ]
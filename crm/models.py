@@ -1,5 +1,11 @@
+from decimal import Decimal
+
 from django.core.validators import MinValueValidator, RegexValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .phones import normalize_phone
 
 
 class Customer(models.Model):
@@ -14,8 +20,37 @@ class Customer(models.Model):
                 message="Phone must be in format '+1234567890' or '123-456-7890'."
             )
         ] )
+    # normalized phone (see crm.phones), set on save; phonePattern ranges over it
+    phone_digits = models.CharField(max_length=30, blank=True, default="",
+                                    editable=False)
     created_at = models.DateTimeField(auto_now_add=True
     )
+    # lifetime order aggregates, kept by crm.signals (see crm.aggregates)
+    order_count     = models.IntegerField(default=0, editable=False)
+    total_spent     = models.DecimalField(max_digits=14, decimal_places=2,
+                                          default=0, editable=False)
+    last_order_date = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # keyset pagination seeks on (created_at, id)
+            models.Index(fields=["created_at", "id"], name="customer_created_id_idx"),
+            # phone prefix (country/area code) range scans
+            models.Index(fields=["phone_digits"], name="customer_phone_digits_idx"),
+            # CustomerFilter aggregate ranges; with the id, orderBy keysets
+            models.Index(fields=["order_count", "id"], name="customer_order_count_id_idx"),
+            models.Index(fields=["total_spent", "id"], name="customer_total_spent_id_idx"),
+            models.Index(fields=["last_order_date", "id"], name="customer_last_order_id_idx"),
+            # orderBy: name
+            models.Index(fields=["name", "id"], name="customer_name_id_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.phone_digits = normalize_phone(self.phone)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "phone" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "phone_digits"}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.name} <{self.email}>"
@@ -27,6 +62,15 @@ class Product(models.Model):
                                 validators=[MinValueValidator(0.01)])
     stock = models.PositiveIntegerField(default=0)
 
+    class Meta:
+        indexes = [
+            # ProductFilter range filters and the low-stock restock job;
+            # with the id, orderBy keysets
+            models.Index(fields=["stock", "id"], name="product_stock_id_idx"),
+            models.Index(fields=["price", "id"], name="product_price_id_idx"),
+            models.Index(fields=["name", "id"], name="product_name_id_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -39,6 +83,22 @@ class Order(models.Model):
     total_amount = models.DecimalField(max_digits=10, decimal_places=2,
                                        default=0.00)
 
+    class Meta:
+        indexes = [
+            # keyset pagination seeks on (order_date, id)
+            models.Index(fields=["order_date", "id"], name="order_date_id_idx"),
+            # OrderFilter total_amount range and orderBy: totalAmount
+            models.Index(fields=["total_amount", "id"], name="order_total_id_idx"),
+            # inactive-customer cleanup: NOT EXISTS (customer, order_date >= cutoff)
+            models.Index(fields=["customer", "order_date"], name="order_customer_date_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        # the customer aggregate updates in crm.signals commit or roll back
+        # with the order row (CrmStats is bumped once it has committed)
+        with transaction.atomic(using=kwargs.get("using"), savepoint=False):
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Order #{self.id} by {self.customer.name}"
 
@@ -46,4 +106,116 @@ class Order(models.Model):
 class OrderItem(models.Model):
     order   = models.ForeignKey(Order, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
-    quantity = models.PositiveIntegerField(default=1)
\ No newline at end of file
+    quantity = models.PositiveIntegerField(default=1)
+
+
+class Checkpoint(models.Model):
+    """Resume position of a long-running job, committed with its work."""
+    name     = models.CharField(max_length=255, unique=True)
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
+
+
+
+class CrmStats(models.Model):
+    """
+    Single-row dashboard totals, kept current by crm.signals and the bulk
+    insert paths so totalCustomers/totalOrders/totalRevenue are O(1) reads.
+
+    Deltas are applied after the writing transaction commits, each in its
+    own one-statement UPDATE, so concurrent writers never hold the row lock
+    until their commit. The totals therefore count committed writes only,
+    may trail them for the moment between commit and update, and miss a
+    delta whose process dies in that moment; ``manage.py reconcile_stats``
+    recomputes them exactly.
+    """
+    SINGLETON_ID = 1
+
+    customer_count = models.BigIntegerField(default=0)
+    order_count    = models.BigIntegerField(default=0)
+    total_revenue  = models.DecimalField(max_digits=14, decimal_places=2,
+                                         default=0)
+    updated_at     = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def exact(cls):
+        return {
+            "customer_count": Customer.objects.count(),
+            "order_count": Order.objects.count(),
+            "total_revenue": (Order.objects.aggregate(
+                total=Sum("total_amount"))["total"] or Decimal("0")
+            ).quantize(Decimal("0.01")),
+        }
+
+    @classmethod
+    def load(cls):
+        stats = cls.objects.filter(pk=cls.SINGLETON_ID).first()
+        if stats is None:
+            stats, _ = cls.objects.update_or_create(
+                pk=cls.SINGLETON_ID, defaults=cls.exact())
+        return stats
+
+    @classmethod
+    def bump(cls, customers=0, orders=0, revenue=0):
+        """Apply deltas once the current transaction (if any) commits."""
+        transaction.on_commit(lambda: cls.apply(customers, orders, revenue),
+                              robust=True)
+
+    @classmethod
+    def apply(cls, customers=0, orders=0, revenue=0):
+        """Apply deltas with one UPDATE; seeds the row if it is missing."""
+        updated = cls.objects.filter(pk=cls.SINGLETON_ID).update(
+            customer_count=F("customer_count") + customers,
+            order_count=F("order_count") + orders,
+            total_revenue=F("total_revenue") + revenue,
+            updated_at=timezone.now(),
+        )
+        if not updated:
+            # computed after the triggering write committed, so it includes it
+            cls.load()
+
+    @classmethod
+    def recount_revenue(cls):
+        """Recompute total_revenue exactly once the current transaction commits."""
+        transaction.on_commit(
+            lambda: cls.objects.filter(pk=cls.SINGLETON_ID).update(
+                total_revenue=cls.exact()["total_revenue"]),
+            robust=True)
+
+    def __str__(self):
+        return (f"{self.customer_count} customers, {self.order_count} orders, "
+                f"{self.total_revenue} revenue")
+
+
+class DailyRollup(models.Model):
+    """
+    Totals of one UTC day, written by ``crm.rollups.update_rollups`` once
+    the day is over, so period reports sum a few rows instead of history.
+    """
+    day               = models.DateField(unique=True)
+    customers_created = models.IntegerField(default=0)
+    orders            = models.IntegerField(default=0)
+    revenue           = models.DecimalField(max_digits=14, decimal_places=2,
+                                            default=0)
+    units_sold        = models.IntegerField(default=0)
+    updated_at        = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.day}: {self.orders} orders, {self.revenue} revenue"
+
+
+class ProductDailyRollup(models.Model):
+    """Units of one product sold on one day."""
+    rollup     = models.ForeignKey(DailyRollup, on_delete=models.CASCADE,
+                                   related_name="products")
+    product    = models.ForeignKey(Product, on_delete=models.CASCADE)
+    units_sold = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["rollup", "product"],
+                                    name="product_rollup_unique"),
+        ]
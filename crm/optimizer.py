@@ -0,0 +1,161 @@
+"""
+Selection-set aware queryset optimizer.
+
+Walks the GraphQL selection under a connection field (fragments, inline
+fragments, aliases and @skip/@include are resolved by graphql-core's own
+field collection) and narrows the queryset accordingly:
+
+* ``only()`` for the concrete columns that were actually selected,
+* ``select_related()`` for selected forward foreign keys,
+* ``prefetch_related()`` with ``Prefetch`` objects for nested connections,
+  filtered with the same FilterSet and arguments the nested field receives.
+
+Works for any DjangoObjectType whose fields map onto model fields; a level
+selecting a field the optimizer cannot map (custom resolver) keeps loading
+every column so the resolver never triggers deferred-field queries.
+"""
+import hashlib
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch, QuerySet
+from graphene import Dynamic
+from graphene.utils.str_converters import to_camel_case
+from graphql import get_named_type
+from graphql.execution.collect_fields import collect_sub_fields
+from graphql.execution.values import get_argument_values
+
+PAGINATION_ARGS = ("first", "last", "before", "after", "offset")
+
+
+def filter_key(args):
+    """Hashable key for the non-pagination arguments of a connection."""
+    return tuple(sorted(
+        (k, repr(v)) for k, v in args.items() if k not in PAGINATION_ARGS
+    ))
+
+
+def prefetch_attr(field_name, args):
+    """Attribute a nested connection's prefetched rows are stored under."""
+    digest = hashlib.md5(repr(filter_key(args)).encode()).hexdigest()[:8]
+    return f"_prefetched_{field_name}_{digest}"
+
+
+def optimize_queryset(queryset, info):
+    """Optimize ``queryset`` for the selection of the field being resolved."""
+    if not isinstance(queryset, QuerySet):
+        return queryset
+    node_type, selections = node_selections(
+        info, get_named_type(info.return_type), info.field_nodes)
+    return apply_plan(info, queryset, node_type, selections)
+
+
+def include_fields(queryset, *names):
+    """Make sure ``names`` survive an ``only()`` applied by the optimizer."""
+    existing, deferred = queryset.query.deferred_loading
+    if deferred or not existing:
+        return queryset
+    return queryset.only(*existing, *names)
+
+
+def node_selections(info, gql_type, field_nodes):
+    """
+    Return ``(node_type, {response_key: [FieldNode]})`` for ``field_nodes``.
+
+    Relay connections are unwrapped through ``edges { node }`` so callers
+    always see the selection made on the node type itself.
+    """
+    selections = collect_sub_fields(info.schema, info.fragments,
+                                    info.variable_values, gql_type, field_nodes)
+    if "edges" not in gql_type.fields:
+        return gql_type, selections
+
+    edge_type = get_named_type(gql_type.fields["edges"].type)
+    node_type = get_named_type(edge_type.fields["node"].type)
+    edges = [n for nodes in selections.values() for n in nodes
+             if n.name.value == "edges"]
+    edge_selections = collect_sub_fields(info.schema, info.fragments,
+                                         info.variable_values, edge_type, edges)
+    nodes = [n for group in edge_selections.values() for n in group
+             if n.name.value == "node"]
+    return node_type, collect_sub_fields(info.schema, info.fragments,
+                                         info.variable_values, node_type, nodes)
+
+
+def apply_plan(info, queryset, gql_type, selections, keep=()):
+    only, related, prefetch = build_plan(info, queryset.model, gql_type, selections)
+    if related:
+        queryset = queryset.select_related(*related)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch.values())
+    if only is not None:
+        queryset = queryset.only(*only, *keep)
+    return queryset
+
+
+def build_plan(info, model, gql_type, selections, prefix=""):
+    """
+    Map one level of a selection onto ``model``.
+
+    Returns ``(only, select_related, prefetches)`` with every lookup
+    prefixed by ``prefix``; ``prefetches`` is keyed by the prefixed to_attr
+    and ``only`` is None when the level selects a field that does not
+    correspond to a model field.
+    """
+    graphene_fields = gql_type.graphene_type._meta.fields
+    attrs = {getattr(field, "name", None) or to_camel_case(attr): attr
+             for attr, field in graphene_fields.items()}
+
+    only, related, prefetch = {prefix + model._meta.pk.name}, [], {}
+    exact = True
+    for nodes in selections.values():
+        name = nodes[0].name.value
+        attr = attrs.get(name)
+        if name == "__typename" or attr == "id":
+            continue
+        try:
+            field = model._meta.get_field(attr or name)
+        except FieldDoesNotExist:
+            exact = False
+            continue
+
+        if not field.is_relation:
+            only.add(prefix + field.name)
+            continue
+
+        gql_field = gql_type.fields[name]
+        if field.many_to_one or (field.one_to_one and field.concrete):
+            only.add(prefix + field.name)
+            related.append(prefix + field.name)
+            child_type, child_selections = node_selections(
+                info, get_named_type(gql_field.type), nodes)
+            child_only, child_related, child_prefetch = build_plan(
+                info, field.related_model, child_type, child_selections,
+                prefix + field.name + "__")
+            if child_only is not None:
+                only.update(child_only)
+            related.extend(child_related)
+            prefetch.update(child_prefetch)
+        elif field.one_to_many or field.many_to_many:
+            graphene_field = graphene_fields[attr]
+            if isinstance(graphene_field, Dynamic):
+                graphene_field = graphene_field.get_type()
+            if not hasattr(graphene_field, "get_queryset_resolver"):
+                continue
+            args = get_argument_values(gql_field, nodes[0], info.variable_values)
+            lookup = prefetch_attr(name, args)
+            if prefix + lookup in prefetch:
+                continue
+            children = graphene_field.get_queryset_resolver()(
+                graphene_field.connection_type, graphene_field.get_manager(),
+                info, dict(args))
+            child_type, child_selections = node_selections(
+                info, get_named_type(gql_field.type), nodes)
+            keep = (field.field.name,) if field.one_to_many else ()
+            children = apply_plan(info, children, child_type, child_selections, keep)
+            accessor = field.get_accessor_name() if field.auto_created else field.name
+            prefetch[prefix + lookup] = Prefetch(
+                prefix + accessor, queryset=children, to_attr=lookup)
+        else:
+            exact = False
+
+    return (only if exact else None), related, prefetch
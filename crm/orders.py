@@ -0,0 +1,109 @@
+"""
+Order placement with stock reservation (``place_order``, behind the
+placeOrder mutation) and without it (``create_order``, behind createOrder).
+
+Product rows are locked in ascending id order, so two orders touching the
+same products always queue in the same order instead of deadlocking, and
+stock is decremented by one conditional UPDATE that refuses to go below
+zero. Prices come from the locked rows, so the total always matches the
+stock that was reserved.
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import Customer, Order, OrderItem, Product
+from .response_cache import invalidate
+
+
+def normalize_items(items):
+    """Merge ``(product_id, quantity)`` pairs into {product pk: quantity}."""
+    quantities = {}
+    for product_id, quantity in items:
+        try:
+            pk = int(product_id)
+        except (TypeError, ValueError):
+            raise ValidationError("One or more product IDs are invalid.")
+        if quantity is None or quantity <= 0:
+            raise ValidationError("Quantity must be positive.")
+        quantities[pk] = quantities.get(pk, 0) + quantity
+    if not quantities:
+        raise ValidationError("At least one product is required.")
+    return quantities
+
+
+def check_customer(customer_id):
+    try:
+        customer_exists = Customer.objects.filter(pk=customer_id).exists()
+    except (TypeError, ValueError):
+        customer_exists = False
+    if not customer_exists:
+        raise ValidationError("Invalid customer ID.")
+
+
+def create_order(customer_id, product_ids):
+    """
+    Create an order of one unit of each listed product, priced from the
+    products; stock is neither checked nor reserved.
+    """
+    check_customer(customer_id)
+    if not product_ids:
+        raise ValidationError("At least one product is required.")
+    try:
+        products = list(Product.objects.filter(pk__in=product_ids).only("id", "price"))
+    except (TypeError, ValueError):
+        products = []
+    if len(products) != len(product_ids):
+        raise ValidationError("One or more product IDs are invalid.")
+
+    with transaction.atomic():
+        order = Order.objects.create(customer_id=customer_id,
+                                     total_amount=sum(p.price for p in products))
+        OrderItem.objects.bulk_create(OrderItem(order=order, product=p)
+                                      for p in products)
+        invalidate(OrderItem)
+    return order
+
+
+def place_order(customer_id, items):
+    """
+    Create an order for ``items`` and reserve their stock atomically.
+
+    Raises ValidationError for unknown customers/products, non-positive
+    quantities, or when any product does not have enough stock; nothing is
+    written in that case.
+    """
+    check_customer(customer_id)
+    quantities = normalize_items(items)
+    ids = sorted(quantities)
+
+    with transaction.atomic():
+        products = list(Product.objects.select_for_update()
+                        .filter(pk__in=ids).order_by("pk")
+                        .only("id", "price", "stock"))
+        if len(products) != len(ids):
+            raise ValidationError("One or more product IDs are invalid.")
+        short = [p.pk for p in products if p.stock < quantities[p.pk]]
+        if short:
+            raise ValidationError(
+                f"Insufficient stock for product(s): {', '.join(map(str, short))}.")
+
+        wanted = Case(*(When(pk=pk, then=Value(qty)) for pk, qty in quantities.items()),
+                      output_field=IntegerField())
+        reserved = (Product.objects.filter(pk__in=ids, stock__gte=wanted)
+                    .update(stock=F("stock") - wanted))
+        if reserved != len(ids):
+            # only reachable on backends that ignore select_for_update
+            raise ValidationError("Insufficient stock for one or more products.")
+
+        order = Order.objects.create(
+            customer_id=customer_id,
+            total_amount=sum(p.price * quantities[p.pk] for p in products),
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=p, quantity=quantities[p.pk])
+            for p in products
+        )
+        # the stock update() and bulk_create() above skip model signals
+        invalidate(Product, OrderItem)
+    return order
@@ -0,0 +1,52 @@
+"""
+E.164-style normalization of the free-form phone numbers Customer accepts.
+
+``+1 (234) 567-8901`` and ``+1-234-567-8901`` both become ``12345678901``:
+the country code and subscriber digits, without the ``+``. A number written
+without a leading ``+`` is taken as a national number and gets
+CRM_PHONE_DEFAULT_COUNTRY_CODE in front. ``Customer.phone_digits`` stores
+the result, so a country or area code is a prefix of it and a prefix is a
+B-tree range: ``'1234'`` is ``>= '1234' AND < '1235'``.
+"""
+import re
+
+from django.conf import settings
+from django.db.models import Q
+
+_NON_DIGITS = re.compile(r"\D")
+
+
+def default_country_code():
+    return getattr(settings, "CRM_PHONE_DEFAULT_COUNTRY_CODE", "1")
+
+
+def normalize_phone(phone, country_code=None):
+    """Digits of ``phone`` with its country code, or '' if it has none."""
+    digits = _NON_DIGITS.sub("", phone or "")
+    if not digits or phone.lstrip().startswith("+"):
+        return digits
+    return (country_code or default_country_code()) + digits
+
+
+def next_prefix(prefix):
+    """The smallest digit string above every string starting with ``prefix``."""
+    stripped = prefix.rstrip("9")
+    if not stripped:
+        return None
+    return stripped[:-1] + str(int(stripped[-1]) + 1)
+
+
+def phone_prefix_filter(pattern, field="phone_digits"):
+    """
+    A Q selecting phones that start with ``pattern`` once both are
+    normalized, as a range on ``field``; a pattern without digits
+    (``"+"``, ``"-"``) matches nothing.
+    """
+    prefix = normalize_phone(pattern)
+    if not prefix:
+        return Q(pk__in=[])
+    q = Q(**{f"{field}__gte": prefix})
+    upper = next_prefix(prefix)
+    if upper is not None:
+        q &= Q(**{f"{field}__lt": upper})
+    return q
@@ -0,0 +1,331 @@
+"""
+Result cache for read-only GraphQL operations.
+
+Entries are keyed on the normalized document (``print_ast`` of the parsed
+query, so whitespace and formatting do not matter), the operation name and
+the variables. Each entry records the models it was computed from and a
+snapshot of their generation counters; saving or deleting a Customer,
+Product, Order or OrderItem bumps that model's generation (see
+``crm.signals``), which makes every dependent entry stale at once without
+scanning the cache. Paths that bypass model signals (``bulk_create``,
+queryset ``update()``) call ``invalidate()`` themselves.
+
+Generations must be shared by every process that writes: web workers,
+Celery and the in-process cron jobs. The default backend keeps entries in
+an in-process LRU with a TTL but reads and bumps the generations in a
+Django cache alias (Redis when CRM_CACHE_URL is set), so a write anywhere
+invalidates every worker. ``'django'`` keeps the entries there too;
+``'locmem'`` keeps both in the process and is only correct when that
+process is the only writer. The CRM schema has no per-user data, so the
+requesting user is not part of the key.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from graphql import (GraphQLObjectType, OperationType, TypeInfo, TypeInfoVisitor,
+                     Visitor, get_named_type, get_operation_ast, print_ast, visit)
+
+TRACKED_MODELS = ("crm.Customer", "crm.Product", "crm.Order", "crm.OrderItem",
+                  "crm.DailyRollup", "crm.ProductDailyRollup")
+
+
+class LocMemBackend:
+    """Thread-safe LRU of ``key -> (expires, value)`` plus generation counters."""
+
+    def __init__(self, maxsize=512, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.evictions = self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def generations(self, labels):
+        with self._lock:
+            return [self._generations.get(label, 0) for label in labels]
+
+    def bump(self, labels):
+        with self._lock:
+            for label in labels:
+                self._generations[label] = self._generations.get(label, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DjangoCacheBackend:
+    """
+    Store entries in a Django cache alias so several processes share them.
+
+    The cache backend evicts on its own, so ``evictions`` stays at zero.
+    """
+    prefix = "crm:graphql:"
+
+    def __init__(self, alias="default", ttl=60):
+        self.cache = caches[alias]
+        self.ttl = ttl
+        self.evictions = self.expirations = 0
+
+    def get(self, key):
+        return self.cache.get(self.prefix + key)
+
+    def set(self, key, value):
+        self.cache.set(self.prefix + key, value, self.ttl)
+
+    def generations(self, labels):
+        keys = [self.prefix + "gen:" + label for label in labels]
+        found = self.cache.get_many(keys)
+        return [found.get(key, 0) for key in keys]
+
+    def bump(self, labels):
+        for label in labels:
+            key = self.prefix + "gen:" + label
+            # add() is a no-op when the counter exists; incr() is atomic
+            self.cache.add(key, 0, None)
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.set(key, 1, None)
+
+    def clear(self):
+        self.bump(TRACKED_MODELS)
+
+    def __len__(self):
+        return 0
+
+
+class SharedGenerationsBackend(LocMemBackend):
+    """
+    Entries in this process's LRU, generation counters in a Django cache
+    alias: results are not shared, but a write in any process using the
+    same cache makes them stale everywhere.
+    """
+
+    def __init__(self, alias="default", maxsize=512, ttl=60):
+        super().__init__(maxsize, ttl)
+        self.counters = DjangoCacheBackend(alias, ttl)
+
+    def generations(self, labels):
+        return self.counters.generations(labels)
+
+    def bump(self, labels):
+        self.counters.bump(labels)
+
+
+def type_models(named_type):
+    """Model labels a GraphQL object type reads, including related tables."""
+    meta = getattr(getattr(named_type, "graphene_type", None), "_meta", None)
+    model = getattr(meta, "model", None)
+    node = getattr(meta, "node", None)
+    if model is None and node is not None:
+        model = getattr(node._meta, "model", None)
+    if model is None:
+        return set()
+    labels = {model._meta.label}
+    for field in model._meta.get_fields():
+        if field.concrete and field.many_to_one:
+            labels.add(field.related_model._meta.label)
+        elif field.concrete and field.many_to_many:
+            labels.add(field.related_model._meta.label)
+            labels.add(field.remote_field.through._meta.label)
+    return labels
+
+
+def document_models(schema, document, operation):
+    """
+    Labels of the models an operation depends on.
+
+    A root field that does not reach any Django type (e.g. ``totalRevenue``)
+    is assumed to depend on every tracked model.
+    """
+    type_info = TypeInfo(schema)
+    labels, depth = set(), [0]
+    root_models = []
+
+    class Collector(Visitor):
+        def enter_field(self, node, *args):
+            named = get_named_type(type_info.get_type())
+            found = type_models(named) if isinstance(named, GraphQLObjectType) else set()
+            if depth[0] == 0:
+                root_models.append(set())
+            root_models[-1].update(found)
+            labels.update(found)
+            depth[0] += 1
+
+        def leave_field(self, node, *args):
+            depth[0] -= 1
+
+    visit(operation, TypeInfoVisitor(type_info, Collector()))
+    if any(not found for found in root_models):
+        labels.update(TRACKED_MODELS)
+    return sorted(labels)
+
+
+class ResponseCache:
+    """Read-through cache of ``ExecutionResult.data`` for query operations."""
+
+    def __init__(self, schema, backend):
+        self.schema = schema
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def plan(self, document, operation_name, variables):
+        """
+        Return ``(key, labels)`` for a cacheable operation, else None.
+
+        The normalized text and dependencies are memoized on the document,
+        which the DocumentStore keeps alive between requests.
+        """
+        operation = get_operation_ast(document, operation_name)
+        if operation is None or operation.operation != OperationType.QUERY:
+            return None
+        memo = document.__dict__.setdefault("_crm_cache_plans", {})
+        if operation_name not in memo:
+            memo[operation_name] = (
+                hashlib.sha256(print_ast(document).encode("utf-8")).hexdigest(),
+                document_models(self.schema, document, operation),
+            )
+        digest, labels = memo[operation_name]
+        payload = json.dumps([digest, operation_name, variables or {}],
+                             sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest(), labels
+
+    def get(self, key, labels):
+        """Cached data for ``key``, or None if missing, expired or stale."""
+        entry = self.backend.get(key)
+        fresh = entry is not None and entry[0] == self.backend.generations(labels)
+        with self._lock:
+            if fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry[1] if fresh else None
+
+    def snapshot(self, labels):
+        """Generations to store with a result; take it before executing."""
+        return self.backend.generations(labels)
+
+    def set(self, key, generations, data):
+        self.backend.set(key, (generations, data))
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.backend.evictions,
+                "expirations": self.backend.expirations,
+                "entries": len(self.backend),
+            }
+
+
+def backend_from_settings():
+    kind = getattr(settings, "CRM_RESPONSE_CACHE_BACKEND", "shared")
+    if not kind:
+        return None
+    ttl = getattr(settings, "CRM_RESPONSE_CACHE_TTL", 60)
+    alias = getattr(settings, "CRM_RESPONSE_CACHE_ALIAS", "default")
+    size = getattr(settings, "CRM_RESPONSE_CACHE_SIZE", 512)
+    if kind == "django":
+        return DjangoCacheBackend(alias, ttl)
+    if kind == "locmem":
+        return LocMemBackend(size, ttl)
+    return SharedGenerationsBackend(alias, size, ttl)
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_shared_generations(app_configs, **kwargs):
+    """Invalidation only crosses processes through a shared cache."""
+    kind = getattr(settings, "CRM_RESPONSE_CACHE_BACKEND", "shared")
+    alias = getattr(settings, "CRM_RESPONSE_CACHE_ALIAS", "default")
+    if not kind:
+        return []
+    if kind == "locmem" or isinstance(caches[alias], LocMemCache):
+        return [checks.Warning(
+            "GraphQL response cache generations are per-process, so writes "
+            "from other workers, Celery or cron do not invalidate results.",
+            hint="Set CRM_CACHE_URL (or CRM_RESPONSE_CACHE_ALIAS) to a shared "
+                 "cache, or CRM_RESPONSE_CACHE_BACKEND = None.",
+            id="crm.W001",
+        )]
+    return []
+
+
+_UNSET = object()
+_backend = _UNSET
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def shared_backend():
+    """The process-wide backend built from settings (None when disabled)."""
+    global _backend
+    with _caches_lock:
+        if _backend is _UNSET:
+            _backend = backend_from_settings()
+        return _backend
+
+
+def shared_cache(schema):
+    """The process-wide ResponseCache for ``schema`` (None when disabled)."""
+    backend = shared_backend()
+    if backend is None:
+        return None
+    with _caches_lock:
+        if schema not in _caches:
+            _caches[schema] = ResponseCache(schema, backend)
+        return _caches[schema]
+
+
+def invalidate(*models):
+    """
+    Mark results that read ``models`` as stale.
+
+    Bumped immediately, so later reads in this request miss, and again on
+    commit, so a result computed from pre-commit data by a concurrent
+    request is not served either.
+    """
+    backend = shared_backend()
+    if backend is None:
+        return
+    labels = [model if isinstance(model, str) else model._meta.label
+              for model in models]
+    backend.bump(labels)
+    transaction.on_commit(lambda: backend.bump(labels))
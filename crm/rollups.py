@@ -0,0 +1,106 @@
+"""
+Daily rollups of new customers, orders, revenue and units sold.
+
+``update_rollups()`` writes one DailyRollup, with a ProductDailyRollup per
+product sold, for every complete UTC day after the last one written. Each
+day reads only its own rows, through the order_date and created_at
+indexes, so a run costs the same whatever the history. Rolling a day up
+again replaces it. ``period_totals()`` sums at most a month of rollups,
+which keeps weekly and monthly reports constant-time too.
+"""
+from collections import namedtuple
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.utils import timezone
+
+from .models import (Customer, DailyRollup, Order, OrderItem,
+                     ProductDailyRollup)
+from .response_cache import invalidate
+
+PeriodTotals = namedtuple(
+    "PeriodTotals", "start end customers_created orders revenue units_sold")
+
+
+def day_bounds(day):
+    """The ``[start, end)`` datetimes of a UTC day."""
+    start = datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+    return start, start + timedelta(days=1)
+
+
+def rollup_day(day):
+    """Recompute and store the rollup of ``day``."""
+    start, end = day_bounds(day)
+    with transaction.atomic():
+        totals = Order.objects.filter(order_date__gte=start, order_date__lt=end).aggregate(
+            count=Count("pk"), revenue=Sum("total_amount"))
+        units = list(OrderItem.objects
+                     .filter(order__order_date__gte=start, order__order_date__lt=end)
+                     .values("product_id").annotate(units=Sum("quantity")).order_by())
+        rollup, _ = DailyRollup.objects.update_or_create(day=day, defaults={
+            "customers_created": Customer.objects.filter(
+                created_at__gte=start, created_at__lt=end).count(),
+            "orders": totals["count"],
+            "revenue": totals["revenue"] or 0,
+            "units_sold": sum(row["units"] for row in units),
+        })
+        rollup.products.all().delete()
+        ProductDailyRollup.objects.bulk_create(
+            ProductDailyRollup(rollup=rollup, product_id=row["product_id"],
+                               units_sold=row["units"])
+            for row in units)
+        invalidate(DailyRollup, ProductDailyRollup)
+    return rollup
+
+
+def first_activity_day():
+    days = [value.date() for value in (
+        Order.objects.aggregate(first=Min("order_date"))["first"],
+        Customer.objects.aggregate(first=Min("created_at"))["first"],
+    ) if value is not None]
+    return min(days, default=None)
+
+
+def update_rollups(through=None, start=None):
+    """
+    Roll up every day from ``start`` through ``through`` (yesterday by
+    default, the last complete day). ``start`` defaults to the day after
+    the latest rollup, or to the first day with data. Returns the days.
+    """
+    through = through or timezone.now().date() - timedelta(days=1)
+    if start is None:
+        last = DailyRollup.objects.aggregate(last=Max("day"))["last"]
+        start = last + timedelta(days=1) if last else first_activity_day()
+    days = []
+    while start is not None and start <= through:
+        rollup_day(start)
+        days.append(start)
+        start += timedelta(days=1)
+    return days
+
+
+def period_totals(start, end):
+    """Sums of the rollups from ``start`` through ``end``."""
+    totals = DailyRollup.objects.filter(day__gte=start, day__lte=end).aggregate(
+        customers_created=Sum("customers_created"), orders=Sum("orders"),
+        revenue=Sum("revenue"), units_sold=Sum("units_sold"))
+    return PeriodTotals(start, end, **{name: value or 0 for name, value in totals.items()})
+
+
+def period_bounds(period, today=None):
+    """First and last day of the last complete ``week`` (Mon-Sun) or ``month``."""
+    today = today or timezone.now().date()
+    if period == "week":
+        end = today - timedelta(days=today.weekday() + 1)
+        return end - timedelta(days=6), end
+    if period == "month":
+        end = today.replace(day=1) - timedelta(days=1)
+        return end.replace(day=1), end
+    raise ValueError(f"Unknown period: {period}")
+
+
+def compare_periods(period, today=None):
+    """Totals of the last complete period and of the one before it."""
+    start, end = period_bounds(period, today)
+    return period_totals(start, end), period_totals(*period_bounds(period, start))
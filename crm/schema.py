@@ -1,17 +1,26 @@
 # crm/schema.py
 import graphene
 from graphene_django import DjangoObjectType
-from graphene_django.filter import DjangoFilterConnectionField
 from graphene import relay
 from django.core.exceptions import ValidationError
-from django.db import transaction
-from .models import Customer, Product, Order, OrderItem
+from django.conf import settings
+from django.db.models import Prefetch
+from .models import (Customer, Product, Order, OrderItem, CrmStats,
+                     DailyRollup, ProductDailyRollup)
 from .filters import CustomerFilter, ProductFilter, OrderFilter
+from .bulk import bulk_create_customers
+from .fields import (BatchedFilterConnectionField, KeysetConnectionField,
+                     SearchConnectionField)
+from .inventory import restock_low_stock
+from .loaders import get_registry, load_related
+from .orders import create_order, place_order
 from crm.models import Product
-from django.db.models import Sum
 
 # ---------- TYPES ----------
 class CustomerType(DjangoObjectType):
+    orders = BatchedFilterConnectionField(lambda: OrderType, required=True,
+                                          batch_key="customer_id")
+
     class Meta:
         model = Customer
         filterset_class = CustomerFilter
@@ -26,11 +35,30 @@ class ProductType(DjangoObjectType):
         fields = ("id", "name", "stock", "price")
 
 class OrderType(DjangoObjectType):
+    products = BatchedFilterConnectionField(ProductType, required=True,
+                                            batch_key="orderitem__order_id")
+
     class Meta:
         model = Order
         filterset_class = OrderFilter
         interfaces = (relay.Node,)
 
+    def resolve_customer(order, info):
+        return load_related(info, order, "customer")
+
+
+class ProductRollupType(DjangoObjectType):
+    class Meta:
+        model = ProductDailyRollup
+        fields = ("product", "units_sold")
+
+
+class DailyRollupType(DjangoObjectType):
+    class Meta:
+        model = DailyRollup
+        fields = ("day", "customers_created", "orders", "revenue",
+                  "units_sold", "products")
+
 
 # ---------- INPUTS ----------
 class CustomerInput(graphene.InputObjectType):
@@ -52,6 +80,14 @@ class OrderInput(graphene.InputObjectType):
     customer_id = graphene.ID(required=True)
     product_ids = graphene.List(graphene.NonNull(graphene.ID), required=True)
 
+class OrderItemInput(graphene.InputObjectType):
+    product_id = graphene.ID(required=True)
+    quantity   = graphene.Int(default_value=1)
+
+class PlaceOrderInput(graphene.InputObjectType):
+    customer_id = graphene.ID(required=True)
+    items       = graphene.List(graphene.NonNull(OrderItemInput), required=True)
+
 
 # ---------- MUTATIONS ----------
 class CreateCustomer(graphene.Mutation):
@@ -75,25 +111,15 @@ class CreateCustomer(graphene.Mutation):
 class BulkCreateCustomers(graphene.Mutation):
     class Arguments:
         input = graphene.List(CustomerListInput, required=True)
+        batch_size = graphene.Int()
 
     customers = graphene.List(CustomerType)
     errors    = graphene.List(graphene.String)
 
-    def mutate(self, info, input):
-        created, errors = [], []
-        with transaction.atomic():
-            for data in input:
-                try:
-                    if Customer.objects.filter(email=data.email).exists():
-                        errors.append(f"{data.email} already exists.")
-                        continue
-                    cust = Customer(name=data.name, email=data.email,
-                                    phone=data.phone or "")
-                    cust.full_clean()
-                    cust.save()
-                    created.append(cust)
-                except ValidationError as ve:
-                    errors.extend(ve.messages)
+    def mutate(self, info, input, batch_size=None):
+        if batch_size is not None and batch_size <= 0:
+            raise ValidationError("Batch size must be positive.")
+        created, errors = bulk_create_customers(input, batch_size)
         return BulkCreateCustomers(customers=created, errors=errors)
 
 
@@ -123,67 +149,110 @@ class CreateOrder(graphene.Mutation):
     order = graphene.Field(OrderType)
 
     def mutate(self, info, input):
-        try:
-            customer = Customer.objects.get(pk=input.customer_id)
-        except Customer.DoesNotExist:
-            raise ValidationError("Invalid customer ID.")
-        if not input.product_ids:
-            raise ValidationError("At least one product is required.")
-
-        products = Product.objects.filter(pk__in=input.product_ids)
-        if products.count() != len(input.product_ids):
-            raise ValidationError("One or more product IDs are invalid.")
-
-        with transaction.atomic():
-            order = Order(customer=customer)
-            order.save()
-            order.products.set(products)
-            order.total_amount = sum(p.price for p in products)
-            order.save()
+        order = create_order(input.customer_id, input.product_ids)
         return CreateOrder(order=order)
 
 
+class PlaceOrder(graphene.Mutation):
+    """Create an order with per-product quantities, reserving stock."""
+    class Arguments:
+        input = PlaceOrderInput(required=True)
+
+    order = graphene.Field(OrderType)
+
+    def mutate(self, info, input):
+        order = place_order(input.customer_id,
+                            [(item.product_id, item.quantity) for item in input.items])
+        return PlaceOrder(order=order)
+
+
 class UpdateLowStockProducts(graphene.Mutation):
-    """
-    Mutation to update the stock of products with stock < 10.
-    Adds 10 units to each low-stock product.
-    """
+    """Add ``increment`` units to every product with stock below ``threshold``."""
     updated_count = graphene.Int()
     products = graphene.List(ProductType)
 
     class Arguments:
-        # Optional: allow overriding default increment of 10
         increment = graphene.Int(default_value=10)
+        threshold = graphene.Int(default_value=10)
+        limit     = graphene.Int()
 
-    def mutate(self, info, increment=10):
-        from crm.models import Product  # Ensure model is available
-        low_stock_products = Product.objects.filter(stock__lt=10)
-        updated_count = low_stock_products.update(stock=10)
+    def mutate(self, info, increment=10, threshold=10, limit=None):
+        if increment <= 0:
+            raise ValidationError("Increment must be positive.")
+        if threshold < 0:
+            raise ValidationError("Threshold must be non-negative.")
+        if limit is not None and limit <= 0:
+            raise ValidationError("Limit must be positive.")
+        products = restock_low_stock(threshold, increment, limit)
+        return UpdateLowStockProducts(updated_count=len(products),
+                                      products=products)
 
-        return UpdateLowStockProducts(
-            updated_count=updated_count,
-            products=list(low_stock_products)
-        )
 
+# ---------- QUERIES ----------
+def crm_stats(info):
+    """The dashboard counters row, read once per request."""
+    return get_registry(info).get("crm_stats", CrmStats.load)
+
+
+# orderBy keys of the root connections and the keysets they page by; every
+# keyset has a matching index (see crm.models), so no sort runs in the database
+CUSTOMER_ORDERINGS = {
+    "name": ("name", "id"),
+    "email": ("email",),
+    "createdAt": ("created_at", "id"),
+    "orderCount": ("order_count", "id"),
+    "totalSpent": ("total_spent", "id"),
+    # customers without orders (NULL) come first ascending, last descending
+    "lastOrderDate": ("last_order_date", "id"),
+}
+PRODUCT_ORDERINGS = {
+    "name": ("name", "id"),
+    "price": ("price", "id"),
+    "stock": ("stock", "id"),
+}
+ORDER_ORDERINGS = {
+    "orderDate": ("order_date", "id"),
+    "totalAmount": ("total_amount", "id"),
+}
 
 
-# ---------- QUERIES ----------
 class Query(graphene.ObjectType):
-    all_customers = DjangoFilterConnectionField(CustomerType)
-    all_products  = DjangoFilterConnectionField(ProductType)
-    all_orders    = DjangoFilterConnectionField(OrderType)
+    all_customers = BatchedFilterConnectionField(CustomerType, order_by=CUSTOMER_ORDERINGS)
+    all_products  = BatchedFilterConnectionField(ProductType, order_by=PRODUCT_ORDERINGS)
+    all_orders    = BatchedFilterConnectionField(OrderType, order_by=ORDER_ORDERINGS)
+    all_customers_keyset = KeysetConnectionField(
+        CustomerType, keyset=("-created_at", "-id"))
+    all_orders_keyset    = KeysetConnectionField(
+        OrderType, keyset=("-order_date", "-id"))
     totalCustomers = graphene.Int()
     totalOrders    = graphene.Int()
     totalRevenue   = graphene.Float()
+    # best matches first: every word of ``query`` prefixes a name/email word
+    search_customers = SearchConnectionField(CustomerType)
+    search_products  = SearchConnectionField(ProductType)
+    daily_rollups  = graphene.List(graphene.NonNull(DailyRollupType),
+                                   start=graphene.Date(required=True),
+                                   end=graphene.Date(required=True))
 
     def resolve_totalCustomers(root, info):
-        return Customer.objects.count()
+        return crm_stats(info).customer_count
 
     def resolve_totalOrders(root, info):
-        return Order.objects.count()
+        return crm_stats(info).order_count
 
     def resolve_totalRevenue(root, info):
-        return Order.objects.aggregate(total=Sum('totalamount'))['total'] or 0
+        return float(crm_stats(info).total_revenue)
+
+    def resolve_daily_rollups(root, info, start, end):
+        if end < start:
+            raise ValidationError("End must not be before start.")
+        max_days = getattr(settings, "CRM_ROLLUP_MAX_DAYS", 366)
+        if (end - start).days >= max_days:
+            raise ValidationError(f"Date range exceeds the limit of {max_days} days.")
+        return (DailyRollup.objects.filter(day__gte=start, day__lte=end)
+                .order_by("day")
+                .prefetch_related(Prefetch("products", ProductDailyRollup.objects
+                                           .select_related("product").order_by("product_id"))))
 
 
 # ---------- MUTATIONS ----------
@@ -191,4 +260,6 @@ class Mutation(graphene.ObjectType):
     create_customer       = CreateCustomer.Field()
     bulk_create_customers = BulkCreateCustomers.Field()
     create_product        = CreateProduct.Field()
-    create_order          = CreateOrder.Field()
\ No newline at end of file
+    create_order          = CreateOrder.Field()
+    place_order           = PlaceOrder.Field()
+    update_low_stock_products = UpdateLowStockProducts.Field()
\ No newline at end of file
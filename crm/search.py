@@ -0,0 +1,192 @@
+"""
+Full-text search over customer names/emails and product names.
+
+SQLite keeps an external-content FTS5 table per model (``crm_customer_fts``,
+``crm_product_fts``), PostgreSQL a generated ``search_vector`` tsvector
+column with a GIN index; both are created by migration 0009 and kept in
+sync by the database itself (triggers / generated columns), so bulk
+inserts, queryset updates and the raw deletes of ``crm.cleanup`` cannot
+leave them stale. SQLite drops the triggers whenever a migration rebuilds
+those tables (AddField, AlterField, ...), so such a migration must run
+``restore_triggers`` afterwards, as 0010 and 0011 do; the trigger DDL
+lives only here. Other backends fall back to ``icontains``.
+
+User input is reduced to word tokens, every token is matched as a prefix
+and all of them must match: ``"ali exa"`` finds ``Alice <alice@example.com>``.
+``manage.py rebuild_search_index`` rebuilds the index from the tables.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, When
+from django.db.models.expressions import RawSQL
+from graphene_django.settings import graphene_settings
+from graphql_relay import cursor_to_offset
+
+from .models import Customer, Product
+
+# indexed columns and their bm25 weights; names rank above emails
+SEARCH_FIELDS = {
+    Customer: (("name", 10.0), ("email", 1.0)),
+    Product: (("name", 1.0),),
+}
+
+# more tokens than this only slow the match down
+MAX_TERMS = 8
+
+_TOKEN = re.compile(r"[^\W_]+")
+
+
+def terms(text):
+    """Lower-cased word tokens of ``text``, as the index tokenizes them."""
+    return _TOKEN.findall((text or "").lower())[:MAX_TERMS]
+
+
+# (table, indexed columns) the triggers cover; by table name, not model,
+# because migrations replay them against historical schemas
+SEARCH_TABLES = [
+    ("crm_customer", ("name", "email")),
+    ("crm_product", ("name",)),
+]
+TRIGGERS = ("insert", "delete", "update")
+
+
+def fts_table(model):
+    return f"{model._meta.db_table}_fts"
+
+
+def sqlite_triggers(table, columns):
+    """Statements keeping the FTS5 table of ``table`` in step with its rows."""
+    fts = f"{table}_fts"
+    cols = ", ".join(columns)
+    new = ", ".join(f"new.{c}" for c in columns)
+    old = ", ".join(f"old.{c}" for c in columns)
+    delete = (f"INSERT INTO {fts}({fts}, rowid, {cols}) "
+              f"VALUES ('delete', old.id, {old});")
+    insert = f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new});"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} "
+        f"BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} "
+        f"BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {cols} ON {table} "
+        f"BEGIN {delete} {insert} END",
+    ]
+
+
+def restore_triggers(apps, schema_editor):
+    """RunPython step recreating the triggers after SQLite rebuilt a table."""
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for table, columns in SEARCH_TABLES:
+        for sql in sqlite_triggers(table, columns):
+            schema_editor.execute(sql)
+
+
+def match_sql(model, text):
+    """``(sql, params)`` selecting the pks matching ``text``, or None."""
+    tokens = terms(text)
+    if connection.vendor == "sqlite":
+        table = fts_table(model)
+        query = " ".join(f'"{token}"*' for token in tokens)
+        return f"SELECT rowid FROM {table} WHERE {table} MATCH %s", [query]
+    if connection.vendor == "postgresql":
+        query = " & ".join(f"{token}:*" for token in tokens)
+        return (f"SELECT id FROM {model._meta.db_table} "
+                f"WHERE search_vector @@ to_tsquery('simple', %s)"), [query]
+    return None
+
+
+def search_filter(model, text):
+    """A Q matching the rows of ``model`` that match ``text``, unranked."""
+    if not terms(text):
+        return Q(pk__in=[])
+    sql = match_sql(model, text)
+    if sql is None:
+        q = Q()
+        for token in terms(text):
+            q &= Q(*(Q(**{f"{name}__icontains": token})
+                     for name, _ in SEARCH_FIELDS[model]), _connector=Q.OR)
+        return q
+    return Q(pk__in=RawSQL(*sql))
+
+
+def ranked_ids(model, text, limit, queryset=None):
+    """
+    Pks of the ``limit`` best matches for ``text``, best first. Only rows
+    of ``queryset`` compete when it is filtered, so filters never cut
+    matches out of a window that was ranked before them.
+    """
+    if not terms(text):
+        return []
+    sql, params = match_sql(model, text) or (None, None)
+    if queryset is None or not queryset.query.where:
+        queryset = None
+    if sql is None:
+        return list((queryset if queryset is not None else model.objects)
+                    .filter(search_filter(model, text))
+                    .order_by("pk").values_list("pk", flat=True)[:limit])
+    if queryset is not None:
+        candidates, candidate_params = (queryset.order_by().values("pk")
+                                        .query.sql_with_params())
+        column = "rowid" if connection.vendor == "sqlite" else "id"
+        sql += f" AND {column} IN ({candidates})"
+        params = params + list(candidate_params)
+    if connection.vendor == "sqlite":
+        table = fts_table(model)
+        weights = ", ".join(str(weight) for _, weight in SEARCH_FIELDS[model])
+        sql += f" ORDER BY bm25({table}, {weights}), rowid LIMIT %s"
+    else:
+        sql += (" ORDER BY ts_rank(search_vector, to_tsquery('simple', %s)) DESC,"
+                " id LIMIT %s")
+        params = params + params[:1]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + [limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search(model, text, limit, queryset=None):
+    """
+    Queryset of the ``limit`` best matches for ``text`` among ``queryset``
+    (default: every row), in rank order.
+    """
+    ids = ranked_ids(model, text, limit, queryset)
+    if not ids:
+        return model.objects.none()
+    rank = Case(*(When(pk=pk, then=position) for position, pk in enumerate(ids)),
+                output_field=IntegerField())
+    return model.objects.filter(pk__in=ids).order_by(rank)
+
+
+def result_window(args):
+    """
+    How many ranked matches a connection page with ``args`` can reach:
+    the ``offset`` and ``after`` positions (which add up, as in
+    DjangoConnectionField) plus the page plus one, so hasNextPage is right.
+    ``last``/``before`` pages need them all, up to CRM_SEARCH_MAX_RESULTS.
+    """
+    max_results = getattr(settings, "CRM_SEARCH_MAX_RESULTS", 1000)
+    if args.get("last") or args.get("before"):
+        return max_results
+    offset = args.get("offset") or 0
+    if args.get("after"):
+        offset += (cursor_to_offset(args["after"]) or 0) + 1
+    page = args.get("first") or graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+    return min(offset + page + 1, max_results)
+
+
+def rebuild():
+    """Rebuild every search index from its table; returns rows per model."""
+    counts = {}
+    with connection.cursor() as cursor:
+        for model in SEARCH_FIELDS:
+            if connection.vendor == "sqlite":
+                table = fts_table(model)
+                cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+                cursor.execute(f"INSERT INTO {table}({table}) VALUES ('optimize')")
+            elif connection.vendor == "postgresql":
+                # generated columns cannot drift; this only compacts the index
+                cursor.execute(f"REINDEX INDEX {model._meta.db_table}_search_idx")
+            counts[model._meta.label] = model.objects.count()
+    return counts
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,7 +46,9 @@ INSTALLED_APPS = [
 ]
 
 GRAPHENE = {
-    "SCHEMA": "alx_backend_graphql.schema.schema"
+    "SCHEMA": "alx_backend_graphql.schema.schema",
+    # max first/last on every connection; also the page when neither is given
+    "RELAY_CONNECTION_MAX_LIMIT": 100,
 }
 
 MIDDLEWARE = [
@@ -85,6 +88,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # take the write lock at BEGIN so concurrent orders queue on the
+        # busy timeout instead of failing to upgrade a read lock
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -130,6 +139,90 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Rows per INSERT for bulk mutations and importers
+CRM_BULK_BATCH_SIZE = 500
+# Products restocked per UPDATE by updateLowStockProducts
+CRM_RESTOCK_BATCH_SIZE = 1000
+# Customer ids per transaction in the inactive-customer cleanup
+CRM_CLEANUP_CHUNK_SIZE = 1000
+# Longest date range dailyRollups accepts
+CRM_ROLLUP_MAX_DAYS = 366
+# Country code given to phone numbers entered without a leading '+'
+CRM_PHONE_DEFAULT_COUNTRY_CODE = '1'
+# Rows fetched per round trip by the /export/orders/ stream
+CRM_EXPORT_CHUNK_SIZE = 2000
+# Most ranked matches searchCustomers/searchProducts page through
+CRM_SEARCH_MAX_RESULTS = 1000
+
+# Parsed-and-validated GraphQL documents kept in memory per process
+CRM_DOCUMENT_CACHE_SIZE = 256
+# Allow-listed operations (*.graphql), registered as persisted queries at startup
+CRM_PERSISTED_QUERIES_DIR = BASE_DIR / 'crm' / 'persisted_queries'
+# Refuse any document that is not allow-listed
+CRM_PERSISTED_QUERIES_ONLY = False
+
+# Shared by every process (web workers, Celery, cron); without CRM_CACHE_URL
+# it is per-process, which is only right while a single process writes
+CRM_CACHE_URL = os.environ.get('CRM_CACHE_URL')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CRM_CACHE_URL,
+    } if CRM_CACHE_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+# Cached results of read-only GraphQL queries (crm/response_cache.py):
+# 'shared' (entries per process, invalidation counters in the cache alias),
+# 'django' (both in the alias), 'locmem' (single process only) or None
+CRM_RESPONSE_CACHE_BACKEND = 'shared'
+# Django cache alias used by the 'shared' and 'django' backends
+CRM_RESPONSE_CACHE_ALIAS = 'default'
+CRM_RESPONSE_CACHE_SIZE = 512
+CRM_RESPONSE_CACHE_TTL = 60
+
+# Reject operations whose estimated row count or nesting exceeds these
+# (see crm/cost.py); 0 disables a limit
+CRM_QUERY_COST_LIMIT = 5000
+CRM_QUERY_DEPTH_LIMIT = 6
+# Rows assumed for a nested connection (an order's products, a customer's
+# orders) without first/last; root connections count a full page (100).
+# allOrders { customer { name } products { name } } then costs 1301 and
+# allCustomers { orders { products { name } } } 12201: a full page of
+# customers with every order's products is over the limit, first: 40 is not
+CRM_QUERY_NESTED_PAGE_ESTIMATE = 10
+
+# Serve /graphql/ with the async view (CRM_ASYNC_GRAPHQL=1). Off by default:
+# benchmarks/async_graphql.py still measures it below the sync view under
+# load (74 vs 103 req/s at 128 clients), so ASGI deployments get the sync one
+CRM_ASYNC_GRAPHQL = os.environ.get('CRM_ASYNC_GRAPHQL') == '1'
+# Threads (and so database connections) the async view resolves fields on
+CRM_ASYNC_DB_WORKERS = 8
+
+# Most operations accepted in one batched (JSON array) request
+CRM_GRAPHQL_MAX_BATCH = 10
+
+# Fraction of GraphQL operations profiled and logged to 'crm.profile'
+# (crm/instrumentation.py); staff, or anyone under DEBUG, can force a profile
+# into the response extensions with the X-CRM-Profile header
+CRM_PROFILE_SAMPLE_RATE = float(os.environ.get('CRM_PROFILE_SAMPLE_RATE', '0.01'))
+CRM_PROFILE_HEADER = 'HTTP_X_CRM_PROFILE'
+# Same SQL shape run more often than this in one operation is flagged as N+1
+CRM_PROFILE_N_PLUS_ONE_THRESHOLD = 5
+
+# Cron and Celery jobs run their GraphQL operations in-process (crm/jobs.py);
+# when set, the heartbeat also checks this endpoint over HTTP (/graphql/api/)
+CRM_HEALTHCHECK_URL = os.environ.get('CRM_HEALTHCHECK_URL')
+# Bearer token of /graphql/api/, the CSRF-exempt endpoint for scripts and
+# remote checks; the shared client sends it. Unset refuses every request
+CRM_API_TOKEN = os.environ.get('CRM_API_TOKEN')
+# Shared HTTP GraphQL client (crm/graphql_client.py): seconds per request,
+# retries on connection errors and 429/5xx, and the exponential backoff factor
+CRM_GRAPHQL_CLIENT_TIMEOUT = 10
+CRM_GRAPHQL_CLIENT_RETRIES = 3
+CRM_GRAPHQL_CLIENT_BACKOFF = 0.3
+
 CRONJOBS = [
     ('*/5 * * * *', 'crm.cron.log_crm_heartbeat'),
     ('0 9 * * *', 'crm.cron.updateLowStockProducts'),
@@ -151,4 +244,18 @@ CELERY_BEAT_SCHEDULE = {
         "task": "crm.tasks.generate_crm_report",
         "schedule": crontab(day_of_week=1, hour=6, minute=0),  # Monday 06:00
     },
+    "update-daily-rollups": {
+        "task": "crm.tasks.update_daily_rollups",
+        "schedule": crontab(hour=0, minute=15),  # yesterday is complete
+    },
+    "generate-weekly-report": {
+        "task": "crm.tasks.generate_period_report",
+        "schedule": crontab(day_of_week=1, hour=6, minute=5),
+        "args": ("week",),
+    },
+    "generate-monthly-report": {
+        "task": "crm.tasks.generate_period_report",
+        "schedule": crontab(day_of_month=1, hour=6, minute=10),
+        "args": ("month",),
+    },
 }
@@ -0,0 +1,83 @@
+"""
+Keep CrmStats, the customer order aggregates (crm.aggregates) and the
+GraphQL response cache in step with row changes.
+
+Bulk paths that bypass model signals (bulk_create in crm.bulk and the
+import command) call ``CrmStats.bump`` and ``invalidate`` themselves.
+Queryset ``update()`` calls on Order.total_amount are not tracked;
+``reconcile_stats`` and ``backfill_customer_aggregates`` fix any drift
+they leave behind.
+"""
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import aggregates
+from .models import CrmStats, Customer, Order, OrderItem, Product
+from .response_cache import invalidate
+
+CACHED_MODELS = (Customer, Product, Order, OrderItem)
+
+
+@receiver(post_save, sender=Customer)
+def customer_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        CrmStats.bump(customers=1)
+
+
+@receiver(post_delete, sender=Customer)
+def customer_deleted(sender, instance, **kwargs):
+    CrmStats.bump(customers=-1)
+
+
+@receiver(post_init, sender=Order)
+def order_loaded(sender, instance, **kwargs):
+    # read __dict__ so a deferred total_amount is not fetched on every load
+    instance._stats_total = instance.__dict__.get("total_amount")
+    instance._stats_customer = instance.__dict__.get("customer_id")
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    total = instance.__dict__.get("total_amount")
+    customer = instance.__dict__.get("customer_id")
+    if created:
+        CrmStats.bump(orders=1, revenue=total or 0)
+        aggregates.record_order(customer, total or 0, instance.order_date)
+    else:
+        delta = 0
+        if total is not None and instance._stats_total is not None:
+            delta = total - instance._stats_total
+        if delta:
+            CrmStats.bump(revenue=delta)
+        if instance._stats_customer not in (None, customer):
+            # moved to another customer
+            aggregates.refresh([customer, instance._stats_customer])
+        elif delta:
+            aggregates.adjust_total(customer, delta)
+    instance._stats_total = total
+    instance._stats_customer = customer
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    if instance._stats_total is None:
+        CrmStats.bump(orders=-1)
+        CrmStats.recount_revenue()
+    else:
+        CrmStats.bump(orders=-1, revenue=-instance._stats_total)
+    aggregates.refresh([instance.customer_id])
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def cached_model_changed(sender, raw=False, **kwargs):
+    if sender in CACHED_MODELS and not raw:
+        invalidate(sender)
+
+
+@receiver(m2m_changed, sender=Order.products.through)
+def order_products_changed(sender, action, **kwargs):
+    if action.startswith("post_"):
+        invalidate(Order, Product, OrderItem)
@@ -1,7 +1,23 @@
+import os
 from datetime import datetime
-import requests  # ✅ required for HTTP call instead of gql
+
 from celery import shared_task
-from django.conf import settings
+
+from crm.cleanup import delete_inactive_customers
+from crm.jobs import run_operation
+from crm.rollups import compare_periods, update_rollups
+
+REPORT_LOG = "/tmp/crm_report_log.txt"
+CLEANUP_LOG = "/tmp/customer_cleanup_log.txt"
+
+REPORT_QUERY = """
+query CrmReport {
+  totalCustomers
+  totalOrders
+  totalRevenue
+}
+"""
+
 
 @shared_task
 def generate_crm_report():
@@ -13,34 +29,18 @@ def generate_crm_report():
     Logs to /tmp/crm_report_log.txt
     """
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_file = "/tmp/crm_report_log.txt"
-
-    query = """
-    {
-      totalCustomers
-      totalOrders
-      totalRevenue
-    }
-    """
+    log_file = REPORT_LOG
+    os.makedirs(os.path.dirname(log_file), exist_ok=True)
 
     try:
-        response = requests.post(
-            "http://localhost:8000/graphql",
-            json={"query": query},
-            headers={"Content-Type": "application/json"},
-            timeout=10
-        )
-        response.raise_for_status()
-        data = response.json().get("data", {})
+        # executed in-process, see crm/jobs.py
+        data = run_operation(REPORT_QUERY)
         customers = data.get("totalCustomers", 0)
         orders = data.get("totalOrders", 0)
         revenue = data.get("totalRevenue", 0)
 
         report = f"{timestamp} - Report: {customers} customers, {orders} orders, {revenue} revenue\n"
 
-        # ensure directory exists
-        import os
-        os.makedirs(os.path.dirname(log_file), exist_ok=True)
         with open(log_file, "a") as f:
             f.write(report)
 
@@ -49,4 +49,54 @@ def generate_crm_report():
     except Exception as e:
         with open(log_file, "a") as f:
             f.write(f"{timestamp} - ERROR: {e}\n")
-        raise
\ No newline at end of file
+        raise
+
+
+@shared_task
+def update_daily_rollups():
+    """Roll up the days completed since the last run (see crm/rollups.py)."""
+    return [day.isoformat() for day in update_rollups()]
+
+
+def _change(current, previous):
+    if not previous:
+        return "n/a"
+    return f"{(current - previous) / previous * 100:+.1f}%"
+
+
+@shared_task
+def generate_period_report(period="week"):
+    """
+    Last complete week or month vs the one before, read from the daily
+    rollups. Logs to /tmp/crm_report_log.txt
+    """
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    current, previous = compare_periods(period)
+    report = (
+        f"{timestamp} - {period.capitalize()} {current.start}..{current.end}: "
+        + ", ".join(
+            f"{getattr(current, field)} {label} ({_change(getattr(current, field), getattr(previous, field))})"
+            for field, label in (("customers_created", "new customers"), ("orders", "orders"),
+                                 ("revenue", "revenue"), ("units_sold", "units sold")))
+        + "\n"
+    )
+    os.makedirs(os.path.dirname(REPORT_LOG), exist_ok=True)
+    with open(REPORT_LOG, "a") as f:
+        f.write(report)
+    print(report.strip())
+    return report
+
+
+@shared_task
+def cleanup_inactive_customers(days=365, dry_run=False):
+    """
+    Delete customers with no orders in the last year, chunk by chunk
+    (see crm/cleanup.py); resumes from its checkpoint after a failure.
+    Logs to /tmp/customer_cleanup_log.txt
+    """
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    result = delete_inactive_customers(days, dry_run=dry_run)
+    verb = "Would delete" if dry_run else "Deleted"
+    with open(CLEANUP_LOG, "a") as f:
+        f.write(f"[{timestamp}] {verb} {result.customers} inactive customers\n")
+    return result._asdict()
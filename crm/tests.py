@@ -1,3 +1,1490 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from unittest import mock
+from datetime import datetime, timedelta, timezone as dt_timezone
 
-# Create your tests here.
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import User
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.test import (AsyncRequestFactory, Client, LiveServerTestCase,
+                         RequestFactory, SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings, skipUnlessDBFeature)
+from django.test.utils import CaptureQueriesContext
+from graphql_relay import from_global_id
+
+from alx_backend_graphql.schema import schema
+from . import cron, graphql_client, tasks
+from .cron_jobs import send_order_reminders
+from .cleanup import delete_inactive_customers
+from .documents import DocumentStore, query_hash, shared_store
+from .fields import encode_cursor, keyset_ordering, seek
+from .filters import CustomerFilter, OrderFilter, ProductFilter
+from .models import (Checkpoint, CrmStats, Customer, DailyRollup, Order, OrderItem,
+                     Product)
+from .instrumentation import Profile, profiling, sql_shape
+from .inventory import restock_low_stock
+from .jobs import GraphQLJobError, run_operation
+from .orders import place_order
+from .phones import normalize_phone
+from .response_cache import (LocMemBackend, ResponseCache, SharedGenerationsBackend,
+                             shared_cache)
+from .rollups import compare_periods, update_rollups
+from .search import SEARCH_TABLES, TRIGGERS
+from .schema import CUSTOMER_ORDERINGS, ORDER_ORDERINGS, PRODUCT_ORDERINGS
+from .views import AsyncCRMGraphQLView
+
+
+def execute(query, variables=None):
+    request = RequestFactory().post("/graphql/")
+    result = schema.execute(query, variables=variables, context_value=request)
+    assert result.errors is None, result.errors
+    return result.data
+
+
+def seed_orders(count, products_per_order=2):
+    products = [Product.objects.create(name=f"P{i}", price=10, stock=5)
+                for i in range(products_per_order)]
+    for i in range(count):
+        customer = Customer.objects.create(name=f"C{i}", email=f"c{i}@example.com")
+        order = Order.objects.create(customer=customer, total_amount=20)
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=p) for p in products)
+
+
+ORDERS_QUERY = """
+query ($first: Int) {
+  allOrders(first: $first) {
+    edges { node {
+      customer { email orders { edges { node { id } } } }
+      products { edges { node { name } } }
+    } }
+  }
+}
+"""
+
+
+class DataLoaderTests(TestCase):
+    def test_order_relations_use_fixed_query_count(self):
+        seed_orders(12)
+        # count + page joined with customer, then one query per nested connection
+        for first in (1, 5, 12):
+            with self.assertNumQueries(4):
+                data = execute(ORDERS_QUERY, {"first": first})
+            edges = data["allOrders"]["edges"]
+            self.assertEqual(len(edges), first)
+            for edge in edges:
+                node = edge["node"]
+                self.assertEqual(len(node["products"]["edges"]), 2)
+                self.assertEqual(len(node["customer"]["orders"]["edges"]), 1)
+
+    def test_nested_filters_are_batched_per_argument_set(self):
+        seed_orders(3)
+        data = execute("""
+        {
+          allOrders {
+            edges { node {
+              products(name: "P1") { edges { node { name } } }
+            } }
+          }
+        }
+        """)
+        names = {e["node"]["name"]
+                 for edge in data["allOrders"]["edges"]
+                 for e in edge["node"]["products"]["edges"]}
+        self.assertEqual(names, {"P1"})
+
+
+class OptimizerTests(TestCase):
+    def test_only_selected_columns_are_fetched(self):
+        seed_orders(2)
+        with CaptureQueriesContext(connection) as ctx:
+            execute("{ allCustomers { edges { node { email } } } }")
+        page = ctx.captured_queries[-1]["sql"]
+        self.assertIn('"crm_customer"."email"', page)
+        self.assertNotIn('"crm_customer"."phone"', page)
+
+    def test_fragments_and_aliases_prefetch_separately(self):
+        seed_orders(3)
+        query = """
+        fragment OrderBits on OrderType {
+          cheap: products(name: "P0") { edges { node { name } } }
+          customer { email }
+        }
+        {
+          allOrders {
+            edges { node {
+              ...OrderBits
+              other: products(name: "P1") { edges { node { name } } }
+            } }
+          }
+        }
+        """
+        # count, page joined with customer, one prefetch per alias
+        with self.assertNumQueries(4):
+            data = execute(query)
+        for edge in data["allOrders"]["edges"]:
+            node = edge["node"]
+            self.assertEqual([e["node"]["name"] for e in node["cheap"]["edges"]], ["P0"])
+            self.assertEqual([e["node"]["name"] for e in node["other"]["edges"]], ["P1"])
+            self.assertTrue(node["customer"]["email"].endswith("@example.com"))
+
+
+KEYSET_QUERY = """
+query ($first: Int, $after: String, $last: Int, $before: String) {
+  allOrdersKeyset(first: $first, after: $after, last: $last, before: $before) {
+    edges { node { id } }
+    pageInfo { endCursor startCursor hasNextPage hasPreviousPage }
+  }
+}
+"""
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        seed_orders(7, products_per_order=0)
+        # force ties on order_date so the id tiebreaker matters
+        Order.objects.filter(id__lte=4).update(
+            order_date=Order.objects.get(id=1).order_date)
+        self.expected = [
+            o.id for o in Order.objects.order_by("-order_date", "-id")]
+
+    def ids(self, data):
+        return [int(from_global_id(e["node"]["id"]).id)
+                for e in data["allOrdersKeyset"]["edges"]]
+
+    def test_walks_forward_and_backward_without_count(self):
+        seen, after = [], None
+        while True:
+            with CaptureQueriesContext(connection) as ctx:
+                data = execute(KEYSET_QUERY, {"first": 3, "after": after})
+            self.assertFalse(any("COUNT" in q["sql"] for q in ctx.captured_queries))
+            seen += self.ids(data)
+            info = data["allOrdersKeyset"]["pageInfo"]
+            if not info["hasNextPage"]:
+                break
+            after = info["endCursor"]
+        self.assertEqual(seen, self.expected)
+
+        data = execute(KEYSET_QUERY, {"last": 2, "before": after})
+        # `after` is now the end cursor of the second page
+        self.assertEqual(self.ids(data), self.expected[3:5])
+        self.assertTrue(data["allOrdersKeyset"]["pageInfo"]["hasPreviousPage"])
+
+    def test_total_count_only_when_selected(self):
+        data = execute("{ allOrdersKeyset(first: 2) { totalCount } }")
+        self.assertEqual(data["allOrdersKeyset"]["totalCount"], 7)
+
+    def test_rejects_garbage_cursor(self):
+        result = schema.execute(KEYSET_QUERY, variables={"after": "nope"},
+                                context_value=RequestFactory().post("/graphql/"))
+        self.assertIn("Invalid cursor", str(result.errors[0]))
+
+
+BULK_MUTATION = """
+mutation ($input: [CustomerListInput]!, $batchSize: Int) {
+  bulkCreateCustomers(input: $input, batchSize: $batchSize) {
+    customers { email }
+    errors
+  }
+}
+"""
+
+
+class BulkCreateCustomersTests(TestCase):
+    def test_inserts_in_chunks_with_one_duplicate_lookup(self):
+        Customer.objects.create(name="Old", email="taken@example.com")
+        rows = [{"name": f"N{i}", "email": f"n{i}@example.com"} for i in range(45)]
+        rows += [
+            {"name": "Dup", "email": "n0@example.com"},
+            {"name": "Old", "email": "taken@example.com"},
+            {"name": "Bad", "email": "not-an-email"},
+            {"name": "Bad phone", "email": "p@example.com", "phone": "abc"},
+        ]
+        with CaptureQueriesContext(connection) as ctx, \
+                self.captureOnCommitCallbacks(execute=True):
+            data = execute(BULK_MUTATION, {"input": rows, "batchSize": 20})
+        statements = [q["sql"] for q in ctx.captured_queries
+                      if "SAVEPOINT" not in q["sql"]]
+        # one email__in lookup + ceil(45 / 20) INSERTs + one counter bump on commit
+        self.assertEqual(len(statements), 5)
+
+        result = data["bulkCreateCustomers"]
+        self.assertEqual(len(result["customers"]), 45)
+        self.assertIn("n0@example.com already exists.", result["errors"])
+        self.assertIn("taken@example.com already exists.", result["errors"])
+        self.assertEqual(len(result["errors"]), 4)
+        self.assertEqual(Customer.objects.count(), 46)
+
+
+class ImportCommandTests(TestCase):
+    def write(self, suffix, text):
+        handle = tempfile.NamedTemporaryFile("w", suffix=suffix, delete=False)
+        handle.write(text)
+        handle.close()
+        self.addCleanup(os.unlink, handle.name)
+        return handle.name
+
+    def run_import(self, *args):
+        out, err = io.StringIO(), io.StringIO()
+        call_command("import_crm", *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_customers_in_chunks_with_rejections(self):
+        lines = ["name,email,phone"]
+        lines += [f"C{i},c{i}@example.com,+1234567890" for i in range(7)]
+        lines += ["Bad,not-an-email,", "Dup,c1@example.com,"]
+        path = self.write(".csv", "\n".join(lines) + "\n")
+
+        out, err = self.run_import(path, "--model", "customer", "--batch-size", "3")
+        self.assertEqual(Customer.objects.count(), 7)
+        self.assertIn("Imported 7 customer rows, 2 rejected", out)
+        self.assertIn("c1@example.com already exists.", err)
+        self.assertEqual(Checkpoint.objects.get().position, 9)
+
+    def test_resumes_from_checkpoint(self):
+        rows = [{"name": f"P{i}", "price": 1.5 + i, "stock": i} for i in range(5)]
+        path = self.write(".ndjson", "".join(json.dumps(r) + "\n" for r in rows))
+        Checkpoint.objects.create(
+            name=f"import_crm:product:{os.path.abspath(path)}", position=3)
+
+        self.run_import(path, "--model", "product", "--batch-size", "2")
+        self.assertEqual(list(Product.objects.values_list("name", flat=True)),
+                         ["P3", "P4"])
+
+        self.run_import(path, "--model", "product", "--restart")
+        self.assertEqual(Product.objects.count(), 7)
+
+
+PLACE_ORDER = """
+mutation ($input: PlaceOrderInput!) {
+  placeOrder(input: $input) { order { totalAmount } }
+}
+"""
+
+
+CREATE_ORDER = """
+mutation ($input: OrderInput!) {
+  createOrder(input: $input) { order { totalAmount } }
+}
+"""
+
+
+class PlaceOrderTests(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name="A", email="a@example.com")
+        self.pen = Product.objects.create(name="Pen", price="1.50", stock=10)
+        self.ink = Product.objects.create(name="Ink", price="4.00", stock=2)
+
+    def test_reserves_stock_and_prices_quantities(self):
+        data = execute(PLACE_ORDER, {"input": {
+            "customerId": self.customer.pk,
+            "items": [{"productId": self.pen.pk, "quantity": 3},
+                      {"productId": self.ink.pk, "quantity": 2},
+                      {"productId": self.pen.pk}],
+        }})
+        self.assertEqual(data["placeOrder"]["order"]["totalAmount"], "14.00")
+        self.pen.refresh_from_db()
+        self.ink.refresh_from_db()
+        self.assertEqual((self.pen.stock, self.ink.stock), (6, 0))
+        self.assertEqual(sorted(OrderItem.objects.values_list("quantity", flat=True)),
+                         [2, 4])
+
+    def test_oversell_writes_nothing(self):
+        with self.assertRaisesMessage(ValidationError, str(self.ink.pk)):
+            place_order(self.customer.pk, [(self.pen.pk, 1), (self.ink.pk, 3)])
+        self.pen.refresh_from_db()
+        self.assertEqual(self.pen.stock, 10)
+        self.assertFalse(Order.objects.exists())
+
+    def test_create_order_does_not_reserve_stock(self):
+        empty = Product.objects.create(name="Empty", price="3.00")
+        data = execute(CREATE_ORDER, {"input": {
+            "customerId": self.customer.pk, "productIds": [self.pen.pk, empty.pk]}})
+        self.assertEqual(data["createOrder"]["order"]["totalAmount"], "4.50")
+        self.pen.refresh_from_db()
+        self.assertEqual(self.pen.stock, 10)
+        self.assertEqual(OrderItem.objects.count(), 2)
+
+
+class PlaceOrderConcurrencyTests(TransactionTestCase):
+    ATTEMPTS = 50
+
+    def test_parallel_orders_never_oversell(self):
+        customer = Customer.objects.create(name="A", email="a@example.com")
+        hot = Product.objects.create(name="Hot", price="2.00", stock=25)
+        other = Product.objects.create(name="Other", price="1.00", stock=1000)
+        outcomes = []
+
+        def buy(i):
+            # lock the pair in both argument orders to provoke deadlocks
+            items = [(hot.pk, 2), (other.pk, 1)][::1 if i % 2 else -1]
+            try:
+                for attempt in range(self.ATTEMPTS):
+                    try:
+                        place_order(customer.pk, items)
+                        outcomes.append("ok")
+                        return
+                    except OperationalError:
+                        # SQLite's shared-cache test database reports a busy
+                        # writer immediately instead of waiting on it
+                        time.sleep(0.005 * 2 ** min(attempt, 6))
+                    except ValidationError:
+                        outcomes.append("rejected")
+                        return
+                outcomes.append("busy")
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy, args=(i,)) for i in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        hot.refresh_from_db()
+        self.assertEqual(outcomes.count("ok"), 12)
+        self.assertEqual(outcomes.count("rejected"), 8)
+        self.assertEqual(hot.stock, 1)
+        self.assertEqual(Order.objects.count(), 12)
+        self.assertEqual(sum(OrderItem.objects.filter(product=hot)
+                             .values_list("quantity", flat=True)), 24)
+
+    @skipUnlessDBFeature("has_select_for_update")
+    def test_waits_for_row_lock(self):
+        customer = Customer.objects.create(name="A", email="a@example.com")
+        product = Product.objects.create(name="Last", price="2.00", stock=1)
+        locked, release = threading.Event(), threading.Event()
+        outcomes = []
+
+        def hold_lock():
+            try:
+                with transaction.atomic():
+                    Product.objects.select_for_update().get(pk=product.pk)
+                    locked.set()
+                    release.wait(10)
+                    Product.objects.filter(pk=product.pk).update(stock=0)
+            finally:
+                connection.close()
+
+        def buy():
+            try:
+                place_order(customer.pk, [(product.pk, 1)])
+                outcomes.append("ok")
+            except ValidationError:
+                outcomes.append("rejected")
+            finally:
+                connection.close()
+
+        holder = threading.Thread(target=hold_lock)
+        holder.start()
+        self.assertTrue(locked.wait(10))
+        buyer = threading.Thread(target=buy)
+        buyer.start()
+        buyer.join(0.5)
+        self.assertTrue(buyer.is_alive())
+        release.set()
+        holder.join()
+        buyer.join(10)
+        # the buyer read the stock only after the holder committed
+        self.assertEqual(outcomes, ["rejected"])
+        self.assertFalse(Order.objects.exists())
+
+
+class DashboardCounterTests(TestCase):
+    TOTALS = "{ totalCustomers totalOrders totalRevenue }"
+
+    def test_counters_follow_writes_and_read_in_one_query(self):
+        CrmStats.load()
+        with self.captureOnCommitCallbacks(execute=True):
+            seed_orders(3)
+            execute(BULK_MUTATION, {"input": [{"name": "B", "email": "b@example.com"}]})
+            customer = Customer.objects.get(email="b@example.com")
+            product = Product.objects.create(name="X", price="5.00", stock=5)
+            place_order(customer.pk, [(product.pk, 2)])
+            order = Order.objects.get(customer=customer)
+            order.total_amount = 12
+            order.save()
+            Customer.objects.get(email="c0@example.com").delete()
+
+        with self.assertNumQueries(1):
+            data = execute(self.TOTALS)
+        self.assertEqual(data, {"totalCustomers": 3, "totalOrders": 3,
+                                "totalRevenue": 52.0})
+        stats = CrmStats.load()
+        self.assertEqual(CrmStats.exact(), {
+            "customer_count": stats.customer_count,
+            "order_count": stats.order_count,
+            "total_revenue": stats.total_revenue,
+        })
+
+    def test_counters_skip_rolled_back_writes(self):
+        CrmStats.load()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                seed_orders(1)
+                Customer.objects.create(name="Dup", email="c0@example.com")
+        # nothing was queued, so no writer touched the stats row
+        self.assertEqual(callbacks, [])
+        self.assertEqual(execute(self.TOTALS), {"totalCustomers": 0, "totalOrders": 0,
+                                                "totalRevenue": 0.0})
+
+    def test_reconcile_reports_and_fixes_drift(self):
+        CrmStats.load()
+        with self.captureOnCommitCallbacks(execute=True):
+            seed_orders(2)
+        Order.objects.update(total_amount=30)  # bypasses signals
+        out = io.StringIO()
+        call_command("reconcile_stats", "--dry-run", stdout=out)
+        self.assertIn("total_revenue: stored=40.00 exact=60.00 drift=-20.00", out.getvalue())
+        self.assertEqual(CrmStats.load().total_revenue, 40)
+
+        call_command("reconcile_stats", stdout=io.StringIO())
+        self.assertEqual(execute(self.TOTALS)["totalRevenue"], 60.0)
+
+
+class PersistedQueryTests(TestCase):
+    QUERY = "query ApqRoundTrip { totalCustomers }"
+
+    def post(self, body):
+        response = self.client.post("/graphql/", json.dumps(body),
+                                    content_type="application/json")
+        return response.json()
+
+    def persisted(self, sha):
+        return {"persistedQuery": {"version": 1, "sha256Hash": sha}}
+
+    def test_apq_round_trip(self):
+        sha = query_hash(self.QUERY)
+        body = self.post({"extensions": self.persisted(sha)})
+        self.assertEqual(body["errors"][0]["extensions"]["code"],
+                         "PERSISTED_QUERY_NOT_FOUND")
+
+        body = self.post({"query": self.QUERY, "extensions": self.persisted(sha)})
+        self.assertEqual(body["data"], {"totalCustomers": 0})
+        body = self.post({"extensions": self.persisted(sha)})
+        self.assertEqual(body["data"], {"totalCustomers": 0})
+
+        body = self.post({"query": "{ totalOrders }", "extensions": self.persisted(sha)})
+        self.assertEqual(body["errors"][0]["extensions"]["code"],
+                         "PERSISTED_QUERY_HASH_MISMATCH")
+
+    def test_allow_listed_files_are_served_by_hash(self):
+        path = os.path.join(os.path.dirname(__file__), "persisted_queries",
+                            "crm_report.graphql")
+        with open(path) as handle:
+            sha = query_hash(handle.read())
+        body = self.post({"extensions": self.persisted(sha)})
+        self.assertEqual(set(body["data"]),
+                         {"totalCustomers", "totalOrders", "totalRevenue"})
+
+    def test_repeated_text_skips_parse_and_validate(self):
+        store = shared_store(schema.graphql_schema)
+        before = store.stats()
+        for _ in range(3):
+            self.post({"query": "{ totalOrders totalCustomers }"})
+        after = store.stats()
+        self.assertEqual(after["misses"] - before["misses"], 1)
+        self.assertEqual(after["hits"] - before["hits"], 2)
+
+    def test_allow_list_only_rejects_ad_hoc_documents(self):
+        store = DocumentStore(schema.graphql_schema, allow_list_only=True)
+        sha = store.register(self.QUERY)
+        self.assertEqual(store.get(sha=sha)[1], [])
+        document, errors = store.get("{ totalOrders }")
+        self.assertIsNone(document)
+        self.assertEqual(errors[0].extensions["code"], "PERSISTED_QUERY_NOT_ALLOWED")
+
+
+class ResponseCacheTests(TransactionTestCase):
+    PRODUCTS = "{ allProducts { edges { node { name stock } } } }"
+
+    def setUp(self):
+        self.cache = shared_cache(schema.graphql_schema)
+        self.cache.clear()
+        self.addCleanup(self.cache.clear)
+        Product.objects.create(name="Pen", price="1.50", stock=3)
+
+    def query(self, query):
+        response = self.client.post("/graphql/", json.dumps({"query": query}),
+                                    content_type="application/json")
+        body = response.json()
+        self.assertNotIn("errors", body)
+        return body["data"]
+
+    def test_repeated_query_is_served_from_cache(self):
+        first = self.query(self.PRODUCTS)
+        before = self.cache.stats()["hits"]
+        with self.assertNumQueries(0):
+            again = self.query("query {\n  allProducts { edges { node { name stock } } }\n}")
+        self.assertEqual(again, first)
+        self.assertEqual(self.cache.stats()["hits"], before + 1)
+
+    def test_invalidated_only_by_models_it_reads(self):
+        self.query(self.PRODUCTS)
+        Customer.objects.create(name="Ann", email="ann@example.com")
+        with self.assertNumQueries(0):
+            self.query(self.PRODUCTS)
+
+        Product.objects.filter(name="Pen").get().delete()
+        self.assertEqual(self.query(self.PRODUCTS), {"allProducts": {"edges": []}})
+
+    def test_signal_free_writes_invalidate(self):
+        customer = Customer.objects.create(name="Ann", email="ann@example.com")
+        product = Product.objects.get()
+        self.query(self.PRODUCTS)
+        place_order(customer.pk, [(product.pk, 2)])
+        edges = self.query(self.PRODUCTS)["allProducts"]["edges"]
+        self.assertEqual(edges[0]["node"]["stock"], 1)
+
+    def test_mutations_are_not_cached(self):
+        mutation = """mutation { createProduct(input: {name: "Ink", price: 2, stock: 1})
+                     { product { name } } }"""
+        self.query(mutation)
+        self.query(mutation)
+        self.assertEqual(Product.objects.filter(name="Ink").count(), 2)
+
+
+class LocMemBackendTests(TestCase):
+    def test_lru_eviction_and_ttl(self):
+        backend = LocMemBackend(maxsize=2, ttl=60)
+        for key in "abc":
+            backend.set(key, key)
+        self.assertIsNone(backend.get("a"))
+        self.assertEqual((backend.get("c"), backend.evictions), ("c", 1))
+
+        backend.ttl = -1
+        backend.set("d", "d")
+        self.assertIsNone(backend.get("d"))
+        self.assertEqual(backend.expirations, 1)
+
+    def test_other_process_writes_invalidate_shared_generations(self):
+        # two processes: separate LRUs, one cache alias for the counters
+        reader = ResponseCache(schema.graphql_schema, SharedGenerationsBackend())
+        writer = SharedGenerationsBackend()
+        reader.set("k", reader.snapshot(["crm.Product"]), {"cached": True})
+        self.assertEqual(reader.get("k", ["crm.Product"]), {"cached": True})
+        writer.bump(["crm.Product"])
+        self.assertIsNone(reader.get("k", ["crm.Product"]))
+
+
+class QueryCostTests(TestCase):
+    def post(self, query, variables=None):
+        response = self.client.post("/graphql/",
+                                    json.dumps({"query": query, "variables": variables}),
+                                    content_type="application/json")
+        return response.status_code, response.json()
+
+    def test_cost_is_reported_in_extensions(self):
+        status, body = self.post(
+            "{ allOrders(first: 10) { edges { node { customer { name } } } } }")
+        self.assertEqual(status, 200)
+        self.assertEqual(body["extensions"]["cost"],
+                         {"requested": 21, "limit": 5000, "depth": 2, "maxDepth": 6})
+
+    def test_everyday_queries_fit_the_default_budget(self):
+        seed_orders(3)
+        for query, variables in [
+            (ORDERS_QUERY, None),
+            (send_order_reminders.PENDING_ORDERS.query,
+             {"since": "2020-01-01T00:00:00+00:00", "last": 100}),
+            ("{ allOrders { edges { node { customer { name }"
+             " products { edges { node { name } } } } } } }", None),
+            ("{ allCustomers { edges { node { orders { edges { node { id } } } } } } }", None),
+            ("{ allCustomers(first: 40) { edges { node { orders { edges { node {"
+             " products { edges { node { name } } } } } } } } } }", None),
+        ]:
+            status, body = self.post(query, variables)
+            self.assertEqual(status, 200, body)
+            self.assertNotIn("errors", body)
+        # nested connections without first/last count CRM_QUERY_NESTED_PAGE_ESTIMATE rows
+        _, body = self.post("{ allOrders { edges { node { customer { name }"
+                            " products { edges { node { name } } } } } } }")
+        self.assertEqual(body["extensions"]["cost"]["requested"], 1 + 100 * (1 + 1 + 1 + 10))
+
+    def test_fan_out_is_rejected_before_execution(self):
+        query = """{ allCustomers(first: 100) { edges { node {
+            orders(first: 100) { edges { node { products { edges { node { name } } } } } }
+        } } } }"""
+        with self.assertNumQueries(0):
+            status, body = self.post(query)
+        self.assertEqual(status, 400)
+        self.assertEqual(body["errors"][0]["extensions"]["code"], "QUERY_TOO_COMPLEX")
+        self.assertNotIn("data", body)
+
+    def test_page_size_and_depth_limits(self):
+        _, body = self.post("{ allProducts(first: 1000) { edges { node { name } } } }")
+        self.assertEqual(body["errors"][0]["extensions"]["code"], "PAGE_SIZE_EXCEEDED")
+
+        nested = "customer { orders(first: 1) { edges { node { %s } } } }"
+        query = "{ allOrders(first: 1) { edges { node { %s } } } }" % (
+            nested % (nested % (nested % "id")))
+        _, body = self.post(query)
+        self.assertEqual(body["errors"][0]["extensions"]["code"], "QUERY_TOO_DEEP")
+
+
+class QueryPlanTests(TestCase):
+    """EXPLAIN every filter combination on a seeded, ANALYZEd dataset."""
+    NOW = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+
+    # (filterset, data) pairs that must be served from an index
+    INDEXED = [
+        (CustomerFilter, {"created_at__gte": NOW - timedelta(days=2)}),
+        (CustomerFilter, {"created_at__lte": NOW - timedelta(days=1900)}),
+        (CustomerFilter, {"created_at__gte": NOW - timedelta(days=30),
+                          "created_at__lte": NOW - timedelta(days=20)}),
+        (ProductFilter, {"stock__lte": 1}),
+        (ProductFilter, {"stock__gte": 499}),
+        (ProductFilter, {"price__gte": 998}),
+        (ProductFilter, {"price__lte": 2, "stock__gte": 10}),
+        (OrderFilter, {"total_amount__gte": 998}),
+        (OrderFilter, {"total_amount__lte": 1}),
+        (OrderFilter, {"order_date__gte": NOW - timedelta(days=2)}),
+        (OrderFilter, {"order_date__gte": NOW - timedelta(days=9),
+                       "total_amount__gte": 500}),
+        (OrderFilter, {"product_id": 1}),
+        (OrderFilter, {"products__id": 2}),
+        (CustomerFilter, {"phone_pattern": "+1 (555) 01"}),
+        (CustomerFilter, {"search": "customer 12"}),
+        (ProductFilter, {"search": "product"}),
+        (CustomerFilter, {"total_spent__gte": 1000}),
+        (CustomerFilter, {"last_order_date__gte": NOW}),
+    ]
+    # substring searches: only a trigram index (PostgreSQL) can serve them
+    SUBSTRING = [
+        (CustomerFilter, {"name": "ustomer 12"}),
+        (CustomerFilter, {"email": "r12@"}),
+        (ProductFilter, {"name": "roduct 7"}),
+        (OrderFilter, {"customer_name": "ustomer 12"}),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        customers = Customer.objects.bulk_create(
+            Customer(name=f"Customer {i}", email=f"customer{i}@example.com")
+            for i in range(2000))
+        for i, customer in enumerate(customers):
+            customer.created_at = cls.NOW - timedelta(days=i)
+            customer.phone_digits = f"1555{i:07}"
+        Customer.objects.bulk_update(customers, ["created_at", "phone_digits"],
+                                     batch_size=500)
+        products = Product.objects.bulk_create(
+            Product(name=f"Product {i}", price=1 + i % 1000, stock=i % 500)
+            for i in range(2000))
+        orders = Order.objects.bulk_create(
+            Order(customer=customers[i % 2000], total_amount=i % 1000)
+            for i in range(6000))
+        for i, order in enumerate(orders):
+            order.order_date = cls.NOW - timedelta(hours=i)
+        Order.objects.bulk_update(orders, ["order_date"], batch_size=500)
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=products[(i * 7 + j) % 2000])
+            for i, order in enumerate(orders) for j in range(2))
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def full_scans(self, filterset, data):
+        plan = filterset(data, queryset=filterset._meta.model.objects.all()).qs.explain()
+        if connection.vendor == "postgresql":
+            return re.findall(r"Seq Scan on (\w+)", plan)
+        return re.findall(r"\bSCAN (\w+)\s*$", plan, re.MULTILINE)
+
+    def test_filters_use_indexes(self):
+        for filterset, data in self.INDEXED:
+            with self.subTest(filterset=filterset.__name__, **data):
+                self.assertEqual(self.full_scans(filterset, data), [])
+
+    def test_substring_filters_use_trigram_indexes(self):
+        if connection.vendor != "postgresql":
+            self.skipTest("substring LIKE cannot use a B-tree index")
+        for filterset, data in self.SUBSTRING:
+            with self.subTest(filterset=filterset.__name__, **data):
+                self.assertEqual(self.full_scans(filterset, data), [])
+
+    def test_order_by_keysets_walk_their_index(self):
+        for field, orderings in ((Customer, CUSTOMER_ORDERINGS), (Product, PRODUCT_ORDERINGS),
+                                 (Order, ORDER_ORDERINGS)):
+            for name, keyset in orderings.items():
+                for keyset in (keyset, tuple(f"-{key}" for key in keyset)):
+                    ordering = keyset_ordering(field, keyset)
+                    row = field.objects.order_by(*ordering).first()
+                    after = seek(field, keyset, encode_cursor(row, [k.lstrip("-") for k in keyset]),
+                                 forward=True)
+                    queryset = field.objects.filter(after).order_by(*ordering)[:20]
+                    with self.subTest(model=field.__name__, keyset=keyset):
+                        self.assertNotIn("TEMP B-TREE", queryset.explain())
+
+    def test_keyset_orderings_walk_their_index(self):
+        for queryset in (Order.objects.order_by("-order_date", "-id")[:20],
+                         Customer.objects.order_by("-created_at", "-id")[:20]):
+            with self.subTest(model=queryset.model.__name__):
+                self.assertNotIn("TEMP B-TREE", queryset.explain())
+
+
+class AsyncViewTests(TransactionTestCase):
+    def setUp(self):
+        self.threads = {}
+        self.addCleanup(shared_cache(schema.graphql_schema).clear)
+
+        class RecordThread:
+            def resolve(inner, next, root, info, **args):
+                if info.path.prev is None:
+                    self.threads[info.path.key] = threading.current_thread().name
+                return next(root, info, **args)
+
+        self.view = AsyncCRMGraphQLView.as_view(schema=schema,
+                                                middleware=[RecordThread()])
+
+    async def post(self, query):
+        request = AsyncRequestFactory().post(
+            "/graphql/", json.dumps({"query": query}), content_type="application/json")
+        response = await self.view(request)
+        return json.loads(response.content)
+
+    async def test_root_fields_resolve_in_worker_threads(self):
+        await Product.objects.acreate(name="Pen", price="1.50", stock=3)
+        body = await self.post("""{ totalCustomers totalOrders
+            allProducts { edges { node { name } } } }""")
+        self.assertNotIn("errors", body)
+        self.assertEqual(body["data"], {
+            "totalCustomers": 0, "totalOrders": 0,
+            "allProducts": {"edges": [{"node": {"name": "Pen"}}]}})
+        self.assertEqual(set(self.threads), {"totalCustomers", "totalOrders", "allProducts"})
+        self.assertTrue(all(name.startswith("crm-db") for name in self.threads.values()))
+
+    async def test_mutations_run_in_one_worker(self):
+        body = await self.post("""mutation {
+            a: createProduct(input: {name: "Ink", price: 2, stock: 1}) { product { name } }
+            b: createProduct(input: {name: "Nib", price: 1, stock: 1}) { product { name } }
+        }""")
+        self.assertNotIn("errors", body)
+        self.assertEqual(await Product.objects.acount(), 2)
+        self.assertEqual(len(set(self.threads.values())), 1)
+
+    async def test_cache_io_and_connection_recycling_run_in_workers(self):
+        closes, cache_reads = [], []
+        real_get = ResponseCache.get
+
+        def get(cache, key, labels):
+            cache_reads.append(threading.current_thread().name)
+            return real_get(cache, key, labels)
+
+        with mock.patch("crm.concurrency.close_old_connections",
+                        lambda: closes.append(threading.current_thread().name)), \
+                mock.patch.object(ResponseCache, "get", get):
+            body = await self.post("""{ totalCustomers totalOrders
+                allProducts { edges { node { name } } } }""")
+        self.assertNotIn("errors", body)
+        self.assertTrue(cache_reads)
+        self.assertTrue(all(name.startswith("crm-db") for name in cache_reads))
+        # once per worker and request, not once per root field
+        self.assertTrue(closes)
+        self.assertEqual(len(closes), len(set(closes)))
+
+    async def test_staff_profile_header_without_debug(self):
+        staff = await User.objects.acreate(username="ops", is_staff=True)
+        await self.async_client.aforce_login(staff)
+        request = AsyncRequestFactory().post(
+            "/graphql/", json.dumps({"query": "{ totalCustomers }"}),
+            content_type="application/json", headers={"X-CRM-Profile": "1"})
+        request.COOKIES = {name: morsel.value
+                           for name, morsel in self.async_client.cookies.items()}
+        SessionMiddleware(lambda request: None).process_request(request)
+        AuthenticationMiddleware(lambda request: None).process_request(request)
+        with self.settings(DEBUG=False), self.assertLogs("crm.profile", "INFO"):
+            response = await self.view(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("profile", json.loads(response.content)["extensions"])
+
+    async def test_profile_includes_worker_sql(self):
+        with self.settings(DEBUG=True), self.assertLogs("crm.profile", "INFO"):
+            request = AsyncRequestFactory().post(
+                "/graphql/", json.dumps({"query": "{ totalCustomers totalOrders }"}),
+                content_type="application/json", headers={"X-CRM-Profile": "1"})
+            body = json.loads((await self.view(request)).content)
+        profile = body["extensions"]["profile"]
+        # the stats row is read once, in a worker thread
+        self.assertGreaterEqual(profile["sql_count"], 1)
+        self.assertEqual({r["field"] for r in profile["resolvers"]},
+                         {"Query.totalCustomers", "Query.totalOrders"})
+
+
+class BatchedRequestTests(TransactionTestCase):
+    def post(self, body):
+        return self.client.post("/graphql/", json.dumps(body),
+                                content_type="application/json")
+
+    def test_array_runs_every_operation_with_one_context(self):
+        Product.objects.create(name="Pen", price="1.50", stock=3)
+        CrmStats.load()
+        batch = [
+            {"query": "{ totalCustomers }"},
+            {"query": """mutation { createCustomer(input: {name: "Ann", email: "ann@example.com"})
+                         { customer { name } } }"""},
+            {"query": "{ totalCustomers allProducts { edges { node { name } } } }"},
+        ]
+        with self.assertNumQueries(8):
+            response = self.post(batch)
+        results = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r["status"] for r in results], [200, 200, 200])
+        self.assertEqual(results[0]["data"], {"totalCustomers": 0})
+        # the stats row read before the mutation is not reused after it
+        self.assertEqual(results[2]["data"]["totalCustomers"], 1)
+
+    def test_batch_size_is_limited(self):
+        response = self.post([{"query": "{ totalOrders }"}] * 11)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.post([]).status_code, 400)
+
+
+class RestockTests(TestCase):
+    MUTATION = """mutation ($increment: Int, $threshold: Int, $limit: Int) {
+      updateLowStockProducts(increment: $increment, threshold: $threshold, limit: $limit) {
+        updatedCount products { name stock price }
+      }
+    }"""
+
+    def setUp(self):
+        for i, stock in enumerate([0, 4, 9, 10, 50]):
+            Product.objects.create(name=f"P{i}", price="2.50", stock=stock)
+
+    def test_mutation_increments_and_returns_changed_rows(self):
+        with CaptureQueriesContext(connection) as ctx:
+            data = execute(self.MUTATION, {"increment": 5})["updateLowStockProducts"]
+        statements = [q["sql"] for q in ctx.captured_queries
+                      if "SAVEPOINT" not in q["sql"]]
+        # a single UPDATE ... RETURNING, no re-query
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(data["updatedCount"], 3)
+        self.assertEqual([(p["name"], p["stock"], p["price"]) for p in data["products"]],
+                         [("P0", 5, "2.50"), ("P1", 9, "2.50"), ("P2", 14, "2.50")])
+        self.assertEqual(list(Product.objects.order_by("pk").values_list("stock", flat=True)),
+                         [5, 9, 14, 10, 50])
+
+    def test_threshold_limit_and_batches(self):
+        updated = restock_low_stock(threshold=11, increment=1, limit=3, batch_size=2)
+        self.assertEqual([p.name for p in updated], ["P0", "P1", "P2"])
+        # P1 is still below the threshold but is not restocked twice
+        self.assertEqual([p.stock for p in updated], [1, 5, 10])
+
+    def test_locked_fallback_matches(self):
+        with mock.patch("crm.inventory.supports_update_returning", return_value=False):
+            updated = restock_low_stock(increment=3, batch_size=2)
+        self.assertEqual([(p.name, p.stock) for p in updated],
+                         [("P0", 3), ("P1", 7), ("P2", 12)])
+        self.assertEqual(Product.objects.get(name="P2").stock, 12)
+
+    def test_rejects_bad_arguments(self):
+        result = schema.execute(self.MUTATION, variables={"increment": 0},
+                                context_value=RequestFactory().post("/graphql/"))
+        self.assertEqual(result.errors[0].message, "Increment must be positive.")
+
+
+class JobTests(TestCase):
+    def setUp(self):
+        self.log_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.log_dir.cleanup)
+
+    def log_path(self, name):
+        return os.path.join(self.log_dir.name, name)
+
+    def test_low_stock_job_runs_in_process(self):
+        Product.objects.create(name="Low", price=1, stock=2)
+        log_file = self.log_path("low_stock.txt")
+        with mock.patch("crm.cron.LOW_STOCK_LOG", log_file), \
+                mock.patch("crm.graphql_client.execute") as post:
+            cron.updateLowStockProducts()
+        post.assert_not_called()
+        with open(log_file) as f:
+            lines = f.read().splitlines()
+        self.assertTrue(lines[0].endswith("Updated 1 low stock products"))
+        self.assertRegex(lines[1], r"Updated: Low \(ID: \S+\) -> Stock: 12$")
+
+    def test_report_task_runs_in_process(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Customer.objects.create(name="A", email="a@example.com")
+        with mock.patch("crm.tasks.REPORT_LOG", self.log_path("report.txt")), \
+                mock.patch("crm.graphql_client.execute") as post:
+            report = tasks.generate_crm_report()
+        post.assert_not_called()
+        self.assertIn("Report: 1 customers, 0 orders", report)
+
+    def test_errors_are_raised(self):
+        with self.assertRaisesMessage(GraphQLJobError, "Cannot query field 'hello'"):
+            run_operation("{ hello }")
+
+    def test_heartbeat_uses_http_only_for_remote_check(self):
+        with mock.patch("crm.cron.HEARTBEAT_LOG", self.log_path("heartbeat.txt")), \
+                mock.patch("crm.graphql_client.execute",
+                           return_value={"__typename": "Query"}) as post:
+            cron.log_crm_heartbeat()
+            post.assert_not_called()
+            with self.settings(CRM_HEALTHCHECK_URL="http://crm.example.com/graphql/"):
+                cron.log_crm_heartbeat()
+        self.assertEqual(post.call_args.args[:2],
+                         ("http://crm.example.com/graphql/", cron.HEARTBEAT))
+
+
+@override_settings(CRM_API_TOKEN="test-token")
+class GraphQLClientTests(LiveServerTestCase):
+    def setUp(self):
+        self.url = self.live_server_url + "/graphql/api/"
+        self.addCleanup(graphql_client.close_sessions)
+
+    def test_only_the_token_endpoint_skips_csrf(self):
+        client = Client(enforce_csrf_checks=True)
+        body = json.dumps({"query": "{ __typename }"})
+        self.assertEqual(client.post("/graphql/", body, content_type="application/json")
+                         .status_code, 403)
+        self.assertEqual(client.post("/graphql/api/", body, content_type="application/json")
+                         .status_code, 403)
+        response = client.post("/graphql/api/", body, content_type="application/json",
+                               headers={"Authorization": "Bearer test-token"})
+        self.assertEqual(response.json(), {"data": {"__typename": "Query"},
+                                           "extensions": mock.ANY})
+
+    def test_documents_are_parsed_once(self):
+        request = graphql_client.document("query Q { __typename }")
+        self.assertIs(graphql_client.document("query Q { __typename }"), request)
+        with mock.patch("crm.graphql_client.print_ast") as print_ast:
+            payload = graphql_client.PreparedRequest(request, variable_values={"a": 1}).payload
+        print_ast.assert_not_called()
+        self.assertEqual(payload, {"query": "query Q {\n  __typename\n}", "variables": {"a": 1}})
+
+    def test_session_is_reused_over_http(self):
+        session = graphql_client.session(self.url)
+        self.assertEqual(run_operation("{ __typename }", mode="http", url=self.url),
+                         {"__typename": "Query"})
+        self.assertIs(graphql_client.session(self.url), session)
+        with self.assertRaisesMessage(GraphQLJobError, "Cannot query field 'hello'"):
+            run_operation("{ hello }", mode="http", url=self.url)
+
+
+class OrderReminderTests(SimpleTestCase):
+    def setUp(self):
+        from werkzeug.serving import make_server
+
+        import mock_graphql_server as mock
+
+        self.mock = mock
+        orders, mock.mock_orders = mock.mock_orders, mock.synthetic_orders(2000)
+        self.addCleanup(setattr, mock, "mock_orders", orders)
+        self.addCleanup(mock.sent_reminders.clear)
+        server = make_server("127.0.0.1", 0, mock.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.shutdown)
+        base = f"http://127.0.0.1:{server.server_port}"
+        state = tempfile.TemporaryDirectory()
+        self.addCleanup(state.cleanup)
+        self.options = {
+            "endpoint": base + "/graphql", "reminder_endpoint": base + "/reminders",
+            "log_file": os.path.join(state.name, "log.txt"),
+            "state_file": os.path.join(state.name, "state.json"),
+            "page_size": 100, "concurrency": 8, "flush_every": 250,
+        }
+
+    def run_reminders(self):
+        return asyncio.run(send_order_reminders.process_reminders(**self.options))
+
+    def test_pages_all_orders_once_and_resumes_from_cursor(self):
+        recent = [o for o in self.mock.mock_orders
+                  if o["orderDate"] >= (datetime.now(dt_timezone.utc) - timedelta(days=7)).isoformat()]
+        self.assertEqual(self.run_reminders(), len(recent))
+        with open(self.options["log_file"]) as f:
+            logged = [re.search(r"Order ID: (\S+),", line).group(1) for line in f]
+        self.assertEqual(logged, [o["id"] for o in recent])
+        self.assertEqual(sorted(r["orderId"] for r in self.mock.sent_reminders),
+                         sorted(logged))
+
+        self.assertEqual(self.run_reminders(), 0)
+        new = self.mock.synthetic_orders(1, days=0)[0]
+        self.mock.mock_orders.append(dict(new, id="order-new"))
+        self.assertEqual(self.run_reminders(), 1)
+        self.assertEqual(self.mock.sent_reminders[-1]["orderId"], "order-new")
+
+    @override_settings(CRM_API_TOKEN=None)
+    def test_token_endpoint_without_token_fails_fast(self):
+        self.options["endpoint"] += "/api/"
+        with self.assertRaisesMessage(RuntimeError, "CRM_API_TOKEN is not set"):
+            self.run_reminders()
+        self.assertFalse(os.path.exists(self.options["state_file"]))
+        self.assertEqual(self.mock.sent_reminders, [])
+
+
+class CleanupTests(TestCase):
+    def setUp(self):
+        product = Product.objects.create(name="P", price=10, stock=5)
+        long_ago = datetime.now(dt_timezone.utc) - timedelta(days=400)
+        self.customers = {}
+        with self.captureOnCommitCallbacks(execute=True):
+            for name, dates in [("recent", [None]), ("old", [long_ago, long_ago]),
+                                ("never", []), ("both", [long_ago, None])]:
+                customer = Customer.objects.create(name=name, email=f"{name}@example.com")
+                self.customers[name] = customer
+                for date in dates:
+                    order = Order.objects.create(customer=customer, total_amount=5)
+                    OrderItem.objects.create(order=order, product=product)
+                    if date:
+                        Order.objects.filter(pk=order.pk).update(order_date=date)
+
+    def remaining(self):
+        return sorted(Customer.objects.values_list("name", flat=True))
+
+    def test_deletes_customers_without_recent_orders(self):
+        with CaptureQueriesContext(connection) as ctx, \
+                self.captureOnCommitCallbacks(execute=True):
+            result = delete_inactive_customers(chunk_size=2)
+        self.assertEqual(tuple(result), (2, 2, 2))
+        self.assertEqual(self.remaining(), ["both", "recent"])
+        self.assertEqual(Order.objects.count(), 3)
+        stats = CrmStats.load()
+        exact = CrmStats.exact()
+        self.assertEqual((stats.customer_count, stats.order_count, stats.total_revenue),
+                         (exact["customer_count"], exact["order_count"], exact["total_revenue"]))
+        # no per-row collector queries: a fixed number per id range
+        deletes = [q for q in ctx.captured_queries if q["sql"].startswith("DELETE")]
+        self.assertEqual(len(deletes), 3 * 2)
+
+    def test_dry_run_only_counts(self):
+        result = delete_inactive_customers(dry_run=True)
+        self.assertEqual(tuple(result), (2, 2, 2))
+        self.assertEqual(len(self.remaining()), 4)
+
+    def test_resumes_after_checkpoint(self):
+        Checkpoint.objects.create(name="cleanup_inactive_customers",
+                                  position=self.customers["old"].pk)
+        out = io.StringIO()
+        call_command("cleanup_customers", stdout=out, stderr=io.StringIO())
+        self.assertEqual(out.getvalue().strip(), "1")
+        self.assertEqual(self.remaining(), ["both", "old", "recent"])
+        self.assertEqual(Checkpoint.objects.get(name="cleanup_inactive_customers").position, 0)
+
+
+class RollupTests(TestCase):
+    MONDAY = datetime(2026, 10, 5, 12, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        products = [Product.objects.create(name=f"P{i}", price=1, stock=100) for i in range(2)]
+        # last week: 2 orders on Monday; the week before: 1 order on Wednesday
+        for offset, amount, quantities in [(0, 10, (1, 2)), (0, 20, (3, 0)), (-5, 40, (1, 1))]:
+            customer = Customer.objects.create(name=f"C{offset}{amount}",
+                                               email=f"c{amount}@example.com")
+            order = Order.objects.create(customer=customer, total_amount=amount)
+            OrderItem.objects.bulk_create(
+                OrderItem(order=order, product=p, quantity=q)
+                for p, q in zip(products, quantities) if q)
+            moment = self.MONDAY + timedelta(days=offset)
+            Order.objects.filter(pk=order.pk).update(order_date=moment)
+            Customer.objects.filter(pk=customer.pk).update(created_at=moment)
+        self.products = products
+
+    def test_incremental_update_and_period_comparison(self):
+        sunday = self.MONDAY.date() + timedelta(days=6)
+        days = update_rollups(through=sunday)
+        self.assertEqual(days[0], self.MONDAY.date() - timedelta(days=5))
+        self.assertEqual(days[-1], sunday)
+        monday = DailyRollup.objects.get(day=self.MONDAY.date())
+        self.assertEqual((monday.customers_created, monday.orders, monday.revenue, monday.units_sold),
+                         (2, 2, 30, 6))
+        self.assertEqual(dict(monday.products.values_list("product__name", "units_sold")),
+                         {"P0": 4, "P1": 2})
+        # nothing new to roll up
+        self.assertEqual(update_rollups(through=sunday), [])
+
+        current, previous = compare_periods("week", today=sunday + timedelta(days=1))
+        self.assertEqual((current.start, current.end), (self.MONDAY.date(), sunday))
+        self.assertEqual((current.orders, current.revenue, current.units_sold), (2, 30, 6))
+        self.assertEqual((previous.orders, previous.revenue, previous.units_sold), (1, 40, 2))
+
+    def test_daily_rollups_query(self):
+        update_rollups(through=self.MONDAY.date())
+        query = """query ($start: Date!, $end: Date!) {
+          dailyRollups(start: $start, end: $end) {
+            day orders revenue unitsSold products { product { name } unitsSold }
+          }
+        }"""
+        variables = {"start": "2026-09-30", "end": "2026-10-05"}
+        with CaptureQueriesContext(connection) as ctx:
+            rollups = execute(query, variables)["dailyRollups"]
+        # rollups, then their products joined with product
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertEqual([r["day"] for r in rollups][0], "2026-09-30")
+        self.assertEqual(rollups[-1]["products"],
+                         [{"product": {"name": "P0"}, "unitsSold": 4},
+                          {"product": {"name": "P1"}, "unitsSold": 2}])
+
+        result = schema.execute(query, variables={"start": "2026-10-05", "end": "2026-01-01"},
+                                context_value=RequestFactory().post("/graphql/"))
+        self.assertEqual(result.errors[0].message, "End must not be before start.")
+
+
+class InstrumentationTests(TestCase):
+    QUERY = "query Dashboard { totalCustomers allProducts(first: 5) { edges { node { name } } } }"
+
+    def post(self, **headers):
+        response = self.client.post("/graphql/", json.dumps({"query": self.QUERY}),
+                                    content_type="application/json", **headers)
+        return response.json()
+
+    def test_debug_header_returns_profile(self):
+        Product.objects.create(name="P", price=1, stock=1)
+        with self.settings(DEBUG=True, CRM_PROFILE_SAMPLE_RATE=0), \
+                self.assertLogs("crm.profile", "INFO") as logs:
+            body = self.post(HTTP_X_CRM_PROFILE="1")
+        profile = body["extensions"]["profile"]
+        self.assertEqual(profile["operation"], "Dashboard")
+        self.assertEqual(json.loads(logs.records[0].getMessage()), profile)
+        self.assertGreater(profile["sql_count"], 0)
+        fields = {r["field"] for r in profile["resolvers"]}
+        self.assertTrue({"Query.totalCustomers", "Query.allProducts"} <= fields, fields)
+        self.assertEqual(profile["n_plus_one"], [])
+
+    def test_sampling(self):
+        with self.settings(CRM_PROFILE_SAMPLE_RATE=0):
+            with mock.patch("crm.instrumentation.logger") as logger:
+                body = self.post(HTTP_X_CRM_PROFILE="1")  # not staff, not DEBUG
+        logger.info.assert_not_called()
+        self.assertNotIn("profile", body["extensions"])
+        with self.settings(CRM_PROFILE_SAMPLE_RATE=1), \
+                self.assertLogs("crm.profile", "INFO"):
+            body = self.post()
+        self.assertNotIn("profile", body["extensions"])
+
+    def test_repeated_sql_shape_is_flagged(self):
+        customers = [Customer.objects.create(name=f"C{i}", email=f"c{i}@example.com")
+                     for i in range(8)]
+        profile = Profile("Loop")
+        with profiling(profile):
+            for customer in customers:
+                Customer.objects.get(pk=customer.pk)
+            list(Customer.objects.filter(pk__in=[1, 2]))
+            list(Customer.objects.filter(pk__in=[1, 2, 3]))
+        profile.finish()
+        flagged = profile.as_dict()["n_plus_one"]
+        self.assertEqual([(f["count"], f["fields"]) for f in flagged], [(8, ["(operation)"])])
+        self.assertEqual(sql_shape('WHERE "id" IN (%s, %s, %s)'), 'WHERE "id" IN (...)')
+
+
+SEARCH_QUERY = """
+query ($q: String!, $first: Int, $after: String, $offset: Int) {
+  searchCustomers(query: $q, first: $first, after: $after, offset: $offset) {
+    edges { cursor node { name email } }
+    pageInfo { hasNextPage }
+  }
+}
+"""
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        for name, email in [("Alice Smith", "alice@example.com"),
+                            ("Bob Alison", "bob@alpha.io"),
+                            ("Carol Jones", "carol@example.com"),
+                            ("Émile Zola", "emile@example.com")]:
+            Customer.objects.create(name=name, email=email)
+
+    def names(self, query, **variables):
+        data = execute(SEARCH_QUERY, {"q": query, **variables})["searchCustomers"]
+        return [e["node"]["name"] for e in data["edges"]], data
+
+    def test_prefix_match_ranks_names_above_emails(self):
+        names, _ = self.names("ali")
+        self.assertEqual(names, ["Alice Smith", "Bob Alison"])
+        # every word must match; names outweigh the email domain
+        self.assertEqual(self.names("exa car")[0], ["Carol Jones"])
+        self.assertEqual(self.names("emile")[0], ["Émile Zola"])
+        self.assertEqual(self.names("  '\"*  ")[0], [])
+
+    def test_index_follows_writes(self):
+        carol = Customer.objects.get(email="carol@example.com")
+        carol.name = "Caroline Alden"
+        carol.save()
+        Customer.objects.filter(email="bob@alpha.io").delete()
+        Customer.objects.bulk_create([Customer(name="Alan Turing", email="alan@example.com")])
+        self.assertEqual(set(self.names("al")[0]),
+                         {"Alice Smith", "Caroline Alden", "Alan Turing"})
+        self.assertEqual(self.names("carol")[0], ["Caroline Alden"])
+
+    def test_pages_and_filters(self):
+        names, data = self.names("example", first=2)
+        self.assertTrue(data["pageInfo"]["hasNextPage"])
+        rest, data = self.names("example", first=2, after=data["edges"][-1]["cursor"])
+        self.assertEqual(len(set(names + rest)), 3)
+        self.assertFalse(data["pageInfo"]["hasNextPage"])
+
+        # the filter picks the candidates before the window is ranked
+        data = execute('{ searchCustomers(query: "example", first: 1, name: "zola") '
+                       '{ edges { node { name } } } }')
+        self.assertEqual(data["searchCustomers"]["edges"], [{"node": {"name": "Émile Zola"}}])
+
+        data = execute('{ allCustomers(search: "jon") { edges { node { name } } } }')
+        self.assertEqual(data["allCustomers"]["edges"], [{"node": {"name": "Carol Jones"}}])
+        Product.objects.create(name="Fountain Pen", price=5, stock=1)
+        data = execute('{ searchProducts(query: "foun") { edges { node { name } } } }')
+        self.assertEqual(data["searchProducts"]["edges"], [{"node": {"name": "Fountain Pen"}}])
+
+    def test_offset_pages(self):
+        Customer.objects.bulk_create(Customer(name=f"Zed {i:02}", email=f"zed{i}@example.com")
+                                     for i in range(20))
+        everything = execute('{ allCustomers(name: "Zed", first: 20) '
+                             '{ edges { node { name } } } }')["allCustomers"]["edges"]
+        self.assertEqual(len(everything), 20)
+        ranked, _ = self.names("zed", first=20)
+        page, data = self.names("zed", first=5, offset=10)
+        self.assertEqual(page, ranked[10:15])
+        self.assertTrue(data["pageInfo"]["hasNextPage"])
+        # offset counts on from the cursor, as on allCustomers
+        _, data = self.names("zed", first=2)
+        page, _ = self.names("zed", first=5, offset=3, after=data["edges"][-1]["cursor"])
+        self.assertEqual(page, ranked[5:10])
+
+    def test_triggers_survive_migrations(self):
+        # the test database is built by migrate, so a migration that rebuilt
+        # a searched table without restore_triggers() shows up here
+        if connection.vendor != "sqlite":
+            self.skipTest("the index triggers are SQLite only")
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+            triggers = {row[0] for row in cursor.fetchall()}
+        for table, _ in SEARCH_TABLES:
+            for trigger in TRIGGERS:
+                self.assertIn(f"{table}_fts_{trigger}", triggers)
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO crm_customer_fts(crm_customer_fts) VALUES ('delete-all')")
+        self.assertEqual(self.names("alice")[0], [])
+        out = io.StringIO()
+        call_command("rebuild_search_index", stdout=out)
+        self.assertIn("crm.Customer: 4 rows indexed", out.getvalue())
+        self.assertEqual(self.names("alice")[0], ["Alice Smith"])
+
+
+class PhoneFilterTests(TestCase):
+    def test_normalization(self):
+        for phone, digits in [("+1 (234) 567-8901", "12345678901"),
+                              ("+1-234-567-8901", "12345678901"),
+                              ("123-456-7890", "11234567890"),
+                              ("+44 20 7946 0958", "442079460958"),
+                              ("", "")]:
+            self.assertEqual(normalize_phone(phone), digits)
+
+    def test_pattern_matches_normalized_prefix(self):
+        for name, phone in [("us", "+1 (234) 567-8901"), ("national", "234-555-0000"),
+                            ("uk", "+44 20 7946 0958"), ("none", "")]:
+            Customer.objects.create(name=name, email=f"{name}@example.com", phone=phone)
+        Customer.objects.filter(name="uk").update(phone="+1 999-555-0000")
+        Customer.objects.get(name="uk").save(update_fields=["phone"])
+
+        def names(pattern):
+            data = execute("query ($p: String) { allCustomers(phonePattern: $p) "
+                           "{ edges { node { name } } } }", {"p": pattern})
+            return sorted(e["node"]["name"] for e in data["allCustomers"]["edges"])
+
+        self.assertEqual(names("+1"), ["national", "uk", "us"])
+        self.assertEqual(names("+1 (234)"), ["national", "us"])
+        self.assertEqual(names("234-55"), ["national"])
+        self.assertEqual(names("+1999"), ["uk"])
+        self.assertEqual(names("+44"), [])
+        self.assertEqual(names("+"), [])
+        self.assertEqual(names("-"), [])
+
+
+class CustomerAggregateTests(TestCase):
+    QUERY = """query ($min: Decimal) {
+      allCustomers(totalSpent_Gte: $min, orderBy: "-totalSpent") {
+        edges { node { name orderCount totalSpent lastOrderDate } }
+      }
+    }"""
+
+    def setUp(self):
+        self.pen = Product.objects.create(name="Pen", price=10, stock=100)
+        self.ann = Customer.objects.create(name="Ann", email="ann@example.com")
+        self.bob = Customer.objects.create(name="Bob", email="bob@example.com")
+
+    def aggregates(self, customer):
+        customer.refresh_from_db()
+        return customer.order_count, customer.total_spent, customer.last_order_date
+
+    def test_kept_in_step_with_orders(self):
+        first = place_order(self.ann.pk, [(self.pen.pk, 2)])
+        second = place_order(self.ann.pk, [(self.pen.pk, 1)])
+        self.assertEqual(self.aggregates(self.ann), (2, 30, second.order_date))
+
+        second.total_amount = 15
+        second.save()
+        self.assertEqual(self.aggregates(self.ann)[:2], (2, 35))
+        second.customer = self.bob
+        second.save()
+        self.assertEqual(self.aggregates(self.ann), (1, 20, first.order_date))
+        self.assertEqual(self.aggregates(self.bob), (1, 15, second.order_date))
+        first.delete()
+        self.assertEqual(self.aggregates(self.ann), (0, 0, None))
+
+    def test_filter_and_order_by_total_spent(self):
+        place_order(self.ann.pk, [(self.pen.pk, 1)])
+        place_order(self.bob.pk, [(self.pen.pk, 3)])
+        Customer.objects.create(name="Cy", email="cy@example.com")
+        edges = execute(self.QUERY, {"min": "5"})["allCustomers"]["edges"]
+        self.assertEqual([(e["node"]["name"], e["node"]["orderCount"], e["node"]["totalSpent"])
+                          for e in edges], [("Bob", 1, "30.00"), ("Ann", 1, "10.00")])
+
+    def test_order_by_last_order_date_pages_past_nulls(self):
+        place_order(self.bob.pk, [(self.pen.pk, 1)])
+        place_order(self.ann.pk, [(self.pen.pk, 1)])
+        Customer.objects.create(name="Cy", email="cy@example.com")
+        Customer.objects.create(name="Di", email="di@example.com")
+        query = """query ($order: String, $after: String) {
+          allCustomers(orderBy: $order, first: 1, after: $after) {
+            edges { node { name } } pageInfo { hasNextPage endCursor }
+          }
+        }"""
+        for order, expected in (("lastOrderDate", ["Cy", "Di", "Bob", "Ann"]),
+                                ("-lastOrderDate", ["Ann", "Bob", "Di", "Cy"])):
+            seen, after = [], None
+            while True:
+                data = execute(query, {"order": order, "after": after})["allCustomers"]
+                seen += [e["node"]["name"] for e in data["edges"]]
+                if not data["pageInfo"]["hasNextPage"]:
+                    break
+                after = data["pageInfo"]["endCursor"]
+            self.assertEqual(seen, expected)
+            data = execute("""query ($order: String, $before: String) {
+              allCustomers(orderBy: $order, last: 2, before: $before) { edges { node { name } } }
+            }""", {"order": order, "before": after})["allCustomers"]
+            self.assertEqual([e["node"]["name"] for e in data["edges"]], expected[:2])
+
+    def test_backfill_fixes_drift(self):
+        order = place_order(self.ann.pk, [(self.pen.pk, 4)])
+        Customer.objects.update(order_count=7, total_spent=0, last_order_date=None)
+        out = io.StringIO()
+        with CaptureQueriesContext(connection) as ctx:
+            call_command("backfill_customer_aggregates", stdout=out)
+        # one grouped read, then one batched UPDATE
+        verbs = [q["sql"].split()[0] for q in ctx.captured_queries]
+        self.assertEqual([v for v in verbs if v in ("SELECT", "UPDATE")], ["SELECT", "UPDATE"])
+        self.assertIn("2 customers updated", out.getvalue())
+        self.assertEqual(self.aggregates(self.ann), (1, 40, order.order_date))
+        self.assertEqual(self.aggregates(self.bob), (0, 0, None))
+        call_command("backfill_customer_aggregates", stdout=out)
+        self.assertIn("0 customers updated", out.getvalue())
+
+
+ORDERED_PRODUCTS = """
+query ($orderBy: String, $first: Int, $after: String, $last: Int, $before: String) {
+  allProducts(orderBy: $orderBy, first: $first, after: $after, last: $last, before: $before) {
+    edges { cursor node { name price } }
+    pageInfo { hasNextPage hasPreviousPage endCursor startCursor }
+  }
+}
+"""
+
+
+class OrderByTests(TestCase):
+    def setUp(self):
+        # prices tie in pairs, so the id tiebreaker decides within a price
+        Product.objects.bulk_create(
+            Product(name=f"P{i}", price=1 + i // 2, stock=i) for i in range(9))
+
+    def page(self, **variables):
+        return execute(ORDERED_PRODUCTS, variables)["allProducts"]
+
+    def test_pages_in_key_order_without_count(self):
+        expected = [p.name for p in Product.objects.order_by("-price", "-id")]
+        seen, after = [], None
+        while True:
+            with CaptureQueriesContext(connection) as ctx:
+                data = self.page(orderBy="-price", first=4, after=after)
+            self.assertFalse(any("COUNT" in q["sql"] for q in ctx.captured_queries))
+            seen += [e["node"]["name"] for e in data["edges"]]
+            if not data["pageInfo"]["hasNextPage"]:
+                break
+            after = data["pageInfo"]["endCursor"]
+        self.assertEqual(seen, expected)
+
+        # `after` is now the end cursor of the second page
+        data = self.page(orderBy="-price", last=3, before=after)
+        self.assertEqual([e["node"]["name"] for e in data["edges"]], expected[4:7])
+        self.assertTrue(data["pageInfo"]["hasPreviousPage"])
+
+    def test_unindexed_key_and_offset_are_rejected(self):
+        for variables, message in [({"orderBy": "stok"}, "only index-backed keys"),
+                                   ({"orderBy": "-id"}, "Cannot order `allProducts` by `-id`")]:
+            result = schema.execute(ORDERED_PRODUCTS, variables=variables,
+                                    context_value=RequestFactory().post("/graphql/"))
+            self.assertIn(message, str(result.errors[0]))
+        result = schema.execute('{ allProducts(orderBy: "name", offset: 2) { edges { node { id } } } }',
+                                context_value=RequestFactory().post("/graphql/"))
+        self.assertIn("`offset` cannot be combined", str(result.errors[0]))
+
+    def test_offset_pagination_unchanged_without_order_by(self):
+        data = self.page(first=2)
+        self.assertEqual([e["node"]["name"] for e in data["edges"]], ["P0", "P1"])
+        self.assertTrue(data["edges"][0]["cursor"])
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        pen = Product.objects.create(name="Pen", price="1.50", stock=100)
+        ink = Product.objects.create(name="Ink, blue", price=3, stock=100)
+        ann = Customer.objects.create(name="Ann", email="ann@example.com")
+        self.first = place_order(ann.pk, [(pen.pk, 2), (ink.pk, 1)])
+        self.second = Order.objects.create(customer=ann, total_amount=0)
+        Order.objects.filter(pk=self.first.pk).update(
+            order_date=datetime(2026, 1, 1, tzinfo=dt_timezone.utc))
+
+    def get(self, query=""):
+        with self.settings(DEBUG=True):
+            return self.client.get(f"/export/orders/{query}")
+
+    def test_ndjson_one_order_per_line_without_a_sort(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.get()
+            body = b"".join(response.streaming_content)
+        # the orders, then the items of the (only) chunk
+        self.assertEqual(len(ctx.captured_queries), 2)
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + ctx.captured_queries[0]["sql"])
+            self.assertNotIn("TEMP B-TREE", str(cursor.fetchall()))
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        orders = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([o["order_id"] for o in orders], [self.first.pk, self.second.pk])
+        self.assertEqual(orders[0]["total_amount"], "6.00")
+        self.assertEqual([(i["product_name"], i["quantity"], i["unit_price"])
+                          for i in orders[0]["items"]],
+                         [("Pen", 2, "1.50"), ("Ink, blue", 1, "3.00")])
+        self.assertEqual(orders[1]["items"], [])
+
+    def test_csv_gzip_and_since(self):
+        response = self.get("?format=csv&gzip=1&until=2026-06-01")
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="orders.csv.gz"')
+        rows = list(csv.reader(io.StringIO(
+            gzip.decompress(b"".join(response.streaming_content)).decode())))
+        self.assertEqual(rows[0][:2], ["order_id", "order_date"])
+        self.assertEqual([r[6] for r in rows[1:]], ["Pen", "Ink, blue"])
+
+        body = b"".join(self.get("?since=2026-06-01T00:00:00Z").streaming_content)
+        self.assertEqual([json.loads(l)["order_id"] for l in body.splitlines()],
+                         [self.second.pk])
+
+    def test_rejects_bad_parameters_and_anonymous(self):
+        for query in ("?since=yesterday", "?format=xml"):
+            self.assertEqual(self.get(query).status_code, 400)
+        self.assertEqual(self.client.get("/export/orders/").status_code, 403)
+
+    async def test_streams_under_asgi(self):
+        with self.settings(DEBUG=True):
+            response = await self.async_client.get("/export/orders/")
+            body = b"".join([block async for block in response.streaming_content])
+        self.assertEqual(len(body.splitlines()), 2)
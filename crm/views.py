@@ -1,3 +1,439 @@
-from django.shortcuts import render
+import inspect
+import json
+from functools import wraps
 
-# Create your views here.
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection, transaction
+from django.http import (HttpResponse, HttpResponseBadRequest, HttpResponseForbidden,
+                         HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse)
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
+from django.views.decorators.http import require_GET
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.utils.utils import set_rollback
+from graphene_django.views import GraphQLView, HttpError
+from graphql import ExecutionResult, OperationType, execute, get_operation_ast
+
+from .concurrency import ThreadedExecutionContext, request_scope, run_sync
+from .cost import analyze, cost_limits
+from .documents import shared_store
+from .export import FORMATS, parse_bound, stream_orders
+from .instrumentation import (ResolverTimer, current_profile, debug_user,
+                              finish_profile, profiling, start_profile)
+from .loaders import reset_registry
+from .response_cache import shared_cache
+
+
+class PreparedOperation:
+    """A validated, costed operation ready to execute."""
+
+    def __init__(self, document, operation_ast, extensions, options):
+        self.document = document
+        self.operation_ast = operation_ast
+        self.extensions = extensions
+        self.options = options
+        self.cache_key = self.generations = None
+
+    @property
+    def is_mutation(self):
+        return (self.operation_ast is not None
+                and self.operation_ast.operation == OperationType.MUTATION)
+
+
+class CRMGraphQLView(GraphQLView):
+    """
+    GraphQLView serving documents from a DocumentStore.
+
+    Accepts Apollo-style persisted queries (``extensions.persistedQuery``)
+    and reuses the parsed, validated DocumentNode of any query text it has
+    seen before instead of re-running parse() and validate(). Query results
+    are served from the ResponseCache until a model they read changes.
+    Every operation is costed first (see ``crm.cost``); the estimate is
+    returned under ``extensions.cost`` and operations over budget are
+    rejected without running. A JSON array body is executed as a batch of
+    up to ``CRM_GRAPHQL_MAX_BATCH`` operations. Sampled operations are
+    profiled (see ``crm.instrumentation``).
+    """
+    documents = None
+    response_cache = None
+
+    def __init__(self, *args, documents=None, response_cache=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # as_view() builds a view per request, so the store must be shared
+        self.documents = documents or self.documents or shared_store(
+            self.schema.graphql_schema, self.validation_rules)
+        self.response_cache = (response_cache or self.response_cache
+                               or shared_cache(self.schema.graphql_schema))
+
+    def parse_body(self, request):
+        """
+        Accept a JSON array of operations as a batch, on the same endpoint.
+
+        Every operation runs with the same context (the request), so they
+        share one DataLoader scope, which is reset after each mutation.
+        """
+        if self.get_content_type(request) == "application/json":
+            try:
+                body = json.loads(request.body.decode("utf-8"))
+            except (UnicodeDecodeError, ValueError):
+                body = None
+            if isinstance(body, list):
+                max_batch = getattr(settings, "CRM_GRAPHQL_MAX_BATCH", 10)
+                if not body or len(body) > max_batch:
+                    raise HttpError(HttpResponseBadRequest(
+                        f"A batch must hold between 1 and {max_batch} operations."))
+                if not all(isinstance(entry, dict) for entry in body):
+                    raise HttpError(HttpResponseBadRequest(
+                        "Every batch entry must be a JSON object."))
+                self.batch = True
+                return body
+            if isinstance(body, dict):
+                return body
+        return super().parse_body(request)
+
+    @staticmethod
+    def get_persisted_hash(request, data):
+        extensions = request.GET.get("extensions") or data.get("extensions")
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        persisted = (extensions or {}).get("persistedQuery") or {}
+        return persisted.get("sha256Hash")
+
+    def get_document(self, request, data, query):
+        return self.documents.get(query or None, self.get_persisted_hash(request, data))
+
+    def get_response(self, request, data, show_graphiql=False):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+        execution_result = self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        return self.format_response(request, execution_result, id, show_graphiql)
+
+    def format_response(self, request, execution_result, id=None, show_graphiql=False):
+        # upstream get_response drops ExecutionResult.extensions; same otherwise
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+
+        status_code = 200
+        if not execution_result:
+            return None, status_code
+
+        response = {}
+        if execution_result.errors:
+            set_rollback()
+            response["errors"] = [self.format_error(e) for e in execution_result.errors]
+
+        if execution_result.errors and any(
+            not getattr(e, "path", None) for e in execution_result.errors
+        ):
+            status_code = 400
+        else:
+            response["data"] = execution_result.data
+
+        if execution_result.extensions:
+            response["extensions"] = execution_result.extensions
+
+        if self.batch:
+            response["id"] = id
+            response["status"] = status_code
+
+        return self.json_encode(request, response, pretty=show_graphiql), status_code
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        profile = start_profile(request, operation_name)
+        with profiling(profile):
+            result = self.execute_operation(
+                request, data, query, variables, operation_name, show_graphiql)
+        return finish_profile(profile, result)
+
+    def execute_operation(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        if not query and not self.get_persisted_hash(request, data):
+            return super().execute_graphql_request(
+                request, data, query, variables, operation_name, show_graphiql)
+
+        prepared = self.prepare_operation(
+            request, data, query, variables, operation_name, show_graphiql)
+        if isinstance(prepared, PreparedOperation):
+            prepared = self.read_cache(prepared)
+        if not isinstance(prepared, PreparedOperation):
+            return prepared
+        try:
+            result = self.execute_prepared(request, prepared)
+        except Exception as e:
+            return ExecutionResult(errors=[e], extensions=prepared.extensions)
+        self.store_result(prepared, result)
+        return self.finish_operation(prepared, result)
+
+    def prepare_operation(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        """
+        Everything up to execution but the response cache: document lookup,
+        method and cost checks. Returns a PreparedOperation, or the
+        ExecutionResult (or None) to answer with instead.
+        """
+        document, errors = self.get_document(request, data, query)
+        if errors:
+            return ExecutionResult(data=None, errors=errors)
+
+        operation_ast = get_operation_ast(document, operation_name)
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseNotAllowed(
+                ["POST"],
+                f"Can only perform a {operation_ast.operation.value} operation "
+                "from a POST request.",
+            ))
+
+        max_cost, max_depth, _ = cost_limits()
+        cost = analyze(self.schema.graphql_schema, document, operation_name, variables)
+        extensions = {"cost": cost.as_extension(max_cost, max_depth)}
+        if cost.errors:
+            return ExecutionResult(data=None, errors=cost.errors, extensions=extensions)
+
+        prepared = PreparedOperation(document, operation_ast, extensions, {
+            "root_value": self.get_root_value(request),
+            "context_value": self.get_context(request),
+            "variable_values": variables,
+            "operation_name": operation_name,
+            "middleware": self.get_middleware(request),
+        })
+        profile = current_profile()
+        if profile is not None:
+            prepared.options["middleware"] = [
+                *(prepared.options["middleware"] or []), ResolverTimer()]
+            if operation_ast is not None and operation_ast.name:
+                profile.operation_name = operation_ast.name.value
+        if self.execution_context_class:
+            prepared.options["execution_context_class"] = self.execution_context_class
+        return prepared
+
+    def read_cache(self, prepared):
+        """
+        The cached ExecutionResult of a query, else ``prepared`` with the key
+        and generations to store its result under. May do cache I/O.
+        """
+        cache = self.response_cache
+        options = prepared.options
+        plan = cache.plan(prepared.document, options["operation_name"],
+                          options["variable_values"]) if cache else None
+        if plan:
+            key, labels = plan
+            cached = cache.get(key, labels)
+            if cached is not None:
+                return ExecutionResult(data=cached, extensions=prepared.extensions)
+            prepared.cache_key = key
+            prepared.generations = cache.snapshot(labels)
+        return prepared
+
+    def execute_prepared(self, request, prepared):
+        schema = self.schema.graphql_schema
+        if prepared.is_mutation and (
+            graphene_settings.ATOMIC_MUTATIONS is True
+            or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+        ):
+            with transaction.atomic():
+                result = execute(schema, prepared.document, **prepared.options)
+                if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                    transaction.set_rollback(True)
+            return result
+        return execute(schema, prepared.document, **prepared.options)
+
+    def store_result(self, prepared, result):
+        """Cache a query's result; may do cache I/O."""
+        # inside a transaction the rows read may still be rolled back
+        if (prepared.cache_key and not result.errors
+                and not connection.in_atomic_block):
+            self.response_cache.set(prepared.cache_key, prepared.generations,
+                                    result.data)
+
+    def finish_operation(self, prepared, result):
+        result.extensions = prepared.extensions
+        if prepared.is_mutation:
+            # later operations of a batch must not see pre-mutation rows
+            reset_registry(prepared.options["context_value"])
+        return result
+
+
+class AsyncCRMGraphQLView(CRMGraphQLView):
+    """
+    CRMGraphQLView for ASGI deployments that set CRM_ASYNC_GRAPHQL=1.
+
+    Query root fields each run in a worker thread of ``crm.concurrency`` and
+    are awaited together, so independent fields such as ``totalCustomers``
+    and ``totalOrders`` hit the database concurrently while the event loop
+    stays free. Mutations run serially in a single worker thread, which
+    keeps ATOMIC_MUTATIONS transactions on one connection.
+    """
+    view_is_async = True
+
+    @method_decorator(ensure_csrf_cookie)
+    async def dispatch(self, request, *args, **kwargs):
+        with request_scope():
+            return await self.dispatch_in_scope(request, *args, **kwargs)
+
+    async def dispatch_in_scope(self, request, *args, **kwargs):
+        try:
+            if request.method.lower() not in ("get", "post"):
+                raise HttpError(HttpResponseNotAllowed(
+                    ["GET", "POST"], "GraphQL only supports GET and POST requests."))
+
+            data = self.parse_body(request)
+            if self.graphiql and self.can_display_graphiql(request, data):
+                # renders the GraphiQL page without executing anything
+                return await run_sync(super().dispatch, request, *args, **kwargs)
+
+            if self.batch:
+                responses = [await self.get_response_async(request, entry)
+                             for entry in data]
+                result = "[{}]".format(",".join(response[0] for response in responses))
+                status_code = max((r[1] for r in responses), default=200)
+            else:
+                result, status_code = await self.get_response_async(request, data)
+            return HttpResponse(status=status_code, content=result,
+                                content_type="application/json")
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = self.json_encode(
+                request, {"errors": [self.format_error(e)]})
+            return response
+
+    async def get_response_async(self, request, data):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+        execution_result = await self.execute_graphql_request_async(
+            request, data, query, variables, operation_name)
+        return self.format_response(request, execution_result, id)
+
+    async def execute_graphql_request_async(
+        self, request, data, query, variables, operation_name
+    ):
+        profile = start_profile(request, operation_name, await debug_user(request))
+        with profiling(profile):
+            result = await self.execute_operation_async(
+                request, data, query, variables, operation_name)
+        return finish_profile(profile, result)
+
+    async def execute_operation_async(
+        self, request, data, query, variables, operation_name
+    ):
+        if not query and not self.get_persisted_hash(request, data):
+            return await run_sync(self.execute_operation,
+                                  request, data, query, variables, operation_name)
+
+        prepared = self.prepare_operation(
+            request, data, query, variables, operation_name)
+        if isinstance(prepared, PreparedOperation) and self.response_cache:
+            # a shared cache is network I/O; keep it off the event loop
+            prepared = await run_sync(self.read_cache, prepared)
+        if not isinstance(prepared, PreparedOperation):
+            return prepared
+        try:
+            if prepared.is_mutation:
+                result = await run_sync(self.execute_prepared, request, prepared)
+            else:
+                prepared.options["execution_context_class"] = ThreadedExecutionContext
+                result = execute(self.schema.graphql_schema, prepared.document,
+                                 **prepared.options)
+                if inspect.isawaitable(result):
+                    result = await result
+        except Exception as e:
+            return ExecutionResult(errors=[e], extensions=prepared.extensions)
+        if prepared.cache_key:
+            await run_sync(self.store_result, prepared, result)
+        return self.finish_operation(prepared, result)
+
+
+def api_token_required(view):
+    """
+    ``view`` for token-less machine clients (scripts, remote health checks):
+    CSRF-exempt, but every request must carry ``Authorization: Bearer
+    <CRM_API_TOKEN>``, which a cross-site form cannot send. Refuses all
+    requests while no token is configured.
+    """
+    def allowed(request):
+        token = getattr(settings, "CRM_API_TOKEN", None)
+        return bool(token) and constant_time_compare(
+            request.headers.get("Authorization", ""), f"Bearer {token}")
+
+    if iscoroutinefunction(view):
+        async def wrapped(request, *args, **kwargs):
+            if not allowed(request):
+                return HttpResponseForbidden()
+            return await view(request, *args, **kwargs)
+    else:
+        def wrapped(request, *args, **kwargs):
+            if not allowed(request):
+                return HttpResponseForbidden()
+            return view(request, *args, **kwargs)
+    return csrf_exempt(wraps(view)(wrapped))
+
+
+def graphql_stats(request, schema):
+    """Document and response cache counters for monitoring (staff or DEBUG)."""
+    if not (settings.DEBUG or request.user.is_staff):
+        return HttpResponseForbidden()
+    graphql_schema = schema.graphql_schema
+    cache = shared_cache(graphql_schema)
+    return JsonResponse({
+        "documents": shared_store(graphql_schema).stats(),
+        "responses": cache.stats() if cache else None,
+    })
+
+
+async def iterate_in_thread(iterator):
+    """
+    Serve a sync iterator from an async response one block at a time.
+    Django would otherwise read it whole into memory under ASGI; every
+    step runs in the request's sync thread, which owns its DB cursor.
+    """
+    step = sync_to_async(next, thread_sensitive=True)
+    done = object()
+    while (block := await step(iterator, done)) is not done:
+        yield block
+
+
+@require_GET
+def export_orders(request):
+    """
+    Stream every order with its line items (staff or DEBUG).
+
+    ``?format=ndjson|csv&since=&until=&gzip=1``; ``since`` and ``until``
+    are ISO dates or datetimes bounding order_date (until is exclusive).
+    """
+    if not (settings.DEBUG or request.user.is_staff):
+        return HttpResponseForbidden()
+    params = request.GET
+    try:
+        since, until = (parse_bound(params[name], name) if params.get(name) else None
+                        for name in ("since", "until"))
+        export_format = params.get("format", "ndjson")
+        compress = params.get("gzip") in ("1", "true")
+        blocks = stream_orders(export_format, since, until, compress)
+    except ValidationError as e:
+        return JsonResponse({"errors": e.messages}, status=400)
+
+    if isinstance(request, ASGIRequest):
+        blocks = iterate_in_thread(blocks)
+    filename = f"orders.{export_format}" + (".gz" if compress else "")
+    response = StreamingHttpResponse(
+        blocks, content_type="application/gzip" if compress else FORMATS[export_format])
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
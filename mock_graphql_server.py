@@ -2,70 +2,161 @@
 """
 Simple mock GraphQL server for testing order reminders
 Uses Flask instead of aiohttp-graphql to avoid dependency issues
+
+Serves the legacy `orders` query and `allOrdersKeyset` with the CRM's
+keyset cursors, plus a POST /reminders endpoint. Set MOCK_ORDER_COUNT to
+serve that many synthetic orders, and MOCK_LATENCY_MS to delay responses.
 """
 
 from flask import Flask, request, jsonify
-from datetime import datetime, timedelta
+from base64 import b64decode, b64encode
+from datetime import datetime, timedelta, timezone
 import json
+import os
+import time
 
 app = Flask(__name__)
 
+
+def synthetic_orders(count, days=10):
+    """`count` orders spread evenly over the last `days` days, oldest first"""
+    now = datetime.now(timezone.utc)
+    step = timedelta(days=days) / max(count, 1)
+    return [
+        {
+            "id": f"order-{n:06d}",
+            "orderDate": (now - timedelta(days=days) + step * n).isoformat(),
+            "status": "PENDING",
+            "customer": {"email": f"customer{n % 500}@example.com"}
+        }
+        for n in range(count)
+    ]
+
+
 # Mock order data
 mock_orders = [
     {
         "id": "order-001",
-        "orderDate": (datetime.now() - timedelta(days=2)).isoformat(),
+        "orderDate": (datetime.now(timezone.utc) - timedelta(days=2)).isoformat(),
         "status": "PENDING",
         "customer": {"email": "customer1@example.com"}
     },
     {
-        "id": "order-002", 
-        "orderDate": (datetime.now() - timedelta(days=5)).isoformat(),
-        "status": "PROCESSING", 
+        "id": "order-002",
+        "orderDate": (datetime.now(timezone.utc) - timedelta(days=5)).isoformat(),
+        "status": "PROCESSING",
         "customer": {"email": "customer2@example.com"}
     },
     {
         "id": "order-003",
-        "orderDate": (datetime.now() - timedelta(days=10)).isoformat(),
+        "orderDate": (datetime.now(timezone.utc) - timedelta(days=10)).isoformat(),
         "status": "COMPLETED",
         "customer": {"email": "customer3@example.com"}
     }
 ]
+if os.environ.get("MOCK_ORDER_COUNT"):
+    mock_orders = synthetic_orders(int(os.environ["MOCK_ORDER_COUNT"]))
+
+# Reminders received on POST /reminders
+sent_reminders = []
+
+
+def parse_date(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def order_key(order):
+    return (parse_date(order["orderDate"]), order["id"])
+
+
+def encode_cursor(order):
+    return b64encode(json.dumps([order["orderDate"], order["id"]]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    order_date, order_id = json.loads(b64decode(cursor))
+    return (parse_date(order_date), order_id)
+
+
+def keyset_page(variables):
+    """
+    allOrdersKeyset(orderDate_Gte: $since, last: $last, before: $before)
+
+    Like the CRM, orders are sorted newest first, so `last`/`before` page
+    towards newer orders and the edges come back newest first.
+    """
+    since = parse_date(variables["since"])
+    window = sorted((o for o in mock_orders if parse_date(o["orderDate"]) >= since),
+                    key=order_key)
+    if variables.get("before"):
+        before = decode_cursor(variables["before"])
+        window = [o for o in window if order_key(o) > before]
+    last = variables.get("last", 100)
+    page = window[:last]
+    edges = [{"cursor": encode_cursor(o), "node": o} for o in reversed(page)]
+    return {
+        "edges": edges,
+        "pageInfo": {
+            "hasPreviousPage": len(window) > last,
+            "hasNextPage": bool(variables.get("before")),
+            "startCursor": edges[0]["cursor"] if edges else None,
+            "endCursor": edges[-1]["cursor"] if edges else None,
+        }
+    }
+
+
+@app.before_request
+def simulate_latency():
+    latency = float(os.environ.get("MOCK_LATENCY_MS", 0))
+    if latency:
+        time.sleep(latency / 1000)
+
 
 @app.route('/graphql', methods=['POST'])
 def graphql_endpoint():
     try:
         data = request.get_json()
         query = data.get('query', '')
-        variables = data.get('variables', {})
-        
+        variables = data.get('variables') or {}
+
+        if 'allOrdersKeyset' in query:
+            return jsonify({"data": {"allOrdersKeyset": keyset_page(variables)}})
+
         # Simple query parsing - look for orders query
         if 'orders' in query:
             # Filter orders based on dateFrom variable
             date_from_str = variables.get('dateFrom', '')
             if date_from_str:
                 try:
-                    date_from = datetime.fromisoformat(date_from_str.replace('Z', '+00:00'))
+                    date_from = parse_date(date_from_str)
+                    if date_from.tzinfo is None:
+                        date_from = date_from.replace(tzinfo=timezone.utc)
                     filtered_orders = [
-                        order for order in mock_orders 
-                        if datetime.fromisoformat(order['orderDate'].replace('Z', '+00:00')) >= date_from
+                        order for order in mock_orders
+                        if parse_date(order['orderDate']) >= date_from
                     ]
                 except:
                     filtered_orders = mock_orders[:2]  # Default to first 2 orders
             else:
                 filtered_orders = mock_orders
-            
+
             return jsonify({
                 "data": {
                     "orders": filtered_orders
                 }
             })
-        
+
         return jsonify({"data": {"orders": []}})
-        
+
     except Exception as e:
         return jsonify({"errors": [{"message": str(e)}]}), 400
 
+
+@app.route('/reminders', methods=['POST'])
+def reminders_endpoint():
+    sent_reminders.append(request.get_json())
+    return jsonify({"sent": True})
+
 @app.route('/graphql', methods=['GET'])
 def graphql_playground():
     return '''
@@ -89,4 +180,4 @@ def graphql_playground():
     '''
 
 if __name__ == '__main__':
-    app.run(host='localhost', port=8000, debug=True)
\ No newline at end of file
+    app.run(host='localhost', port=8000, debug=True)